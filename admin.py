@@ -2,7 +2,8 @@ import booking as booking_api
 import customtkinter as ctk
 from tkinter import messagebox, ttk
 import tkinter as tk
-from typing import List, Dict, Tuple
+from typing import List, Dict
+from booking import assign_driver  # re-exported: admin_api.assign_driver
 from db import get_conn
 
 
@@ -15,60 +16,6 @@ def list_all_bookings() -> List[Dict]:
     return rows
 
 
-def assign_driver(booking_id: int, driver_id: int) -> Tuple[bool, str]:
-    conn = get_conn()
-    cur = conn.cursor()
-
-    # verify driver
-    cur.execute(
-        "SELECT id FROM users WHERE id=? AND role='driver'", (driver_id,))
-    if not cur.fetchone():
-        conn.close()
-        return False, "Driver not found."
-
-    # target booking
-    cur.execute("SELECT * FROM bookings WHERE id=?", (booking_id,))
-    target = cur.fetchone()
-    if not target:
-        conn.close()
-        return False, "Booking not found."
-    if target["status"] in ("cancelled", "completed"):
-        conn.close()
-        return False, "Cannot assign driver to cancelled or completed booking."
-
-    date = target["date"]
-    time = target["time"]
-
-    # Prevent assigning a driver if this customer already has an assigned/ booked
-    # booking for the same pickup+dropoff location (avoid duplicate assignments)
-    cust_id = target[1]  # customer_id
-    pickup = target[2]   # pickup
-    dropoff = target[3]  # dropoff
-    cur.execute(
-        """SELECT 1 FROM bookings WHERE customer_id=? AND pickup=? AND dropoff=?
-                   AND status IN ('assigned','booked') AND id<>?""",
-        (cust_id, pickup, dropoff, booking_id)
-    )
-    if cur.fetchone():
-        conn.close()
-        return False, "This customer already has an assigned/ booked ride for the same route."
-
-    # overlap check (same date+time for that driver)
-    cur.execute("""SELECT 1 FROM bookings
-                   WHERE driver_id=? AND status IN ('assigned','booked')
-                   AND date=? AND time=? AND id<>?""",
-                (driver_id, date, time, booking_id))
-    if cur.fetchone():
-        conn.close()
-        return False, "Driver has an overlapping booking at the same date and time."
-
-    cur.execute("""UPDATE bookings SET driver_id=?, status='assigned' WHERE id=?""",
-                (driver_id, booking_id))
-    conn.commit()
-    conn.close()
-    return True, "Driver assigned."
-
-
 # ---- Admin UI functions (moved from login.py) ----
 
 
@@ -108,28 +55,65 @@ def show_user_detail(parent, user_id: int):
 
 
 def admin_view_all_bookings(parent):
-    rows = list_all_bookings()
     dlg = ctk.CTkToplevel(parent)
     dlg.title("All Bookings")
     dlg.geometry("820x420")
     dlg.grab_set()
-    tree = ttk.Treeview(dlg, columns=("id", "customer_id", "pickup",
-                        "dropoff", "date", "time", "status", "driver_id"), show="headings")
+
+    # status filter
+    filter_row = ctk.CTkFrame(dlg, fg_color='transparent')
+    filter_row.pack(fill='x', padx=8, pady=(8, 0))
+    ctk.CTkLabel(filter_row, text='Status:').pack(side='left', padx=(0, 6))
+    status_var = tk.StringVar(value='all')
+    ctk.CTkComboBox(filter_row, values=['all', 'booked', 'assigned', 'cancelled', 'completed'],
+                    variable=status_var, width=140,
+                    command=lambda _v: load()).pack(side='left')
+
+    table = ctk.CTkFrame(dlg, fg_color='transparent')
+    table.pack(fill="both", expand=True, padx=8, pady=8)
     cols = ("id", "customer_id", "pickup", "dropoff",
             "date", "time", "status", "driver_id")
+    vsb = ttk.Scrollbar(table, orient="vertical")
+    tree = ttk.Treeview(table, columns=cols, show="headings")
     for c in cols:
         tree.heading(c, text=c.replace('_', ' ').capitalize())
         tree.column(c, width=100 if c in ("id", "customer_id",
                     "date", "time", "status") else 180, anchor='w')
-    tree.pack(fill="both", expand=True, padx=8, pady=8)
+    vsb.pack(side="right", fill="y")
+    tree.pack(fill="both", expand=True)
 
-    def load():
-        for i in tree.get_children():
-            tree.delete(i)
-        for r in list_all_bookings():
+    # Rows are fetched a page at a time as the user scrolls towards the end,
+    # so opening the window costs the same whatever the size of the table.
+    page = {"cursor": None, "done": False, "pending": False}
+
+    def load_more():
+        page["pending"] = False
+        if page["done"]:
+            return
+        status = status_var.get()
+        rows, cursor = booking_api.list_bookings_page(
+            after=page["cursor"], status=None if status == 'all' else status)
+        for r in rows:
             vals = (r['id'], r['customer_id'], r['pickup'], r['dropoff'],
                     r['date'], r['time'], r['status'], r.get('driver_id', ''))
             tree.insert("", "end", values=vals)
+        page["cursor"] = cursor
+        page["done"] = cursor is None
+
+    def on_scroll(first, last):
+        vsb.set(first, last)
+        if float(last) >= 0.9 and not page["done"] and not page["pending"]:
+            page["pending"] = True
+            tree.after_idle(load_more)
+
+    tree.configure(yscrollcommand=on_scroll)
+    vsb.configure(command=tree.yview)
+
+    def load():
+        for i in tree.get_children():
+            tree.delete(i)
+        page.update(cursor=None, done=False)
+        load_more()
 
     def cancel_selected():
         sel = tree.selection()
@@ -0,0 +1,140 @@
+"""Coroutine versions of the booking, auth and admin data operations.
+
+The functions in booking.py and auth.py block, which suits the Tk UI and
+threaded servers. An asyncio service would otherwise have to give every
+request its own thread. Here the same operations are coroutines, with a
+fixed number of threads behind them however many requests are in flight:
+
+- reads run on a pool of READ_WORKERS threads, one per pooled connection.
+  More threads would only queue up for a connection.
+- writes already run one at a time on db's writer thread. A blocking
+  write function (create_booking, ...) runs on one of WRITE_WORKERS
+  threads while it waits. Raw writes via write(fn) are awaited straight
+  off the writer's Future and hold no thread at all.
+- auto_assign ranks the free drivers on a read connection and only then
+  queues the claim on the writer. That ranking runs on its own
+  DISPATCH_WORKERS threads, so a burst of assignments doesn't take the
+  write workers away from create_booking and friends.
+
+    ok, role, user = await aiodb.login("alice", "secret")
+    ok, msg, row = await aiodb.create_booking(user["id"], "Thamel", "Airport", "2025-01-01", "10:00")
+    rows = await aiodb.fetchall("SELECT * FROM bookings WHERE status=?", ("booked",))
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import auth
+import booking
+import db
+import dispatch
+
+READ_WORKERS = None  # None: one per pooled connection (db.POOL_SIZE)
+WRITE_WORKERS = 4    # writes are serialised by db's writer anyway
+DISPATCH_WORKERS = 2
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _executor(kind: str) -> ThreadPoolExecutor:
+    with _executors_lock:
+        executor = _executors.get(kind)
+        if executor is None:
+            workers = {"read": READ_WORKERS or db.POOL_SIZE, "write": WRITE_WORKERS}.get(kind, DISPATCH_WORKERS)
+            executor = ThreadPoolExecutor(workers, thread_name_prefix=f"aiodb-{kind}")
+            _executors[kind] = executor
+        return executor
+
+
+def shutdown(wait: bool = True):
+    """Stop the worker threads; the next call starts new ones (e.g. after changing READ_WORKERS)."""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait)
+
+
+async def run_read(fn: Callable, *args, **kwargs):
+    """Await a blocking read function on the read workers."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor("read"), functools.partial(fn, *args, **kwargs))
+
+
+async def run_write(fn: Callable, *args, **kwargs):
+    """Await a blocking function that writes through db.write()."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor("write"), functools.partial(fn, *args, **kwargs))
+
+
+def _query(fn, *args, **kwargs):
+    with db.connection() as conn:
+        return fn(conn, *args, **kwargs)
+
+
+async def read(fn: Callable, *args, **kwargs):
+    """fn(conn, *args, **kwargs) on a pooled connection, awaited."""
+    return await run_read(_query, fn, *args, **kwargs)
+
+
+async def write(fn: Callable, *args, **kwargs):
+    """fn(conn, *args, **kwargs) as one write transaction, like db.write(), without blocking a thread."""
+    return await asyncio.wrap_future(db.submit_write(fn, *args, **kwargs))
+
+
+async def fetchall(sql: str, params=()) -> List[dict]:
+    return await read(lambda conn: [dict(r) for r in conn.execute(sql, params)])
+
+
+async def fetchone(sql: str, params=()) -> Optional[dict]:
+    def one(conn):
+        row = conn.execute(sql, params).fetchone()
+        return None if row is None else dict(row)
+    return await read(one)
+
+
+def _reader(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    async def call(*args, **kwargs):
+        return await run_read(fn, *args, **kwargs)
+    return call
+
+
+def _writer(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    async def call(*args, **kwargs):
+        return await run_write(fn, *args, **kwargs)
+    return call
+
+
+# auth
+login = _reader(auth.login)
+username_exists = _reader(auth.username_exists)
+register_customer = _writer(auth.register_customer)
+
+# bookings
+list_bookings_by_customer = _reader(booking.list_bookings_by_customer)
+list_bookings_page = _reader(booking.list_bookings_page)
+available_drivers = _reader(booking.available_drivers)
+create_booking = _writer(booking.create_booking)
+create_bookings_bulk = _writer(booking.create_bookings_bulk)
+update_booking = _writer(booking.update_booking)
+cancel_booking = _writer(booking.cancel_booking)
+complete_booking = _writer(booking.complete_booking)
+
+# admin (admin.py itself imports customtkinter; it pages through list_bookings_page too)
+assign_driver = _writer(booking.assign_driver)
+
+
+async def auto_assign(booking_id: int, policy: dispatch.DispatchPolicy = dispatch.DEFAULT_POLICY):
+    """dispatch.auto_assign, awaited on the dispatch workers rather than the write workers."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor("dispatch"),
+                                      functools.partial(dispatch.auto_assign, booking_id, policy))
+
+
+async def get_booking(booking_id: int) -> Optional[Dict[str, Any]]:
+    return await fetchone("SELECT * FROM bookings WHERE id=?", (booking_id,))
@@ -1,24 +1,25 @@
 from typing import Optional, Tuple, Dict
-from db import get_conn, init_db
+from db import get_conn, init_db, write
 
 def seed_defaults():
     init_db()
-    conn = get_conn()
-    cur = conn.cursor()
-    # admin
-    cur.execute("SELECT 1 FROM users WHERE username=?", ("admin",))
-    if not cur.fetchone():
-        cur.execute("""INSERT INTO users (username,password,role,name,address,phone,email)
-                       VALUES (?,?,?,?,?,?,?)""",
-                    ("admin","admin123","admin","Administrator","", "", "admin@example.com"))
-    # driver1
-    cur.execute("SELECT 1 FROM users WHERE username=?", ("driver1",))
-    if not cur.fetchone():
-        cur.execute("""INSERT INTO users (username,password,role,name,address,phone,email)
-                       VALUES (?,?,?,?,?,?,?)""",
-                    ("driver1","driver123","driver","Driver One","", "9800000000", "driver1@example.com"))
-    conn.commit()
-    conn.close()
+
+    def seed(conn):
+        cur = conn.cursor()
+        # admin
+        cur.execute("SELECT 1 FROM users WHERE username=?", ("admin",))
+        if not cur.fetchone():
+            cur.execute("""INSERT INTO users (username,password,role,name,address,phone,email)
+                           VALUES (?,?,?,?,?,?,?)""",
+                        ("admin","admin123","admin","Administrator","", "", "admin@example.com"))
+        # driver1
+        cur.execute("SELECT 1 FROM users WHERE username=?", ("driver1",))
+        if not cur.fetchone():
+            cur.execute("""INSERT INTO users (username,password,role,name,address,phone,email)
+                           VALUES (?,?,?,?,?,?,?)""",
+                        ("driver1","driver123","driver","Driver One","", "9800000000", "driver1@example.com"))
+
+    write(seed)
 
 def username_exists(username: str) -> bool:
     conn = get_conn()
@@ -34,14 +35,17 @@ def register_customer(name: str, address: str, phone: str, email: str,
         return False, "All fields are required."
     if username_exists(username):
         return False, "Username already exists."
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""INSERT INTO users (username,password,role,name,address,phone,email)
-                   VALUES (?,?,?,?,?,?,?)""",
-                (username, password, "customer", name, address, phone, email))
-    conn.commit()
-    conn.close()
-    return True, f"Customer registered: {username}"
+
+    def insert(conn):
+        # re-check inside the write transaction: another registration may have won the race
+        if conn.execute("SELECT 1 FROM users WHERE username=?", (username,)).fetchone():
+            return False, "Username already exists."
+        conn.execute("""INSERT INTO users (username,password,role,name,address,phone,email)
+                        VALUES (?,?,?,?,?,?,?)""",
+                     (username, password, "customer", name, address, phone, email))
+        return True, f"Customer registered: {username}"
+
+    return write(insert)
 
 def login(username: str, password: str) -> Tuple[bool, str, Optional[Dict]]:
     conn = get_conn()
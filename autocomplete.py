@@ -0,0 +1,116 @@
+"""Local autocomplete for the pickup/destination entries.
+
+A sorted array of phrase keys answers each keystroke with a bisect, so the
+suggestion list updates as the user types; Nominatim is only asked about
+prefixes the index knows nothing about. Phrases come from the popular
+places list, the gazetteer's place names and the current customer's own
+past pickups and dropoffs, and network answers are added as they arrive.
+Other customers' bookings and the geocode cache (which holds drivers' home
+addresses) are never used: whatever is indexed is shown to this user.
+"""
+import bisect
+import heapq
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from booking import place_counts
+from gazetteer import fold
+from map import GAZETTEER
+
+SUGGEST_LIMIT = 6
+POPULAR_WEIGHT = 50.0   # popular places outrank anything typed only a few times
+PLACE_WEIGHT = 0.5      # gazetteer places nobody has booked yet
+LEARNED_WEIGHT = 1.0    # suggestions that came back from the network
+MEMO_SIZE = 4096        # remembered answers; short prefixes match thousands of keys
+
+
+class PrefixIndex:
+    """Weighted phrases searchable by the prefix of any of their words.
+
+    complete() prefers phrases that start with the typed text, then higher
+    weight, then shorter phrases. Prefixes the network found nothing for are
+    remembered so that typing further doesn't ask again.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys: List[Tuple[str, str, bool]] = []  # sorted (key, phrase key, starts the phrase)
+        self._phrases: Dict[str, Tuple[str, float]] = {}  # phrase key -> (phrase, weight)
+        self._empty = set()
+        self._memo: Dict[Tuple[str, int], List[str]] = {}
+
+    def __len__(self):
+        return len(self._phrases)
+
+    def add(self, phrase: str, weight: float = LEARNED_WEIGHT):
+        """Add a phrase, or raise the weight of one already indexed."""
+        phrase = " ".join(phrase.split())
+        key = fold(phrase)
+        if not key:
+            return
+        with self._lock:
+            known = self._phrases.get(key)
+            if known is not None:
+                self._phrases[key] = (known[0], known[1] + weight)
+                self._memo.clear()
+                return
+            self._phrases[key] = (phrase, weight)
+            self._memo.clear()
+            words = key.split()
+            for i in range(len(words)):
+                bisect.insort(self._keys, (" ".join(words[i:]), key, i == 0))
+            # a novel phrase may answer prefixes that used to come back empty
+            self._empty = {p for p in self._empty if not key.startswith(p) and f" {p}" not in key}
+
+    def update(self, phrases: Iterable[Tuple[str, float]]):
+        for phrase, weight in phrases:
+            self.add(phrase, weight)
+
+    def complete(self, prefix: str, limit: int = SUGGEST_LIMIT) -> List[str]:
+        key = fold(prefix)
+        if not key or limit <= 0:
+            return []
+        best: Dict[str, bool] = {}
+        with self._lock:
+            memo = self._memo.get((key, limit))
+            if memo is not None:
+                return list(memo)
+            i = bisect.bisect_left(self._keys, (key,))
+            while i < len(self._keys) and self._keys[i][0].startswith(key):
+                _, phrase_key, whole = self._keys[i]
+                best[phrase_key] = best.get(phrase_key, False) or whole
+                i += 1
+            ranked = heapq.nsmallest(limit, best, key=lambda k: (not best[k], -self._phrases[k][1], len(k)))
+            result = [self._phrases[k][0] for k in ranked]
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            self._memo[(key, limit)] = result
+            return list(result)
+
+    def mark_empty(self, prefix: str):
+        key = fold(prefix)
+        if key:
+            with self._lock:
+                self._empty.add(key)
+
+    def known_empty(self, prefix: str) -> bool:
+        """True if the network already found nothing for this text or a prefix of it."""
+        key = fold(prefix)
+        with self._lock:
+            return any(key[:n] in self._empty for n in range(1, len(key) + 1))
+
+
+def build_suggestion_index(popular: Iterable[str] = (),
+                           history: Iterable[Tuple[str, int]] = (),
+                           places: Iterable[str] = ()) -> PrefixIndex:
+    index = PrefixIndex()
+    index.update((p, POPULAR_WEIGHT) for p in popular)
+    index.update(history)
+    index.update((p, PLACE_WEIGHT) for p in places)
+    return index
+
+
+def load_suggestion_index(popular: Iterable[str] = (), customer_id: Optional[int] = None) -> PrefixIndex:
+    """Index built from the popular places, the gazetteer and `customer_id`'s booking history."""
+    history = place_counts(customer_id) if customer_id is not None else []
+    return build_suggestion_index(popular, history, GAZETTEER.names())
@@ -0,0 +1,1054 @@
+"""Micro-benchmarks for the hot paths.
+
+Run one with `python benchmarks.py <name>` (or `all`). Every benchmark works on
+a throwaway database, so taxi_booking.db is never touched.
+"""
+import argparse
+import csv
+import http.server
+import json
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from urllib import parse as urlparse, request as urlrequest
+
+import auth
+import booking
+import db
+import map as geo
+from cache import PersistentCache, SingleFlight
+from httpclient import HttpClient
+from map import haversine
+from metrics import percentile
+from spatial import SpatialIndex
+from tasks import TkTaskRunner
+
+
+@contextmanager
+def temp_database():
+    old_path = db.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        try:
+            yield db.DB_PATH
+        finally:
+            db.close_pools()
+            db.DB_PATH = old_path
+
+
+def make_customer(username: str = "bench_customer") -> int:
+    auth.register_customer("Bench Customer", "Thamel", "9800000000", "bench@example.com",
+                           username, "secret1")
+    ok, _, user = auth.login(username, "secret1")
+    return user["id"]
+
+
+def report(title: str, rows):
+    print(title)
+    for label, value in rows:
+        print(f"  {label:<36} {value}")
+
+
+def _unpooled_conn():
+    # what db.get_conn() used to do: a brand-new connection per call
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _booking_crud_cycle(customer_id: int):
+    ok, _, b = booking.create_booking(customer_id, "Thamel", "New Road", "2025-01-01", "10:00")
+    booking.list_bookings_by_customer(customer_id)
+    booking.update_booking(b["id"], time="10:30")
+    booking.cancel_booking(b["id"])
+
+
+def bench_async(concurrency=(100, 1000, 3000), write_every: int = 5, latency: float = 0.05):
+    """`concurrency` simultaneous requests: a thread per request vs the aiodb coroutines.
+
+    A request logs in and reads a page of bookings; every `write_every`-th
+    one also creates a booking. `latency` stands for the time a request
+    spends on the client's network between those steps.
+    """
+    import asyncio
+    import aiodb
+
+    def request(i, customer_id):
+        auth.login("bench_customer", "secret1")
+        time.sleep(latency)
+        booking.list_bookings_page(limit=20, customer_id=customer_id)
+        if i % write_every == 0:
+            booking.create_booking(customer_id, f"Pickup {i}", "Airport", "2025-01-01", "10:00")
+
+    async def arequest(i, customer_id):
+        await aiodb.login("bench_customer", "secret1")
+        await asyncio.sleep(latency)
+        await aiodb.list_bookings_page(limit=20, customer_id=customer_id)
+        if i % write_every == 0:
+            await aiodb.create_booking(customer_id, f"Pickup {i}", "Airport", "2025-01-01", "10:00")
+
+    def threaded(n, customer_id):
+        errors, live = [], [0, 0]  # running, most at once
+        lock = threading.Lock()
+
+        def run(i):
+            with lock:
+                live[0] += 1
+                live[1] = max(live)
+            try:
+                request(i, customer_id)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                with lock:
+                    live[0] -= 1
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return live[1], len(errors)
+
+    def coroutines(n, customer_id):
+        async def main():
+            results = await asyncio.gather(*(arequest(i, customer_id) for i in range(n)), return_exceptions=True)
+            return threading.active_count(), sum(isinstance(r, Exception) for r in results)
+        return asyncio.run(main())
+
+    rows = []
+    for n in concurrency:
+        for label, run in (("thread per request", threaded), ("asyncio + aiodb", coroutines)):
+            with temp_database():
+                customer_id = make_customer()
+                tracemalloc.start()
+                start = time.perf_counter()
+                peak_threads, errors = run(n, customer_id)
+                elapsed = time.perf_counter() - start
+                peak_mem = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                aiodb.shutdown()
+            rows.append((f"{n:>5} requests, {label}",
+                         f"{n / elapsed:7.0f} req/s, {peak_threads:5d} threads, "
+                         f"{peak_mem / 2 ** 20:6.1f} MB peak, {errors} failed"))
+    report(f"concurrent requests ({latency * 1e3:.0f} ms client latency): threads vs asyncio", rows)
+
+
+def bench_lifecycle(lifecycles: int = 2000, concurrency=(1, 8, 32)):
+    """End-to-end ride lifecycles (loadgen): create, auto-assign, complete or cancel."""
+    import loadgen
+    for threads in concurrency:
+        with temp_database():
+            print(loadgen.format_report(loadgen.run(lifecycles=lifecycles, concurrency=threads)))
+
+
+def bench_markers(sizes=(100, 1000, 10000), updates: int = 20, moving: float = 0.1):
+    """Driver marker refresh: delete-and-recreate everything vs MarkerManager's diff.
+
+    Markers are stand-ins that count canvas operations. In TkinterMapView
+    every create/move/delete is a canvas redraw, and delete() also forces a
+    canvas.update().
+    """
+    from markers import MarkerManager
+
+    class Marker:
+        __slots__ = ("position", "text")
+
+        def __init__(self, lat, lon, text):
+            ops[0] += 1
+            self.position, self.text = (lat, lon), text
+
+        def set_position(self, lat, lon):
+            ops[0] += 1
+            self.position = (lat, lon)
+
+        def set_text(self, text):
+            ops[0] += 1
+            self.text = text
+
+        def delete(self):
+            ops[0] += 1
+
+    ops = [0]
+    rng = random.Random(9)
+    rows = []
+    for n in sizes:
+        fleet = [[f"driver:{d[0]}", d[2], d[3], d[1]] for d in random_fleet(n)]
+        frames = []
+        for _ in range(updates):
+            for d in rng.sample(fleet, int(n * moving)):
+                d[1] += rng.uniform(-0.001, 0.001)
+                d[2] += rng.uniform(-0.001, 0.001)
+            frames.append([{"id": key, "lat": lat, "lon": lon, "text": name} for key, lat, lon, name in fleet])
+        # a zoom-13 window over the valley: the Nepal-wide half of the fleet is off screen
+        bounds = (27.62, 85.22, 27.78, 85.43)
+
+        ops[0] = 0
+        drawn = []
+        start = time.perf_counter()
+        for frame in frames:
+            for m in drawn:
+                m.delete()
+            drawn = [Marker(m["lat"], m["lon"], m["text"]) for m in frame]
+        rebuild, rebuild_ops = (time.perf_counter() - start) / updates, ops[0] / updates
+
+        ops[0] = 0
+        manager = MarkerManager(lambda lat, lon, text=None: Marker(lat, lon, text))
+        manager.update(frames[0], bounds)
+        ops[0] = 0
+        start = time.perf_counter()
+        for frame in frames[1:]:
+            manager.update(frame, bounds)
+        diffed, diffed_ops = (time.perf_counter() - start) / (updates - 1), ops[0] / (updates - 1)
+        rows.append((f"{n:,} drivers", f"rebuild {rebuild * 1e3:7.2f} ms, {rebuild_ops:8,.0f} canvas ops | "
+                                       f"diff + cull {diffed * 1e3:7.2f} ms, {diffed_ops:6,.0f} canvas ops"))
+    report(f"marker refresh, {moving:.0%} of drivers moving per update", rows)
+
+
+def bench_pool(n: int = 300):
+    """booking.py CRUD throughput with per-call connect vs the pooled get_conn."""
+    rows = []
+    with temp_database():
+        customer_id = make_customer()
+        for label, factory in (("per-call connect", _unpooled_conn), ("pooled", db.get_conn)):
+            booking.get_conn = factory
+            try:
+                start = time.perf_counter()
+                for _ in range(n):
+                    _booking_crud_cycle(customer_id)
+                elapsed = time.perf_counter() - start
+            finally:
+                booking.get_conn = db.get_conn
+            rows.append((f"CRUD, {label}", f"{4 * n / elapsed:,.0f} ops/sec"))
+        for label, factory in (("per-call connect", _unpooled_conn), ("pooled", db.get_conn)):
+            auth.get_conn = factory
+            try:
+                start = time.perf_counter()
+                for _ in range(20 * n):
+                    auth.username_exists("bench_customer")
+                elapsed = time.perf_counter() - start
+            finally:
+                auth.get_conn = db.get_conn
+            rows.append((f"username_exists, {label}", f"{20 * n / elapsed:,.0f} ops/sec"))
+    report(f"booking CRUD ({n} create/list/update/cancel cycles) and auth lookups", rows)
+
+
+def _stress(seconds: float, writers: int, readers: int, do_write, do_read):
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def loop(op, key):
+        while time.perf_counter() < stop:
+            try:
+                op()
+                outcome = key
+            except sqlite3.OperationalError:
+                outcome = "locked"
+            with lock:
+                counts[outcome] += 1
+
+    threads = [threading.Thread(target=loop, args=(do_write, "writes")) for _ in range(writers)]
+    threads += [threading.Thread(target=loop, args=(do_read, "reads")) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return counts
+
+
+def bench_stress(seconds: float = 3.0, writers: int = 4, readers: int = 4):
+    """Concurrent readers and writers: stock journal + direct writes vs WAL + writer queue."""
+    def direct_write():
+        # the pre-queue create_booking: write on whatever connection the thread has
+        with db.connection() as conn:
+            conn.execute("""INSERT INTO bookings (customer_id,pickup,dropoff,date,time,status)
+                            VALUES (1,'Thamel','New Road','2025-01-01','10:00','booked')""")
+            conn.commit()
+
+    def queued_write():
+        booking.create_booking(1, "Thamel", "New Road", "2025-01-01", "10:00")
+
+    def read():
+        booking.list_bookings_by_customer(1)
+
+    rows = []
+    for label, profile, do_write in (("safe profile, direct writes", "safe", direct_write),
+                                     ("performance profile, queue", "performance", queued_write)):
+        # pragma busy_timeout stays short so contention shows up as errors, not stalls
+        db.configure_profile(profile, busy_timeout=100)
+        try:
+            with temp_database():
+                counts = _stress(seconds, writers, readers, do_write, read)
+        finally:
+            db.configure_profile("performance")
+        rows.append((label, f"{counts['writes'] / seconds:,.0f} writes/s, "
+                            f"{counts['reads'] / seconds:,.0f} reads/s, "
+                            f"{counts['locked']} 'database is locked'"))
+    report(f"stress: {writers} writers + {readers} readers for {seconds:.0f}s", rows)
+
+
+def add_drivers(n: int):
+    def insert(conn):
+        conn.executemany("""INSERT INTO users (username,password,role,name,address)
+                            VALUES (?, 'x', 'driver', ?, '')""",
+                         ((f"bench_driver{i}", f"Driver {i}") for i in range(n)))
+    db.write(insert)
+
+
+def bench_assign(threads: int = 8, drivers: int = 200, bookings: int = 2000, slots: int = 20):
+    """auto_assign_driver hammered from many dispatcher threads."""
+    with temp_database():
+        add_drivers(drivers)
+        ids = [booking.create_booking(1, "Thamel", "New Road", "2025-01-01", f"{4 + i % slots:02d}:00")[2]["id"]
+               for i in range(bookings)]
+        assigned = []
+
+        def dispatcher(offset):
+            for bid in ids[offset:] + ids[:offset]:
+                ok, _, _ = booking.auto_assign_driver(bid)
+                if ok:
+                    assigned.append(bid)
+
+        workers = [threading.Thread(target=dispatcher, args=(i * bookings // threads,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+        with db.connection() as conn:
+            doubles = conn.execute("""SELECT COUNT(*) FROM (
+                                          SELECT 1 FROM bookings WHERE status='assigned'
+                                          GROUP BY driver_id, date, time HAVING COUNT(*) > 1)""").fetchone()[0]
+    calls = threads * bookings
+    report(f"auto_assign_driver: {threads} threads, {drivers} drivers, {bookings} bookings", [
+        ("calls/sec", f"{calls / elapsed:,.0f}"),
+        ("successful assignments", f"{len(assigned)} ({len(assigned) / elapsed:,.0f}/s)"),
+        ("double-booked driver slots", doubles),
+    ])
+
+
+def bench_bulk(n: int = 5000):
+    """Looped create_booking vs create_bookings_bulk for an n-row import."""
+    def feed():
+        for i in range(n):
+            yield (1, "Tribhuvan International Airport (KTM)", "Thamel", "2025-01-01", f"{i % 24:02d}:00")
+
+    rows = []
+    with temp_database():
+        start = time.perf_counter()
+        for item in feed():
+            booking.create_booking(*item)
+        elapsed = time.perf_counter() - start
+        rows.append(("looped create_booking", f"{n / elapsed:,.0f} bookings/s"))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        booking.create_bookings_bulk(feed(), on_created=lambda chunk: None)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rows.append(("create_bookings_bulk", f"{n / elapsed:,.0f} bookings/s, peak {peak / 1024:,.0f} KiB"))
+    report(f"bulk import of {n} bookings", rows)
+
+
+def random_fleet(n: int, seed: int = 7):
+    """n (id, name, lat, lon, address) tuples: half in the Kathmandu valley, half across Nepal."""
+    rng = random.Random(seed)
+    fleet = []
+    for i in range(n):
+        if i % 2:
+            lat, lon = rng.uniform(27.60, 27.80), rng.uniform(85.20, 85.45)
+        else:
+            lat, lon = rng.uniform(26.5, 30.3), rng.uniform(80.2, 88.1)
+        fleet.append((i, f"Driver {i}", lat, lon, ""))
+    return fleet
+
+
+def bench_slots(drivers: int = 500, bookings: int = 300000, checks: int = 2000):
+    """Driver availability at scale: exact date+time matching vs interval overlap."""
+    rng = random.Random(11)
+    base = booking.slot_start("2025-01-01", "00:00")
+    with temp_database():
+        add_drivers(drivers)
+
+        def insert(conn):
+            driver_ids = [r[0] for r in conn.execute("SELECT id FROM users WHERE role='driver'")]
+            rows = []
+            for _ in range(bookings):
+                start = base + rng.randrange(365 * 24 * 12) * 300   # 5-minute grid over a year
+                stamp = time.gmtime(start)
+                rows.append((time.strftime("%Y-%m-%d", stamp), time.strftime("%H:%M", stamp), start,
+                             rng.choice((20, 30, 45, 60, 90)), rng.choice(driver_ids)))
+            conn.executemany("""INSERT INTO bookings (customer_id, pickup, dropoff, date, time, status,
+                                                      driver_id, start_ts, duration_min)
+                                VALUES (1, 'A', 'B', ?, ?, 'assigned', ?, ?, ?)""",
+                             ((d, t, drv, s, m) for d, t, s, m, drv in rows))
+        db.write(insert)
+        probes = [(rng.randint(1, drivers), base + rng.randrange(365 * 24 * 12) * 300) for _ in range(checks)]
+        rows = []
+        with db.connection() as conn:
+            legacy_sql = booking.LEGACY_OVERLAP_SQL.format(driver=":driver")
+            start = time.perf_counter()
+            legacy_hits = 0
+            for drv, ts in probes:
+                stamp = time.gmtime(ts)
+                legacy_hits += conn.execute(legacy_sql, {"driver": drv, "id": 0, "date": time.strftime("%Y-%m-%d", stamp),
+                                                         "time": time.strftime("%H:%M", stamp)}).fetchone() is not None
+            legacy = (time.perf_counter() - start) / checks
+            rows.append(("exact date+time match", f"{legacy * 1e6:7.1f} us/check, {legacy_hits} clashes found"))
+
+            overlap_sql = booking.OVERLAP_SQL.format(driver=":driver")
+            start = time.perf_counter()
+            hits = 0
+            for drv, ts in probes:
+                hits += conn.execute(overlap_sql, {"driver": drv, "id": 0, "start": ts,
+                                                   "end": ts + 45 * 60}).fetchone() is not None
+            overlap = (time.perf_counter() - start) / checks
+            rows.append(("interval overlap", f"{overlap * 1e6:7.1f} us/check, {hits} clashes found"))
+            plan = " ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + overlap_sql,
+                                                       {"driver": 1, "id": 0, "start": base, "end": base}))
+            rows.append(("  plan", plan))
+
+            start = time.perf_counter()
+            conn.execute("""SELECT id FROM users WHERE role='driver' AND id NOT IN (
+                                SELECT driver_id FROM bookings WHERE driver_id IS NOT NULL
+                                AND status IN ('assigned','booked'))""").fetchall()
+            rows.append(("old available drivers (any booking)", f"{(time.perf_counter() - start) * 1e3:7.1f} ms"))
+        start = time.perf_counter()
+        free = booking.available_drivers(probes[0][1])
+        rows.append(("available_drivers(at a time)",
+                     f"{(time.perf_counter() - start) * 1e3:7.1f} ms, {len(free)} of {drivers} free"))
+    report(f"availability checks, {bookings:,} bookings over a year, {drivers} drivers", rows)
+
+
+def bench_spatial(sizes=(1000, 10000, 100000), queries: int = 200, km: float = 3.0):
+    """Nearby-driver lookups: linear haversine scan vs SpatialIndex."""
+    rng = random.Random(3)
+    points = [(rng.uniform(27.65, 27.75), rng.uniform(85.25, 85.40)) for _ in range(queries)]
+    rows = []
+    for n in sizes:
+        fleet = random_fleet(n)
+
+        start = time.perf_counter()
+        for ulat, ulon in points:
+            nearby = [(haversine(ulat, ulon, d[2], d[3]), d) for d in fleet]
+            nearby = sorted((x for x in nearby if x[0] <= km), key=lambda x: x[0])
+        linear = (time.perf_counter() - start) / queries
+
+        start = time.perf_counter()
+        index = SpatialIndex()
+        for d in fleet:
+            index.insert(d[0], d[2], d[3], d)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for ulat, ulon in points:
+            index.radius(ulat, ulon, km)
+        radius = (time.perf_counter() - start) / queries
+
+        start = time.perf_counter()
+        for ulat, ulon in points:
+            index.nearest(ulat, ulon, 10)
+        knn = (time.perf_counter() - start) / queries
+
+        rows.append((f"{n:,} drivers", f"scan {linear * 1e3:8.3f} ms | index radius {radius * 1e3:7.3f} ms, "
+                                       f"10-NN {knn * 1e3:7.3f} ms | build {build * 1e3:,.0f} ms"))
+    report(f"nearby drivers within {km} km, per query", rows)
+
+
+def bench_cluster(sizes=(1000, 10000, 100000), zoom: int = 13, pans: int = 50):
+    """Marker clustering: the old scikit-learn DBSCAN path vs the grid clusterer."""
+    import subprocess
+    import sys
+    from cluster import GridClusterer, cluster_points
+    rows = []
+    probe = subprocess.run([sys.executable, "-c", "import time; t = time.perf_counter(); "
+                            "import numpy, sklearn.cluster; print(time.perf_counter() - t)"],
+                           capture_output=True, text=True)
+    try:
+        from sklearn.cluster import DBSCAN
+        import numpy
+        rows.append(("numpy + sklearn cold import", f"{float(probe.stdout) * 1e3:8.0f} ms"))
+    except ImportError:
+        DBSCAN = None
+        rows.append(("DBSCAN", "scikit-learn not installed (the old path fell back to top-10)"))
+    rng = random.Random(5)
+    for n in sizes:
+        fleet = random_fleet(n)
+        points = [(d[0], d[2], d[3], d) for d in fleet]
+        row = []
+        if DBSCAN is not None:
+            eps_km = max(0.2, 1.2 * (13.0 / max(1.0, zoom)))
+            start = time.perf_counter()
+            DBSCAN(eps=eps_km / 6371.0088, min_samples=2, algorithm="ball_tree",
+                   metric="haversine").fit_predict(numpy.radians([(d[2], d[3]) for d in fleet]))
+            row.append(f"DBSCAN {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+        start = time.perf_counter()
+        markers = cluster_points(points, zoom)
+        row.append(f"grid {(time.perf_counter() - start) * 1e3:7.1f} ms ({len(markers):,} markers)")
+
+        grid = GridClusterer()
+        grid.update(points)
+        grid.clusters(zoom)
+        start = time.perf_counter()
+        for _ in range(pans):
+            # an 800x600 px window at zoom 13 is about 0.06 x 0.09 degrees
+            lat, lon = rng.uniform(27.62, 27.78), rng.uniform(85.22, 85.43)
+            grid.clusters(zoom, (lat - 0.03, lon - 0.045, lat + 0.03, lon + 0.045))
+        row.append(f"pan {(time.perf_counter() - start) / pans * 1e3:6.3f} ms")
+        rows.append((f"{n:,} drivers", " | ".join(row)))
+    report(f"clustering at zoom {zoom}", rows)
+
+
+def bench_haversine(n: int = 20000, repeat: int = 20):
+    """Scalar haversine loop vs haversine_many (NumPy and pure-Python) and distance_matrix."""
+    fleet = random_fleet(n)
+    lats = [d[2] for d in fleet]
+    lons = [d[3] for d in fleet]
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - start) / repeat
+
+    scalar = timed(lambda: [haversine(27.7172, 85.3240, la, lo) for la, lo in zip(lats, lons)])
+    rows = [("scalar loop", f"{scalar * 1e3:8.2f} ms")]
+    numpy = geo.np
+    for label, backend in (("haversine_many, NumPy", numpy), ("haversine_many, pure Python", None)):
+        if label.endswith("NumPy") and numpy is None:
+            rows.append((label, "NumPy not installed"))
+            continue
+        geo.np = backend
+        try:
+            t = timed(lambda: geo.haversine_many(27.7172, 85.3240, lats, lons))
+        finally:
+            geo.np = numpy
+        rows.append((label, f"{t * 1e3:8.2f} ms  ({scalar / t:.1f}x)"))
+    if numpy is not None:
+        m = 100
+        t = timed(lambda: geo.distance_matrix(lats[:m], lons[:m], lats, lons))
+        rows.append((f"distance_matrix {m}x{n:,}", f"{t * 1e3:8.2f} ms"))
+    report(f"distances from one point to {n:,} points", rows)
+
+
+def bench_autocomplete(history: int = 5000, typed: int = 300):
+    """Per-keystroke suggestion latency from the local prefix index, and how often it needs the network."""
+    import autocomplete
+    import gazetteer
+    rng = random.Random(14)
+    with open(gazetteer.SEED_PATH, encoding="utf-8") as f:
+        places = [row["name"] for row in csv.DictReader(f)]
+    streets = ["Marg", "Chowk", "Tole", "Galli", "Road", "Path"]
+    past = [(f"{rng.choice(places)} {rng.choice(streets)} {rng.randint(1, 40)}", rng.randint(1, 20))
+            for _ in range(history)]
+    start = time.perf_counter()
+    index = autocomplete.build_suggestion_index(POPULAR_PLACES, past, [p.lower() for p in places])
+    build = time.perf_counter() - start
+
+    samples, fallbacks, keystrokes = [], 0, 0
+    targets = [rng.choice(places + [p for p, _ in past]) for _ in range(typed)]
+    # a tenth of the users type something the index has never seen
+    targets += [f"Ward {rng.randint(1, 32)} Sundarijal" for _ in range(typed // 10)]
+    for text in targets:
+        for n in range(1, len(text) + 1):
+            keystrokes += 1
+            t = time.perf_counter()
+            found = index.complete(text[:n])
+            if not found and not index.known_empty(text[:n]):
+                fallbacks += 1
+                index.mark_empty(text[:n])  # what on_items does when the network has nothing
+            samples.append((time.perf_counter() - t) * 1e6)
+    report(f"autocomplete over {len(index):,} phrases, {keystrokes:,} keystrokes", [
+        ("index build", f"{build * 1e3:.1f} ms"),
+        ("per keystroke", f"p50 {percentile(samples, 50):.0f} us  p95 {percentile(samples, 95):.0f} us  "
+                          f"p99 {percentile(samples, 99):.0f} us"),
+        ("network searches", f"{fallbacks} (was one per debounced keystroke)"),
+    ])
+
+
+def bench_gazetteer(queries: int = 2000):
+    """Offline suggestion latency: every typed prefix of the bundled place names, plus typos."""
+    import gazetteer
+    rng = random.Random(13)
+    with tempfile.TemporaryDirectory() as tmp:
+        gaz = gazetteer.Gazetteer(os.path.join(tmp, "gaz.db"))
+        start = time.perf_counter()
+        size = len(gaz)
+        load = time.perf_counter() - start
+        names = [p[0] for p in gaz._places]
+        typed, typos = [], []
+        for _ in range(queries):
+            name = rng.choice(names)
+            typed.append(name[:rng.randint(1, len(name))])
+            i = rng.randrange(len(name))
+            typos.append(name[:i] + name[i + 1:])
+        rows = [("index load (seed + learned)", f"{load * 1e3:.1f} ms for {size} places")]
+        for label, qs in (("prefix search", typed), ("search with a typo", typos)):
+            samples = []
+            for q in qs:
+                t = time.perf_counter()
+                gaz.search(q)
+                samples.append((time.perf_counter() - t) * 1e6)
+            rows.append((label, f"p50 {percentile(samples, 50):.0f} us  p95 {percentile(samples, 95):.0f} us  "
+                                f"max {max(samples):.0f} us"))
+        gaz.close()
+    report(f"gazetteer suggestions, {queries} queries each", rows)
+
+
+def bench_dispatch(drivers: int = 400, bookings: int = 200, solver_sizes=((50, 100), (200, 400), (500, 1000))):
+    """Dispatch simulation: first free driver vs nearest-first vs batch matching."""
+    import dispatch
+    rng = random.Random(21)
+    fleet = [(rng.uniform(27.62, 27.78), rng.uniform(85.22, 85.43)) for _ in range(drivers)]
+    pickups = {f"Pickup {i}": (rng.uniform(27.62, 27.78), rng.uniform(85.22, 85.43)) for i in range(bookings)}
+
+    def run(assign):
+        with temp_database():
+            db.write(lambda conn: conn.executemany(
+                """INSERT INTO users (username,password,role,name,address,lat,lon)
+                   VALUES (?, 'x', 'driver', ?, '', ?, ?)""",
+                ((f"bench_driver{i}", f"Driver {i}", lat, lon) for i, (lat, lon) in enumerate(fleet))))
+            ok, _, created = booking.create_bookings_bulk(
+                (i + 1, place, "Airport", "2025-01-01", "10:00") for i, place in enumerate(pickups))
+            start = time.perf_counter()
+            assign([b["id"] for b in created])
+            elapsed = time.perf_counter() - start
+            with db.connection() as conn:
+                rows = conn.execute("""SELECT b.pickup, u.lat, u.lon FROM bookings b JOIN users u ON u.id=b.driver_id
+                                       WHERE b.status='assigned'""").fetchall()
+        km = [haversine(*pickups[r["pickup"]], r["lat"], r["lon"]) for r in rows]
+        return (f"{len(rows)} assigned, pickup avg {sum(km) / len(km):5.2f} km, max {max(km):5.2f} km, "
+                f"{elapsed * 1e3:7.1f} ms")
+
+    rank = dispatch.ranker(locate=pickups.get)
+    rows = [
+        ("first free driver (old)", run(lambda ids: [booking.auto_assign_driver(b) for b in ids])),
+        ("nearest first, one at a time", run(lambda ids: [booking.auto_assign_driver(b, rank=rank) for b in ids])),
+        ("batch matching (Hungarian)", run(lambda ids: dispatch.assign_pending(len(ids), geocoder=pickups.get))),
+    ]
+    numpy = dispatch.np
+    for n, m in solver_sizes:
+        costs = [[rng.uniform(0, 20) for _ in range(m)] for _ in range(n)]
+        times = []
+        for backend in (numpy, None):
+            dispatch.np = backend
+            try:
+                start = time.perf_counter()
+                dispatch.min_cost_assignment(costs)
+                times.append(f"{'NumPy' if backend is not None else 'pure Python'} "
+                             f"{(time.perf_counter() - start) * 1e3:7.1f} ms")
+            finally:
+                dispatch.np = numpy
+        rows.append((f"solver {n} x {m}", " | ".join(times)))
+    report(f"dispatch of {bookings} simultaneous bookings to {drivers} drivers", rows)
+
+
+def bench_geocache(n: int = 2000):
+    """Geocode cache lookups after a restart: disk hits, then in-memory LRU hits."""
+    fleet = random_fleet(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "geocode_cache.db")
+        cache = PersistentCache(path, "geocode", geo.GEOCODE_TTL, geo.GEOCODE_NEGATIVE_TTL)
+        for d in fleet:
+            cache.set(f"ward {d[0]}, kathmandu", (d[2], d[3]))
+        cache.close()
+
+        warm = PersistentCache(path, "geocode", geo.GEOCODE_TTL, geo.GEOCODE_NEGATIVE_TTL, max_memory=n)
+        rows = []
+        for label in ("first lookup after restart (disk)", "repeat lookup (memory LRU)"):
+            start = time.perf_counter()
+            for d in fleet:
+                warm.get(f"ward {d[0]}, kathmandu")
+            rows.append((label, f"{(time.perf_counter() - start) / n * 1e6:.1f} us/lookup"))
+        rows.append(("hit rate", f"{warm.hit_rate():.0%}"))
+        warm.close()
+    report(f"geocode cache, {n} addresses", rows)
+
+
+class _NoFlight:
+    # what geocode did before single-flight: every caller goes to the network
+    stats = {}
+
+    def do(self, key, fn, *args):
+        return fn(*args)
+
+
+def bench_singleflight(threads: int = 16, lookups: int = 20, addresses: int = 40, latency: float = 0.05):
+    """Concurrent geocodes of overlapping addresses, with and without request coalescing."""
+    from gazetteer import Gazetteer
+    counter = {"requests": 0}
+
+    def search(path, query):
+        counter["requests"] += 1
+        return [{"lat": "27.7", "lon": "85.3"}]
+
+    rng = random.Random(16)
+    plans = [[f"Customer street {rng.randrange(addresses)}" for _ in range(lookups)] for _ in range(threads)]
+    real = geo.NOMINATIM_URL, geo.HTTP, geo.GEOCODE_CACHE, geo.GAZETTEER, geo.GEOCODE_FLIGHTS
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp, local_service({"/search": search}, latency) as url:
+        try:
+            for label, flights in (("every caller fetches", _NoFlight()), ("single-flight", SingleFlight())):
+                counter["requests"] = 0
+                geo.NOMINATIM_URL, geo.HTTP = url + "/search", HttpClient("bench", max_idle_per_host=threads)
+                geo.GEOCODE_CACHE = PersistentCache(os.path.join(tmp, f"{label}.db"), "geocode", 100, 10)
+                geo.GAZETTEER = Gazetteer(os.path.join(tmp, f"{label}-gaz.db"), seed_path=None)
+                geo.GEOCODE_FLIGHTS = flights
+                barrier = threading.Barrier(threads)
+
+                def worker(plan):
+                    barrier.wait()
+                    for addr in plan:
+                        geo.geocode(addr)
+
+                workers = [threading.Thread(target=worker, args=(plan,)) for plan in plans]
+                start = time.perf_counter()
+                for w in workers:
+                    w.start()
+                for w in workers:
+                    w.join()
+                elapsed = time.perf_counter() - start
+                rows.append((label, f"{counter['requests']} requests, {elapsed:.2f}s"))
+                geo.GEOCODE_CACHE.close()
+                geo.GAZETTEER.close()
+                geo.HTTP.close()
+        finally:
+            geo.NOMINATIM_URL, geo.HTTP, geo.GEOCODE_CACHE, geo.GAZETTEER, geo.GEOCODE_FLIGHTS = real
+    report(f"{threads} threads x {lookups} geocodes over {addresses} addresses "
+           f"({latency * 1e3:.0f} ms per request)", rows)
+
+
+def bench_tasks(lookups: int = 6, latency: float = 0.3):
+    """UI loop lag while `lookups` slow network calls run inline vs via TkTaskRunner."""
+    import _tkinter
+    import tkinter
+
+    def fake_lookup(q):
+        time.sleep(latency)  # stand-in for a Nominatim/OSRM round trip
+        return q
+
+    rows = []
+    for label in ("inline on the Tk thread", "TkTaskRunner"):
+        interp = tkinter.Tcl()
+        runner = TkTaskRunner(interp, poll_ms=10)
+        runner.start_heartbeat(20)
+        results = []
+        start = time.perf_counter()
+        if label == "TkTaskRunner":
+            # geocode pickup + drop together, then a burst of keystrokes of which only the last matters
+            runner.gather("route", [(fake_lookup, ("A",)), (fake_lookup, ("B",))], on_done=results.extend)
+            for i in range(lookups - 2):
+                runner.submit("suggest", fake_lookup, f"q{i}", on_done=results.append)
+            done = lambda: runner._pending == 0  # noqa: E731
+        else:
+            interp.after(0, lambda: [results.append(fake_lookup(i)) for i in range(lookups)])
+            done = lambda: len(results) == lookups  # noqa: E731
+        while not done():
+            interp.dooneevent(0)
+        elapsed = time.perf_counter() - start
+        settle = time.perf_counter() + 0.1  # let the overdue heartbeat fire
+        while time.perf_counter() < settle:
+            interp.dooneevent(_tkinter.DONT_WAIT)
+        lag = list(runner.ui_lag)
+        runner.shutdown()
+        rows.append((label, f"done in {elapsed:.2f}s, UI lag p95 {percentile(lag, 95):6.1f} ms, "
+                            f"max {max(lag, default=0.0):6.1f} ms"))
+    report(f"{lookups} lookups of {latency * 1e3:.0f} ms each", rows)
+
+
+# approximate coordinates of booking_ui.POPULAR_PLACES
+POPULAR_PLACES = {
+    "Thamel": (27.7154, 85.3123),
+    "Patan Durbar Square": (27.6727, 85.3253),
+    "Swayambhunath (Monkey Temple)": (27.7149, 85.2904),
+    "Pashupatinath Temple": (27.7105, 85.3488),
+    "Boudhanath Stupa": (27.7215, 85.3620),
+    "Tribhuvan International Airport (KTM)": (27.6966, 85.3591),
+    "New Road": (27.7033, 85.3110),
+    "Lazimpat": (27.7223, 85.3195),
+    "Bhatbhateni Supermarket": (27.7206, 85.3304),
+    "Durbar Marg": (27.7105, 85.3178),
+}
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default backlog of 5 drops bursts of concurrent connects
+
+
+@contextmanager
+def local_service(routes, latency: float = 0.0, handshake: float = 0.0):
+    """Local keep-alive JSON server standing in for a remote API.
+
+    `routes` maps a path prefix to fn(path, query) -> body. Every answer is
+    delayed by `latency`, and every new connection by `handshake` (what a
+    TCP + TLS setup to a distant host costs). Yields the base URL.
+    """
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def setup(self):
+            super().setup()
+            time.sleep(handshake)
+
+        def do_GET(self):
+            parts = urlparse.urlsplit(self.path)
+            prefix = max((p for p in routes if parts.path.startswith(p)), key=len)
+            time.sleep(latency)
+            data = json.dumps(routes[prefix](parts.path, dict(urlparse.parse_qsl(parts.query)))).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            return
+
+    server = _Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def osrm_route(path: str, query: dict, points: int = 1500):
+    """A long synthetic OSRM geometry between the two endpoints in `path`."""
+    coords_part = path.split("/driving/")[1]
+    (slon, slat), (dlon, dlat) = [tuple(map(float, p.split(","))) for p in coords_part.split(";")]
+    coords = [[slon + (dlon - slon) * i / (points - 1) + 1e-4 * math.sin(i / 7.0),
+               slat + (dlat - slat) * i / (points - 1) + 1e-4 * math.cos(i / 5.0)] for i in range(points)]
+    return {"routes": [{"geometry": {"coordinates": coords}}]}
+
+
+def bench_http(n: int = 100, latency: float = 0.005, handshake: float = 0.05):
+    """Sequential API calls: a fresh urllib connection per call vs the keep-alive HttpClient."""
+    answer = {"/search": lambda path, q: [{"lat": "27.7154", "lon": "85.3123"}]}
+    rows = []
+    with local_service(answer, latency, handshake) as url:
+        start = time.perf_counter()
+        for i in range(n):
+            req = urlrequest.Request(f"{url}/search?q=place+{i}", headers={"User-Agent": "bench"})
+            with urlrequest.urlopen(req, timeout=8) as resp:
+                json.loads(resp.read().decode("utf-8"))
+        per_call = time.perf_counter() - start
+        client = HttpClient("bench")
+        start = time.perf_counter()
+        for i in range(n):
+            client.get_json(f"{url}/search", {"q": f"place {i}"})
+        pooled = time.perf_counter() - start
+        client.close()
+    rows.append(("urllib, new connection per call", f"{per_call / n * 1e3:.1f} ms/call"))
+    rows.append(("HttpClient keep-alive", f"{pooled / n * 1e3:.1f} ms/call"))
+    rows.append(("connections opened / reused",
+                 f"{client.stats['connections_opened']} / {client.stats['connections_reused']} "
+                 f"({client.reuse_rate():.0%} reuse)"))
+    report(f"{n} calls, {latency * 1e3:.0f} ms server time, {handshake * 1e3:.0f} ms connection setup", rows)
+
+
+def bench_preload(drivers: int = 20, latency: float = 0.1, min_interval: float = geo.NOMINATIM_MIN_INTERVAL,
+                  workers: int = 4):
+    """Driver location backfill at Nominatim's real request spacing, and what it does to a UI lookup.
+
+    Nominatim is simulated locally. Half-way through the backfill the "UI"
+    geocodes one address and we time how long it waits. At one request per
+    second the throttle, not the workers, sets the pace; what matters is
+    whether the preload's queued requests hold the UI lookup back.
+    """
+    import contextlib
+    import fleet
+    from gazetteer import Gazetteer
+    rng = random.Random(17)
+
+    def search(path, query):
+        return [{"lat": str(rng.uniform(27.6, 27.8)), "lon": str(rng.uniform(85.2, 85.45))}]
+
+    rows = []
+    real = geo.NOMINATIM_URL, geo.HTTP, geo.GEOCODE_CACHE, geo.GAZETTEER
+    runs = (("1 worker", 1, True), (f"{workers} workers, no priority", workers, False),
+            (f"{workers} workers, UI first", workers, True))
+    with tempfile.TemporaryDirectory() as tmp, local_service({"/search": search}, latency) as url:
+        try:
+            for n, (label, pool, priority) in enumerate(runs):
+                with temp_database():
+                    db.write(lambda conn: conn.executemany(
+                        """INSERT INTO users (username,password,role,name,address)
+                           VALUES (?, 'x', 'driver', ?, ?)""",
+                        ((f"bench_driver{i}", f"Driver {i}", f"Ward {i}, Kathmandu") for i in range(drivers))))
+                    host = urlparse.urlsplit(url).hostname
+                    geo.NOMINATIM_URL = url + "/search"
+                    geo.HTTP = HttpClient("bench", min_interval={host: min_interval})
+                    if not priority:
+                        geo.HTTP.background = contextlib.nullcontext
+                    geo.GEOCODE_CACHE = PersistentCache(os.path.join(tmp, f"geo{n}.db"), "geocode", 100, 10)
+                    geo.GAZETTEER = Gazetteer(os.path.join(tmp, f"gaz{n}.db"), seed_path=None)
+                    ui_wait = []
+
+                    def ui_lookup():
+                        time.sleep(drivers * min_interval / 2)
+                        began = time.perf_counter()
+                        geo.geocode("Interactive pickup, Lalitpur")
+                        ui_wait.append(time.perf_counter() - began)
+                    ui = threading.Thread(target=ui_lookup)
+                    start = time.perf_counter()
+                    ui.start()
+                    located = fleet.backfill_driver_coords(workers=pool)
+                    elapsed = time.perf_counter() - start
+                    ui.join()
+                    rows.append((label, f"{located} located in {elapsed:5.1f}s, "
+                                        f"UI lookup waited {ui_wait[0] * 1e3:6.0f} ms"))
+                    geo.GEOCODE_CACHE.close()
+                    geo.GAZETTEER.close()
+                    geo.HTTP.close()
+        finally:
+            geo.NOMINATIM_URL, geo.HTTP, geo.GEOCODE_CACHE, geo.GAZETTEER = real
+    report(f"backfill of {drivers} drivers ({latency * 1e3:.0f} ms per request, "
+           f"{min_interval * 1e3:.0f} ms min spacing)", rows)
+
+
+def bench_routes(requests: int = 300, latency: float = 0.15):
+    """Repeated routes between POPULAR_PLACES through the route cache (OSRM simulated)."""
+    rng = random.Random(11)
+    names = list(POPULAR_PLACES)
+    # popular pairs dominate: a skewed pick over the place list
+    trips = [(names[min(int(rng.expovariate(0.5)), 9)], names[min(int(rng.expovariate(0.4)), 9)])
+             for _ in range(requests)]
+    trips = [(a, b) for a, b in trips if a != b]
+    real = geo.OSRM_URL, geo.HTTP, geo.ROUTE_CACHE
+    with tempfile.TemporaryDirectory() as tmp, local_service({"/": osrm_route}, latency) as url:
+        geo.OSRM_URL, geo.HTTP = url + "/route/v1/driving", HttpClient("bench")
+        geo.ROUTE_CACHE = PersistentCache(os.path.join(tmp, "routes.db"), "routes",
+                                          geo.ROUTE_TTL, geo.ROUTE_NEGATIVE_TTL, max_memory=256)
+        try:
+            start = time.perf_counter()
+            for a, b in trips:
+                geo.get_route_coords(*POPULAR_PLACES[a], *POPULAR_PLACES[b])
+            elapsed = time.perf_counter() - start
+            stats = dict(geo.ROUTE_CACHE.stats)
+            path = geo.get_route_coords(*POPULAR_PLACES[names[0]], *POPULAR_PLACES[names[1]])
+            hit = time.perf_counter()
+            geo.get_route_coords(*POPULAR_PLACES[names[0]], *POPULAR_PLACES[names[1]])
+            hit = time.perf_counter() - hit
+        finally:
+            geo.ROUTE_CACHE.close()
+            geo.HTTP.close()
+            geo.OSRM_URL, geo.HTTP, geo.ROUTE_CACHE = real
+    encoded = geo.encode_polyline(path, geo.ROUTE_POLYLINE_PRECISION)
+    hits = stats["memory_hits"] + stats["disk_hits"]
+    report(f"{len(trips)} route requests over {len(names)} popular places "
+           f"(OSRM simulated at {latency * 1e3:.0f} ms)", [
+        ("total time", f"{elapsed:.2f}s vs {len(trips) * latency:.2f}s uncached"),
+        ("cache hits / misses", f"{hits} / {stats['misses']} ({hits / len(trips):.0%})"),
+        ("cached route lookup", f"{hit * 1e3:.2f} ms ({len(path)} points)"),
+        ("stored geometry", f"{len(encoded):,} bytes polyline vs {len(json.dumps(path)):,} bytes JSON"),
+    ])
+
+
+def winding_route(km: float = 200.0, step_m: float = 10.0, seed: int = 12):
+    """A long mountain-road-like path: a drifting heading with tight switchbacks."""
+    rng = random.Random(seed)
+    lat, lon, heading = 27.7172, 85.3240, math.radians(-80)
+    path = [(lat, lon)]
+    for i in range(int(km * 1000 / step_m)):
+        heading += rng.gauss(0, 0.05) + 0.3 * math.sin(i / 40.0) / 40.0
+        lat += step_m * math.cos(heading) / 111320.0
+        lon += step_m * math.sin(heading) / (111320.0 * math.cos(math.radians(lat)))
+        path.append((lat, lon))
+    return path
+
+
+def _project(path, zoom: float):
+    # the per-point Web Mercator math TkinterMapView's CanvasPath.draw() repeats on every redraw
+    n = 2.0 ** zoom * 256
+    return [((lon + 180.0) / 360.0 * n,
+             (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+            for lat, lon in path]
+
+
+def bench_simplify(km: float = 200.0, zooms=(8, 11, 13, 16), redraws: int = 20):
+    """Route redraw cost with the full OSRM geometry vs the zoom-simplified path."""
+    path = winding_route(km)
+    route = geo.ZoomSimplifiedPath(path)
+    canvas = None
+    try:
+        import tkinter
+        root = tkinter.Tk()
+        canvas = tkinter.Canvas(root, width=860, height=320)
+    except Exception:
+        root = None  # no display: time the projection only
+
+    def redraw(points, zoom):
+        start = time.perf_counter()
+        for _ in range(redraws):
+            flat = [c for xy in _project(points, zoom) for c in xy]
+            if canvas is not None:
+                canvas.delete("route")
+                canvas.create_line(*flat, width=4, tags="route")
+        return (time.perf_counter() - start) / redraws * 1e3
+
+    rows = []
+    for zoom in zooms:
+        start = time.perf_counter()
+        simplified = route.at(zoom)
+        first = (time.perf_counter() - start) * 1e3
+        start = time.perf_counter()
+        route.at(zoom)
+        again = (time.perf_counter() - start) * 1e3
+        rows.append((f"zoom {zoom}: points", f"{len(path):,} -> {len(simplified):,}"))
+        rows.append((f"zoom {zoom}: redraw", f"{redraw(path, zoom):.2f} ms -> {redraw(simplified, zoom):.2f} ms"))
+        rows.append((f"zoom {zoom}: simplify / memoised", f"{first:.2f} ms / {again * 1e3:.1f} us"))
+    if root is not None:
+        root.destroy()
+    report(f"{km:.0f} km route, {len(path):,} points "
+           f"({'canvas' if canvas is not None else 'projection only, no display'})", rows)
+
+
+BENCHMARKS = {
+    "assign": bench_assign,
+    "async": bench_async,
+    "autocomplete": bench_autocomplete,
+    "bulk": bench_bulk,
+    "cluster": bench_cluster,
+    "dispatch": bench_dispatch,
+    "gazetteer": bench_gazetteer,
+    "geocache": bench_geocache,
+    "haversine": bench_haversine,
+    "http": bench_http,
+    "lifecycle": bench_lifecycle,
+    "markers": bench_markers,
+    "pool": bench_pool,
+    "preload": bench_preload,
+    "routes": bench_routes,
+    "simplify": bench_simplify,
+    "singleflight": bench_singleflight,
+    "slots": bench_slots,
+    "spatial": bench_spatial,
+    "stress": bench_stress,
+    "tasks": bench_tasks,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("name", choices=sorted(BENCHMARKS) + ["all"])
+    args = parser.parse_args()
+    names = sorted(BENCHMARKS) if args.name == "all" else [args.name]
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,185 @@
-from typing import List, Dict, Optional, Tuple
-from db import get_conn
+import calendar
+import queue
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from db import DEFAULT_TRIP_MINUTES, get_conn, submit_write, write
 
+BULK_CHUNK_SIZE = 500  # rows per multi-row INSERT in create_bookings_bulk
+BULK_QUEUE_CHUNKS = 2  # validated chunks waiting for the writer in create_bookings_bulk
+PAGE_SIZE = 200        # default page size for list_bookings_page
+MAX_TRIP_MINUTES = 12 * 60  # longest allowed duration; bounds the overlap range scans
+SLOT_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S")
 
-def create_booking(customer_id: int, pickup: str, dropoff: str, date: str, time: str) -> Tuple[bool, str, Optional[Dict]]:
+# Active bookings of a driver that overlap [:start, :end), other than booking :id.
+# No booking lasts longer than MAX_TRIP_MINUTES, so one that starts earlier than
+# :start minus that can't reach :start; that lower bound makes the check a range
+# scan on idx_bookings_driver_start instead of a walk over the driver's history.
+OVERLAP_SQL = f"""SELECT 1 FROM bookings b
+                  WHERE b.driver_id={{driver}} AND b.status IN ('assigned','booked')
+                  AND b.start_ts > :start - {MAX_TRIP_MINUTES * 60} AND b.start_ts < :end
+                  AND b.start_ts + b.duration_min * 60 > :start AND b.id<>:id"""
+# bookings from before start_ts existed whose date/time didn't parse: exact slot match
+LEGACY_OVERLAP_SQL = """SELECT 1 FROM bookings b
+                        WHERE b.driver_id={driver} AND b.status IN ('assigned','booked')
+                        AND b.date=:date AND b.time=:time AND b.id<>:id"""
+
+# keyset orderings for list_bookings_page: (ORDER BY columns, cursor columns)
+PAGE_ORDERS = {
+    "id": ("id", ("id",)),
+    "schedule": ("date, time, id", ("date", "time", "id")),
+}
+
+
+def slot_start(date: str, time: str) -> Optional[int]:
+    """Booking start as a Unix timestamp, or None if date/time don't parse.
+
+    The wall-clock date and time are read as UTC. Only differences between
+    timestamps matter, and Nepal has no daylight saving time.
+    """
+    text = f"{date.strip()} {time.strip()}"
+    for fmt in SLOT_FORMATS:
+        try:
+            return calendar.timegm(datetime.strptime(text, fmt).timetuple())
+        except ValueError:
+            continue
+    return None
+
+
+def now_slot() -> int:
+    """The current wall-clock time on slot_start()'s scale."""
+    return calendar.timegm(datetime.now().timetuple())
+
+
+def _slot(date: str, time: str, duration_min: int) -> Tuple[int, int]:
+    start = slot_start(date, time)
+    if start is None:
+        raise ValueError("Date must be YYYY-MM-DD and time HH:MM.")
+    if not 0 < duration_min <= MAX_TRIP_MINUTES:
+        raise ValueError(f"Duration must be between 1 and {MAX_TRIP_MINUTES} minutes.")
+    return start, duration_min
+
+
+def create_booking(customer_id: int, pickup: str, dropoff: str, date: str, time: str,
+                   duration_min: int = DEFAULT_TRIP_MINUTES) -> Tuple[bool, str, Optional[Dict]]:
     if not all([customer_id, pickup, dropoff, date, time]):
         return False, "All fields are required.", None
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""INSERT INTO bookings (customer_id, pickup, dropoff, date, time, status, driver_id)
-                   VALUES (?, ?, ?, ?, ?, 'booked', NULL)""",
-                (customer_id, pickup.strip(), dropoff.strip(), date.strip(), time.strip()))
-    booking_id = cur.lastrowid
-    conn.commit()
-    cur.execute("SELECT * FROM bookings WHERE id=?", (booking_id,))
-    row = cur.fetchone()
-    conn.close()
-    return True, f"Booking created with ID {booking_id}.", dict(row) if row else None
+    try:
+        start, duration_min = _slot(date, time, duration_min)
+    except ValueError as e:
+        return False, str(e), None
+
+    def insert(conn):
+        cur = conn.execute("""INSERT INTO bookings (customer_id, pickup, dropoff, date, time, status, driver_id,
+                                                    start_ts, duration_min)
+                              VALUES (?, ?, ?, ?, ?, 'booked', NULL, ?, ?)
+                              RETURNING *""",
+                           (customer_id, pickup.strip(), dropoff.strip(), date.strip(), time.strip(),
+                            start, duration_min))
+        return dict(cur.fetchone())
+
+    row = write(insert)
+    return True, f"Booking created with ID {row['id']}.", row
+
+
+def _booking_values(item) -> Tuple:
+    if isinstance(item, dict):
+        item = (item.get("customer_id"), item.get("pickup"), item.get("dropoff"),
+                item.get("date"), item.get("time"), item.get("duration_min", DEFAULT_TRIP_MINUTES))
+    customer_id, pickup, dropoff, date, time, *rest = item
+    if not all([customer_id, pickup, dropoff, date, time]):
+        raise ValueError("All fields are required.")
+    for name, value in (("pickup", pickup), ("dropoff", dropoff), ("date", date), ("time", time)):
+        if not isinstance(value, str):
+            raise TypeError(f"{name} must be text.")
+    start, duration_min = _slot(date, time, rest[0] if rest else DEFAULT_TRIP_MINUTES)
+    return customer_id, pickup.strip(), dropoff.strip(), date.strip(), time.strip(), start, duration_min
+
+
+class _BulkAborted(Exception):
+    """Put on create_bookings_bulk's feed to roll the batch back."""
+
+
+def create_bookings_bulk(bookings: Iterable,
+                         chunk_size: int = BULK_CHUNK_SIZE,
+                         on_created: Optional[Callable[[List[Dict]], None]] = None
+                         ) -> Tuple[bool, str, List[Dict]]:
+    """Create many bookings in one transaction.
+
+    `bookings` yields dicts (customer_id, pickup, dropoff, date, time and
+    optionally duration_min) or tuples in that order. It is read and
+    validated here, on the caller's thread, one chunk at a time. Each chunk
+    is passed through a queue of BULK_QUEUE_CHUNKS to the write job, which
+    inserts it while the next one is validated. Memory therefore stays
+    bounded however long the feed is. Created rows are returned, unless
+    `on_created` is given: then each chunk of rows is passed to it (on the
+    writer thread) and not accumulated. One invalid entry rolls back the
+    whole batch.
+    """
+    feed = queue.Queue(BULK_QUEUE_CHUNKS)
+
+    def insert(conn):
+        created = []
+        while True:
+            chunk = feed.get()
+            if chunk is None:
+                return created
+            if isinstance(chunk, _BulkAborted):
+                raise chunk
+            size, params = chunk
+            # sqlite3's executemany() drops RETURNING rows, so each chunk is
+            # one multi-row INSERT instead
+            placeholders = ", ".join(["(?, ?, ?, ?, ?, 'booked', NULL, ?, ?)"] * size)
+            cur = conn.execute(f"""INSERT INTO bookings (customer_id, pickup, dropoff, date, time, status, driver_id,
+                                                         start_ts, duration_min)
+                                   VALUES {placeholders}
+                                   RETURNING *""", params)
+            rows = [dict(r) for r in cur.fetchall()]
+            if on_created:
+                on_created(rows)
+            else:
+                created.extend(rows)
+
+    done = submit_write(insert)
+
+    def hand_over(chunk) -> bool:
+        # the write job stops reading the feed if it fails; don't wait on it then
+        while not done.done():
+            try:
+                feed.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    count = 0
+    items = iter(bookings)
+    try:
+        while True:
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                break
+            params = []
+            for n, item in enumerate(chunk, start=count + 1):
+                try:
+                    params.extend(_booking_values(item))
+                except (ValueError, TypeError) as e:
+                    hand_over(_BulkAborted())
+                    try:
+                        done.result()
+                    except _BulkAborted:
+                        pass
+                    return False, f"Booking #{n}: {e}", []
+            if not hand_over((len(chunk), params)):
+                break
+            count += len(chunk)
+    except BaseException:
+        # the feed itself failed: roll back rather than leave the writer waiting
+        hand_over(_BulkAborted())
+        raise
+    hand_over(None)
+    created = done.result()
+    return True, f"{count} bookings created.", created
 
 
 def list_bookings_by_customer(customer_id: int) -> List[Dict]:
@@ -27,110 +191,270 @@ def list_bookings_by_customer(customer_id: int) -> List[Dict]:
     return rows
 
 
-def update_booking(booking_id: int,
-                   pickup: Optional[str] = None,
-                   dropoff: Optional[str] = None,
-                   date: Optional[str] = None,
-                   time: Optional[str] = None) -> Tuple[bool, str, Optional[Dict]]:
+def place_counts(customer_id: int, limit: int = 5000) -> List[Tuple[str, int]]:
+    """Distinct pickup/dropoff texts of a customer's bookings with how often each was booked, most used first."""
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM bookings WHERE id=?", (booking_id,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return False, "Booking not found.", None
-    if row["status"] in ("cancelled", "completed"):
-        conn.close()
-        return False, "Cannot update a cancelled or completed booking.", None
-
-    new_pickup = pickup.strip() if pickup is not None else row["pickup"]
-    new_dropoff = dropoff.strip() if dropoff is not None else row["dropoff"]
-    new_date = date.strip() if date is not None else row["date"]
-    new_time = time.strip() if time is not None else row["time"]
-
-    cur.execute("""UPDATE bookings
-                   SET pickup=?, dropoff=?, date=?, time=?
-                   WHERE id=?""",
-                (new_pickup, new_dropoff, new_date, new_time, booking_id))
-    conn.commit()
-    cur.execute("SELECT * FROM bookings WHERE id=?", (booking_id,))
-    updated = dict(cur.fetchone())
+    cur.execute("""SELECT place, COUNT(*) AS n
+                   FROM (SELECT pickup AS place FROM bookings WHERE customer_id=:customer
+                         UNION ALL SELECT dropoff FROM bookings WHERE customer_id=:customer)
+                   GROUP BY place ORDER BY n DESC, place LIMIT :limit""", {"customer": customer_id, "limit": limit})
+    rows = [(r["place"], r["n"]) for r in cur.fetchall()]
     conn.close()
-    return True, "Booking updated.", updated
+    return rows
 
 
-def cancel_booking(booking_id: int) -> Tuple[bool, str]:
+def list_bookings_page(after: Optional[Tuple] = None,
+                       limit: int = PAGE_SIZE,
+                       order: str = "id",
+                       status: Optional[str] = None,
+                       driver_id: Optional[int] = None,
+                       customer_id: Optional[int] = None) -> Tuple[List[Dict], Optional[Tuple]]:
+    """Return one page of bookings and the cursor for the next page.
+
+    Keyset pagination: pass the returned cursor back as `after` to continue
+    where the previous page ended. Every page is an index range scan, so the
+    cost doesn't grow with how far the caller has scrolled. `order` is "id"
+    or "schedule" (date, time, id). The cursor is None after the last page.
+    """
+    order_by, cursor_cols = PAGE_ORDERS[order]
+    where, params = [], []
+    if after is not None:
+        where.append(f"({', '.join(cursor_cols)}) > ({', '.join('?' * len(cursor_cols))})")
+        params.extend(after)
+    for col, val in (("status", status), ("driver_id", driver_id), ("customer_id", customer_id)):
+        if val is not None:
+            where.append(f"{col}=?")
+            params.append(val)
+    sql = "SELECT * FROM bookings"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order_by} LIMIT ?"
+    params.append(limit)
+
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute("SELECT status FROM bookings WHERE id=?", (booking_id,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return False, "Booking not found."
-    if row["status"] == "cancelled":
-        conn.close()
-        return False, "Booking already cancelled."
-    cur.execute(
-        "UPDATE bookings SET status='cancelled' WHERE id=?", (booking_id,))
-    conn.commit()
+    cur.execute(sql, params)
+    rows = [dict(r) for r in cur.fetchall()]
     conn.close()
-    return True, "Booking cancelled."
+    cursor = tuple(rows[-1][c] for c in cursor_cols) if len(rows) == limit else None
+    return rows, cursor
 
 
-def auto_assign_driver(booking_id: int) -> Tuple[bool, str, Optional[int]]:
+def update_booking(booking_id: int,
+                   pickup: Optional[str] = None,
+                   dropoff: Optional[str] = None,
+                   date: Optional[str] = None,
+                   time: Optional[str] = None,
+                   duration_min: Optional[int] = None) -> Tuple[bool, str, Optional[Dict]]:
+    def apply(conn):
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM bookings WHERE id=?", (booking_id,))
+        row = cur.fetchone()
+        if not row:
+            return False, "Booking not found.", None
+        if row["status"] in ("cancelled", "completed"):
+            return False, "Cannot update a cancelled or completed booking.", None
+
+        new_pickup = pickup.strip() if pickup is not None else row["pickup"]
+        new_dropoff = dropoff.strip() if dropoff is not None else row["dropoff"]
+        new_date = date.strip() if date is not None else row["date"]
+        new_time = time.strip() if time is not None else row["time"]
+        new_duration = duration_min if duration_min is not None else row["duration_min"]
+        try:
+            start, new_duration = _slot(new_date, new_time, new_duration)
+        except ValueError as e:
+            return False, str(e), None
+
+        if row["driver_id"] is not None:
+            # the assigned driver must still be free for the new interval
+            moved = {"id": booking_id, "start_ts": start, "duration_min": new_duration,
+                     "date": new_date, "time": new_time}
+            overlap, params = overlap_check(moved, ":driver")
+            if cur.execute(overlap, dict(params, driver=row["driver_id"])).fetchone():
+                return False, "Driver has an overlapping booking at that time.", None
+
+        cur.execute("""UPDATE bookings
+                       SET pickup=?, dropoff=?, date=?, time=?, start_ts=?, duration_min=?
+                       WHERE id=?
+                       RETURNING *""",
+                    (new_pickup, new_dropoff, new_date, new_time, start, new_duration, booking_id))
+        return True, "Booking updated.", dict(cur.fetchone())
+
+    return write(apply)
+
+
+def cancel_booking(booking_id: int) -> Tuple[bool, str]:
+    def apply(conn):
+        cur = conn.cursor()
+        cur.execute("SELECT status FROM bookings WHERE id=?", (booking_id,))
+        row = cur.fetchone()
+        if not row:
+            return False, "Booking not found."
+        if row["status"] == "cancelled":
+            return False, "Booking already cancelled."
+        cur.execute(
+            "UPDATE bookings SET status='cancelled' WHERE id=?", (booking_id,))
+        return True, "Booking cancelled."
+
+    return write(apply)
+
+
+def overlap_check(target, driver: str) -> Tuple[str, Dict]:
+    """SQL (and its parameters) that finds a booking of `driver` clashing with `target`."""
+    params = {"id": target["id"], "start": target["start_ts"], "date": target["date"], "time": target["time"]}
+    if target["start_ts"] is None:
+        return LEGACY_OVERLAP_SQL.format(driver=driver), params
+    params["end"] = target["start_ts"] + target["duration_min"] * 60
+    return OVERLAP_SQL.format(driver=driver), params
+
+
+def auto_assign_driver(booking_id: int,
+                       rank: Optional[Callable] = None) -> Tuple[bool, str, Optional[int]]:
     """Try to automatically assign an available driver to the booking.
 
-    Strategy (simple): pick the first driver who does not already have a booking
-    at the same date+time with status 'assigned' or 'booked'. Returns (ok,msg,driver_id).
+    Strategy (simple): pick the first driver with no 'assigned' or 'booked'
+    booking whose time interval (start plus estimated duration) overlaps this
+    one. Returns (ok,msg,driver_id).
+
+    `rank(conn, booking_row)` replaces the strategy (see dispatch.py): it
+    returns driver ids best first, and the first one still free is claimed.
+    It runs on a pooled read connection before the write, so the writer
+    thread only ever does the claims.
+
+    Candidate selection and the claim are a single UPDATE run inside the
+    writer's BEGIN IMMEDIATE transaction. The status='booked' guard makes it a
+    compare-and-swap: a booking somebody else assigned meanwhile is left alone,
+    and no driver can be claimed twice for overlapping times. The overlap
+    check is made against the booking as it is when claimed, so a ranking
+    that went stale only costs a worse pick, never a double booking.
     """
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT date, time FROM bookings WHERE id=?", (booking_id,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return False, "Booking not found.", None
-    date = row["date"]
-    time = row["time"]
-
-    # Find drivers who are not busy at the given date/time
-    cur.execute(
-        """SELECT id FROM users WHERE role='driver' AND id NOT IN (
-                SELECT driver_id FROM bookings
-                WHERE date=? AND time=? AND driver_id IS NOT NULL
-                AND status IN ('assigned','booked')
-            )
-        """,
-        (date, time)
-    )
-    candidates = [r["id"] for r in cur.fetchall()]
-    if not candidates:
-        conn.close()
+    def check(target):
+        if not target:
+            return False, "Booking not found.", None
+        if target["status"] != "booked" or target["driver_id"] is not None:
+            return False, f"Booking is already {target['status']}.", None
+        return None
+
+    ranked = None
+    if rank is not None:
+        conn = get_conn()
+        try:
+            target = conn.execute("SELECT * FROM bookings WHERE id=?", (booking_id,)).fetchone()
+            refused = check(target)
+            if refused:
+                return refused
+            ranked = rank(conn, target)
+        finally:
+            conn.close()
+
+    def apply(conn):
+        target = conn.execute("SELECT * FROM bookings WHERE id=?", (booking_id,)).fetchone()
+        refused = check(target)
+        if refused:
+            return refused
+        if ranked is not None:
+            overlap, params = overlap_check(target, ":driver")
+            for driver_id in ranked:
+                row = conn.execute(
+                    f"""UPDATE bookings SET driver_id=:driver, status='assigned'
+                        WHERE id=:id AND status='booked' AND driver_id IS NULL
+                        AND NOT EXISTS ({overlap})
+                        RETURNING driver_id""", dict(params, driver=driver_id)).fetchone()
+                if row:
+                    return True, f"Driver {driver_id} assigned.", driver_id
+            return False, "No available drivers at that time.", None
+        overlap, params = overlap_check(target, "u.id")
+        row = conn.execute(
+            f"""WITH pick AS (
+                    SELECT u.id FROM users u
+                    WHERE u.role='driver' AND NOT EXISTS ({overlap})
+                    ORDER BY u.id LIMIT 1
+                )
+                UPDATE bookings SET driver_id=(SELECT id FROM pick), status='assigned'
+                WHERE id=:id AND status='booked' AND driver_id IS NULL
+                AND EXISTS (SELECT 1 FROM pick)
+                RETURNING driver_id""", params).fetchone()
+        if row:
+            return True, f"Driver {row['driver_id']} assigned.", row["driver_id"]
         return False, "No available drivers at that time.", None
 
-    # Choose the first candidate (simple policy). Could be improved to nearest/least-busy.
-    chosen = candidates[0]
-    cur.execute(
-        "UPDATE bookings SET driver_id=?, status='assigned' WHERE id=?", (chosen, booking_id))
-    conn.commit()
-    conn.close()
-    return True, f"Driver {chosen} assigned.", chosen
+    return write(apply)
 
 
-def complete_booking(booking_id: int) -> Tuple[bool, str]:
-    """Mark a booking as completed."""
+def assign_driver(booking_id: int, driver_id: int) -> Tuple[bool, str]:
+    """Assign a specific driver to a booking (the admin's manual override)."""
+    def apply(conn):
+        cur = conn.cursor()
+
+        # verify driver
+        cur.execute(
+            "SELECT id FROM users WHERE id=? AND role='driver'", (driver_id,))
+        if not cur.fetchone():
+            return False, "Driver not found."
+
+        # target booking
+        cur.execute("SELECT * FROM bookings WHERE id=?", (booking_id,))
+        target = cur.fetchone()
+        if not target:
+            return False, "Booking not found."
+        if target["status"] in ("cancelled", "completed"):
+            return False, "Cannot assign driver to cancelled or completed booking."
+
+        # Prevent assigning a driver if this customer already has an assigned/ booked
+        # booking for the same pickup+dropoff location (avoid duplicate assignments)
+        cur.execute(
+            """SELECT 1 FROM bookings WHERE customer_id=? AND pickup=? AND dropoff=?
+                       AND status IN ('assigned','booked') AND id<>?""",
+            (target["customer_id"], target["pickup"], target["dropoff"], booking_id)
+        )
+        if cur.fetchone():
+            return False, "This customer already has an assigned/ booked ride for the same route."
+
+        # overlap check: the driver's other active bookings whose intervals intersect this one
+        overlap, params = overlap_check(target, ":driver")
+        cur.execute(overlap, dict(params, driver=driver_id))
+        if cur.fetchone():
+            return False, "Driver has an overlapping booking at that time."
+
+        cur.execute("""UPDATE bookings SET driver_id=?, status='assigned' WHERE id=?""",
+                    (driver_id, booking_id))
+        return True, "Driver assigned."
+
+    return write(apply)
+
+
+def available_drivers(start_ts: Optional[int] = None,
+                      duration_min: int = DEFAULT_TRIP_MINUTES) -> List[Dict]:
+    """Drivers with no active booking overlapping [start_ts, start_ts + duration).
+
+    `start_ts` defaults to now (wall clock, as slot_start() reads it).
+    """
+    if start_ts is None:
+        start_ts = now_slot()
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute("SELECT status FROM bookings WHERE id=?", (booking_id,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return False, "Booking not found."
-    if row["status"] == "completed":
-        conn.close()
-        return False, "Booking already completed."
-    cur.execute(
-        "UPDATE bookings SET status='completed' WHERE id=?", (booking_id,))
-    conn.commit()
+    cur.execute(f"""SELECT id, name, username, address FROM users u
+                    WHERE role='driver' AND NOT EXISTS ({OVERLAP_SQL.format(driver="u.id")})
+                    ORDER BY id""",
+                {"start": start_ts, "end": start_ts + duration_min * 60, "id": 0})
+    rows = [dict(r) for r in cur.fetchall()]
     conn.close()
-    return True, "Booking marked as completed."
+    return rows
+
+
+def complete_booking(booking_id: int) -> Tuple[bool, str]:
+    """Mark a booking as completed."""
+    def apply(conn):
+        cur = conn.cursor()
+        cur.execute("SELECT status FROM bookings WHERE id=?", (booking_id,))
+        row = cur.fetchone()
+        if not row:
+            return False, "Booking not found."
+        if row["status"] == "completed":
+            return False, "Booking already completed."
+        cur.execute(
+            "UPDATE bookings SET status='completed' WHERE id=?", (booking_id,))
+        return True, "Booking marked as completed."
+
+    return write(apply)
@@ -12,8 +12,14 @@ import menu
 import math
 import booking as booking_api
 from db import get_conn
-from map import geocode, get_route_coords, nominatim_search, haversine, enable_location
-from driver import _load_drivers, show_nearby_drivers, start_driver_coord_preloader
+from map import (geocode, get_route_coords, nominatim_search, haversine, haversine_many, enable_location,
+                 ZoomSimplifiedPath)
+from dispatch import auto_assign
+from driver import show_nearby_drivers, start_driver_coord_preloader
+from fleet import load_drivers, located_drivers
+from markers import MarkerManager, view_bounds
+from tasks import TkTaskRunner
+from autocomplete import PrefixIndex, SUGGEST_LIMIT, build_suggestion_index, load_suggestion_index
 
 # CustomTkinter theme
 ctk.set_appearance_mode("light")
@@ -42,6 +48,7 @@ POPULAR_PLACES = [
 
 # Performance / tuning constants
 ANIMATION_STEPS = 8      # fewer frames -> faster animations
+ZOOM_WATCH_MS = 250      # how often the drawn route and driver markers are checked against the view
 
 # The route modal was removed in favor of inline route controls rendered
 # directly in the map overlay below. The functions that draw and fetch
@@ -99,7 +106,7 @@ def open_booking_window(root, user, prefill_pickup: str = "", prefill_drop: str
     tree.grid(row=6, column=0, columnspan=2, sticky="ew")
     panel.grid_columnconfigure(1, weight=1)
 
-    for r in _load_drivers():
+    for r in load_drivers():
         tree.insert("", "end", values=(r["id"], r["name"], r["username"]))
 
     # Book button
@@ -152,7 +159,7 @@ def open_booking_window(root, user, prefill_pickup: str = "", prefill_drop: str
 
         # No driver selected or selected driver unavailable: try automatic assignment
         if booking_id:
-            ok3, msg3, assigned_driver = booking_api.auto_assign_driver(
+            ok3, msg3, assigned_driver = auto_assign(
                 booking_id)
             if ok3:
                 messagebox.showinfo("Booking", f"{msg} {msg3}")
@@ -177,6 +184,12 @@ def open_menu_window(root, user):
     win.grab_set()
 
     def on_close():
+        tasks.shutdown()
+        if state.get('zoom_watch_id'):
+            try:
+                top.after_cancel(state['zoom_watch_id'])
+            except Exception:
+                pass
         win.destroy()
         try:
             root.deiconify()
@@ -192,6 +205,10 @@ def open_menu_window(root, user):
     mapw.set_position(27.7172, 85.3240)
     mapw.set_zoom(12)
 
+    # Geocoding, search and routing run off the Tk thread; a newer request on
+    # the same channel supersedes a stale one (e.g. while the user keeps typing)
+    tasks = TkTaskRunner(top)
+
     # Route/search button overlay removed; route controls are inline in the
     # bottom overlay panel (from/to inputs and suggestions).
 
@@ -356,6 +373,16 @@ def open_menu_window(root, user):
 
     # debounce state for suggestions
     search_job = {"id": None}
+    # keystrokes are answered from a local prefix index (popular places right
+    # away, known places and this customer's past trips once loaded in the
+    # background); only prefixes it has nothing for go to the network
+    suggestions = {"index": build_suggestion_index(POPULAR_PLACES)}
+
+    def on_suggestion_index(index: PrefixIndex):
+        suggestions["index"] = index
+
+    tasks.submit('autocomplete', load_suggestion_index, POPULAR_PLACES, user["id"],
+                 on_done=on_suggestion_index)
     # which field the suggestions are for: 'from' or 'to'
     suggest_field = {"value": None}
     # Track which fields have been explicitly selected from suggestions
@@ -403,24 +430,42 @@ def open_menu_window(root, user):
     def do_suggest_search(field: str):
         q = (from_var.get() if field == 'from' else to_var.get()).strip()
         if not q:
+            tasks.cancel('suggest')
             show_results([])
             return
-        items = nominatim_search(q)
-        # Keep only suggestions that start with the typed prefix when possible
-        starts = [it for it in items if it.get(
-            'display_name', '').lower().startswith(q.lower())]
-        items_to_show = starts if starts else items
-        # Do not auto-fill the entry with suggestions; only display suggestions
-        show_results(items_to_show)
+
+        def on_items(items):
+            index = suggestions["index"]
+            if not items:
+                index.mark_empty(q)
+            for it in items:
+                index.add(it.get('display_name', ''))
+            # Keep only suggestions that start with the typed prefix when possible
+            starts = [it for it in items if it.get(
+                'display_name', '').lower().startswith(q.lower())]
+            items_to_show = starts if starts else items
+            # Do not auto-fill the entry with suggestions; only display suggestions
+            show_results(items_to_show)
+
+        tasks.submit('suggest', nominatim_search, q, on_done=on_items)
 
     def debounced_search_for(field: str, event=None):
-        # schedule search for a specific field
+        # answer from the local index on every keystroke; schedule a network
+        # search only for text the index has nothing for
         try:
             if search_job["id"]:
                 top.after_cancel(search_job["id"])
+                search_job["id"] = None
         except Exception:
             pass
         suggest_field["value"] = field
+        q = (from_var.get() if field == 'from' else to_var.get()).strip()
+        index = suggestions["index"]
+        local = index.complete(q, SUGGEST_LIMIT) if q else []
+        if local or not q or index.known_empty(q):
+            tasks.cancel('suggest')
+            show_results([{"display_name": text} for text in local])
+            return
         search_job["id"] = top.after(250, lambda: do_suggest_search(field))
 
     # Bind both entries to suggestion behavior
@@ -443,18 +488,71 @@ def open_menu_window(root, user):
     to_entry.bind('<Return>', on_to_enter)
 
     # Remember markers
-    state = {"user_marker": None, "driver_markers": [],
-             "nearby_after_id": None, "last_center": None, "last_zoom": None}
+    state = {"user_marker": None, "driver_markers": MarkerManager(mapw.set_marker), "driver_view": None,
+             "nearby_after_id": None, "last_center": None, "last_zoom": None,
+             "route": None, "route_level": None, "zoom_watch_id": None}
+
+    def draw_route_path(zoom):
+        # replace the drawn polyline with the route simplified for `zoom`;
+        # simplifying a long route at a deep zoom takes tens of ms, so it runs off the Tk thread
+        route = state.get('route')
+        if route is None:
+            return
+        state['route_level'] = route.level(zoom)
+
+        def on_simplified(points):
+            if state.get('route') is not route:
+                return
+            if state.get('current_path'):
+                try:
+                    mapw.delete(state['current_path'])
+                except Exception:
+                    pass
+                state['current_path'] = None
+            try:
+                state['current_path'] = mapw.set_path(points, width=4, color='#0066ff')
+            except Exception:
+                state['current_path'] = None
+
+        tasks.submit('route_zoom', route.at, zoom, on_done=on_simplified)
+
+    def mapw_view():
+        try:
+            return mapw.upper_left_tile_pos, round(mapw.zoom)
+        except Exception:
+            return None
+
+    def watch_view():
+        # TkinterMapView has no pan/zoom events, so poll: re-simplify the route
+        # when the zoom level changes and re-cull driver markers when the view moves
+        state['zoom_watch_id'] = None
+        if state.get('route') is not None:
+            try:
+                zoom = float(mapw.get_zoom())
+            except Exception:
+                zoom = None
+            if zoom is not None and ZoomSimplifiedPath.level(zoom) != state.get('route_level'):
+                draw_route_path(zoom)
+        view = mapw_view()
+        if view != state.get('driver_view'):
+            state['driver_view'] = view
+            state['driver_markers'].refresh(view_bounds(mapw))
+        try:
+            state['zoom_watch_id'] = top.after(ZOOM_WATCH_MS, watch_view)
+        except Exception:
+            pass
 
     def draw_route(from_addr: str, to_addr: str):
         """Geocode both endpoints, request a route, draw it on the map and show markers."""
         if not to_addr:
             messagebox.showwarning('Route', 'Please enter a destination.')
             return
-        # geocode both endpoints
+        # geocode both endpoints concurrently, then fetch the route
         pickup = from_addr.strip() or user.get('address', '')
-        pcoords = geocode(pickup)
-        dcoords = geocode(to_addr.strip())
+        tasks.gather('route', [(geocode, (pickup,)), (geocode, (to_addr.strip(),))],
+                     on_done=lambda coords: on_route_endpoints(*coords))
+
+    def on_route_endpoints(pcoords, dcoords):
         if not pcoords or not dcoords:
             messagebox.showwarning(
                 'Route', 'Could not geocode pickup or destination.')
@@ -462,8 +560,10 @@ def open_menu_window(root, user):
 
         plat, plon = pcoords[0], pcoords[1]
         dlat, dlon = dcoords[0], dcoords[1]
+        tasks.submit('route', get_route_coords, plat, plon, dlat, dlon,
+                     on_done=lambda path: render_route(plat, plon, dlat, dlon, path))
 
-        path = get_route_coords(plat, plon, dlat, dlon)
+    def render_route(plat, plon, dlat, dlon, path):
         # clear existing path/markers
         try:
             if state.get('current_path'):
@@ -503,27 +603,30 @@ def open_menu_window(root, user):
         except Exception:
             state['drop_marker'] = None
 
+        # adjust view to fit route: center midpoint and choose zoom by distance
+        dist_km = haversine(plat, plon, dlat, dlon)
+        # heuristic zoom selection
+        if dist_km > 200:
+            z = 6
+        elif dist_km > 50:
+            z = 8
+        elif dist_km > 10:
+            z = 11
+        else:
+            z = 13
+
+        # draw the route simplified for the zoom it is about to be shown at;
+        # watch_view() redraws it when the user zooms in or out
+        state['route'] = ZoomSimplifiedPath(path) if path else None
+        state['route_level'] = None
         if path:
-            try:
-                state['current_path'] = mapw.set_path(
-                    path, width=4, color='#0066ff')
-            except Exception:
-                state['current_path'] = None
+            draw_route_path(z)
+            if state.get('zoom_watch_id') is None:
+                watch_view()
 
-        # adjust view to fit route: center midpoint and choose zoom by distance
         try:
-            dist_km = haversine(plat, plon, dlat, dlon)
             mid_lat = (plat + dlat) / 2.0
             mid_lon = (plon + dlon) / 2.0
-            # heuristic zoom selection
-            if dist_km > 200:
-                z = 6
-            elif dist_km > 50:
-                z = 8
-            elif dist_km > 10:
-                z = 11
-            else:
-                z = 13
             center_lat, center_lon, _ = center_with_vertical_offset(
                 mid_lat, mid_lon, target_zoom=z, offset_px=120)
             animate_pan_and_zoom(center_lat, center_lon, target_zoom=z)
@@ -538,16 +641,15 @@ def open_menu_window(root, user):
     # Inline drivers panel (created on demand)
     def show_drivers_section():
         # Create or refresh the drivers panel listing nearby drivers for the pickup
-        try:
-            pickup_addr = from_var.get().strip()
-            if not pickup_addr:
-                return
-            pcoords = geocode(pickup_addr)
-            if not pcoords:
-                return
-            plat, plon = pcoords[0], pcoords[1]
-        except Exception:
+        pickup_addr = from_var.get().strip()
+        if not pickup_addr:
             return
+        tasks.submit('drivers', geocode, pickup_addr, on_done=render_drivers_section)
+
+    def render_drivers_section(pcoords):
+        if not pcoords:
+            return
+        plat, plon = pcoords[0], pcoords[1]
 
         # create panel if not exists
         if not state.get('drivers_panel'):
@@ -567,23 +669,13 @@ def open_menu_window(root, user):
             tree.column(c, width=120 if c == 'id' else 180, anchor='w')
         tree.pack(fill="both", expand=True, pady=(4, 6))
 
-        # collect drivers from preloaded cache or load fresh
-        source = []
-        if not source:
-            rows = _load_drivers()
-            for r in rows:
-                addr = r["address"] if isinstance(
-                    r, dict) else r['address']
-                coords = geocode(addr)
-                if coords:
-                    source.append(
-                        (r['id'], r["name"], coords[0], coords[1], addr))
-
-        drivers_list = []
-        for item in source:
-            did, name, dlat, dlon, addr = item
-            dist = haversine(plat, plon, dlat, dlon)
-            drivers_list.append((did, name, dist, addr))
+        # drivers with stored locations: one DB query, no geocoding per driver
+        source = located_drivers()
+
+        # one vectorized distance pass over the whole fleet
+        dists = haversine_many(plat, plon, [s[2] for s in source], [s[3] for s in source])
+        drivers_list = [(did, name, float(dist), addr)
+                        for (did, name, _, _, addr), dist in zip(source, dists)]
 
         drivers_list.sort(key=lambda x: x[2])
 
@@ -631,16 +723,16 @@ def open_menu_window(root, user):
                         messagebox.showwarning(
                             'Driver assign', f'Selected driver not available: {msg2}')
                         # fallback to auto-assign
-                        ok3, msg3, drv = booking_api.auto_assign_driver(
+                        ok3, msg3, drv = auto_assign(
                             booking_id)
                         messagebox.showinfo('Booking', f'{msg} (Note: {msg3})')
                 except Exception:
                     # fallback
-                    ok3, msg3, drv = booking_api.auto_assign_driver(booking_id)
+                    ok3, msg3, drv = auto_assign(booking_id)
                     messagebox.showinfo('Booking', f'{msg} (Note: {msg3})')
             else:
                 if booking_id:
-                    ok3, msg3, drv = booking_api.auto_assign_driver(booking_id)
+                    ok3, msg3, drv = auto_assign(booking_id)
                     messagebox.showinfo('Booking', f'{msg} (Note: {msg3})')
             # refresh drivers panel to reflect any assignment
             show_drivers_section()
@@ -654,7 +746,9 @@ def open_menu_window(root, user):
         text = text.strip()
         if not text:
             return
-        coords = geocode(text)
+        tasks.submit('search', geocode, text, on_done=on_search_result)
+
+    def on_search_result(coords):
         if coords:
             lat, lon = coords
             # Smooth pan and zoom to searched location but offset vertically so marker is
@@ -689,24 +783,15 @@ def open_menu_window(root, user):
             zoom = 12.0
 
         def on_driver_results(marker_data):
-            # This is the callback that receives cluster/single driver data
-            for m in state.get("driver_markers", []):
-                try:
-                    m.delete()
-                except Exception:
-                    pass
-            state["driver_markers"] = []
-            for md in marker_data:
-                try:
-                    if md['type'] == 'cluster':
-                        marker = mapw.set_marker(
-                            md['lat'], md['lon'], text=f"{md['count']} drivers")
-                        state["driver_markers"].append(marker)
-                    else:
-                        marker = mapw.set_marker(
-                            md['lat'], md['lon'], text=f"{md['name']} ({md['dist']:.1f} km)")
-                        state["driver_markers"].append(marker)
-                except Exception:
-                    pass
+            # This is the callback that receives cluster/single driver data;
+            # markers are diffed by id, so unchanged drivers aren't redrawn
+            state["driver_markers"].update(
+                ({'id': md['id'], 'lat': md['lat'], 'lon': md['lon'],
+                  'text': f"{md['count']} drivers" if md['type'] == 'cluster'
+                  else f"{md['name']} ({md['dist']:.1f} km)"} for md in marker_data),
+                view_bounds(mapw))
+            state['driver_view'] = mapw_view()
+            if state.get('zoom_watch_id') is None:
+                watch_view()
 
         show_nearby_drivers(top, center_lat, center_lon, zoom, on_driver_results)
@@ -0,0 +1,172 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Returned by PersistentCache.get() when there is no usable entry. A cached
+# None is a real value (a remembered negative result), so it can't mean "miss".
+MISS = object()
+
+
+class PersistentCache:
+    """Bounded in-memory LRU in front of a SQLite key/value table.
+
+    Entries expire after `ttl` seconds; None values (negative results) use the
+    shorter `negative_ttl`. Values must be JSON-serialisable. The table survives
+    restarts, so a warm start answers from disk instead of the network, and the
+    LRU front keeps repeat lookups in-process.
+    """
+
+    def __init__(self, path: str, table: str, ttl: float, negative_ttl: float,
+                 max_memory: int = 2048, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_memory = max_memory
+        self._clock = clock
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                      "expired": 0, "stores": 0, "evictions": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        # opened lazily so importing a module that owns a cache has no side effects
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                                key TEXT PRIMARY KEY,
+                                value TEXT,
+                                expires_at REAL NOT NULL)""")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, value: Any, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, key: str, default: Any = MISS) -> Any:
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+            row = self._db().execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return default
+            if row[1] <= now:
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return default
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            self.stats["disk_hits"] += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        expires_at = self._clock() + ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            conn = self._db()
+            conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                         (key, json.dumps(value), expires_at))
+            conn.commit()
+            self.stats["stores"] += 1
+
+    def keys(self):
+        """All unexpired keys in the persistent table."""
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT key FROM {self.table} WHERE expires_at > ?", (self._clock(),)).fetchall()
+        return [r[0] for r in rows]
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            conn = self._db()
+            cur = conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (self._clock(),))
+            conn.commit()
+            return cur.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            conn = self._db()
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one.
+
+    The first caller for a key runs the function; callers that arrive while
+    it is still running wait for it and share its result (or exception)
+    instead of repeating the work. Nothing is kept once the call finishes, so
+    this sits in front of a cache rather than replacing it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.stats = {"calls": 0, "shared": 0}
+
+    def do(self, key: Hashable, fn: Callable, *args) -> Any:
+        with self._lock:
+            self.stats["calls"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.stats["shared"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn(*args)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
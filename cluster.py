@@ -0,0 +1,197 @@
+"""Zoom-aware grid clustering for map markers.
+
+Points are projected to Web Mercator pixels at the map's zoom level and
+bucketed into square cells CLUSTER_CELL_PX wide. A cell holding
+MIN_CLUSTER_SIZE or more points becomes one cluster marker at the members'
+centroid; the others stay individual markers. That is one pass over the
+points, with no NumPy or scikit-learn import.
+
+The cells sit on the global pixel grid, not the viewport. Panning the map
+therefore never moves a point to another cell. GridClusterer keeps each
+zoom level's cells up to date as points are inserted, moved and removed, so
+re-clustering after a pan only reads the cells inside the new bounds.
+"""
+import math
+import threading
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+TILE_PX = 256
+MAX_ZOOM = 19
+CLUSTER_CELL_PX = 60   # about the width of a marker and its label
+MIN_CLUSTER_SIZE = 2
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def zoom_level(zoom: float, max_zoom: int = MAX_ZOOM) -> int:
+    """Integer zoom level used for clustering; fractional zooms round to the nearest."""
+    return min(max_zoom, max(0, int(round(zoom))))
+
+
+def mercator_px(lat: float, lon: float, zoom: int) -> Tuple[float, float]:
+    """Global Web Mercator pixel coordinates of (lat, lon) at an integer zoom level."""
+    world = TILE_PX * (1 << zoom)
+    lat = min(MAX_MERCATOR_LAT, max(-MAX_MERCATOR_LAT, lat))
+    s = math.sin(math.radians(lat))
+    x = (lon + 180.0) / 360.0 * world
+    y = (0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * world
+    return x, y
+
+
+def cell_of(lat: float, lon: float, zoom: int, cell_px: float = CLUSTER_CELL_PX) -> Tuple[int, int]:
+    # same arithmetic as cluster_points(), so both agree on points right at a cell edge
+    world = TILE_PX * (1 << zoom)
+    s = math.sin(min(MAX_MERCATOR_LAT, max(-MAX_MERCATOR_LAT, lat)) * (math.pi / 180.0))
+    return (int((lon + 180.0) * (world / 360.0 / cell_px) // 1),
+            int((world * 0.5 / cell_px - math.log((1 + s) / (1 - s)) * (world / (4 * math.pi) / cell_px)) // 1))
+
+
+def _markers(cells, zoom: int, min_size: int) -> List[dict]:
+    # cells: cell -> (members dict key -> (lat, lon, item), sum_lat, sum_lon)
+    markers = []
+    for (cx, cy), (members, sum_lat, sum_lon) in cells:
+        n = len(members)
+        if n >= min_size:
+            markers.append({"type": "cluster", "id": f"cluster:{zoom}:{cx}:{cy}", "count": n,
+                            "lat": sum_lat / n, "lon": sum_lon / n})
+        else:
+            markers.extend({"type": "single", "id": key, "lat": lat, "lon": lon, "item": item}
+                           for key, (lat, lon, item) in members.items())
+    return markers
+
+
+def cluster_points(points: Iterable[Tuple[Hashable, float, float, Any]], zoom: float,
+                   cell_px: float = CLUSTER_CELL_PX,
+                   min_size: int = MIN_CLUSTER_SIZE) -> List[dict]:
+    """Cluster (key, lat, lon, item) points once for the given zoom.
+
+    Returns marker dicts. A cluster is {"type": "cluster", "id", "count",
+    "lat", "lon"}, where "id" is stable for the cell at that zoom. A single
+    point is {"type": "single", "id": key, "lat", "lon", "item"}.
+    """
+    level = zoom_level(zoom)
+    # mercator_px() inlined and pre-scaled: this loop runs once per driver
+    world = TILE_PX * (1 << level)
+    x_scale, y_scale, y_origin = world / 360.0 / cell_px, world / (4 * math.pi) / cell_px, world * 0.5 / cell_px
+    sin, log, rad = math.sin, math.log, math.pi / 180.0
+    cells: Dict[Tuple[int, int], list] = {}
+    for key, lat, lon, item in points:
+        s = sin(min(MAX_MERCATOR_LAT, max(-MAX_MERCATOR_LAT, lat)) * rad)
+        cell = (int((lon + 180.0) * x_scale // 1), int((y_origin - log((1 + s) / (1 - s)) * y_scale) // 1))
+        entry = cells.get(cell)
+        if entry is None:
+            cells[cell] = [{key: (lat, lon, item)}, lat, lon]
+        else:
+            entry[0][key] = (lat, lon, item)
+            entry[1] += lat
+            entry[2] += lon
+    return _markers(cells.items(), level, min_size)
+
+
+class GridClusterer:
+    """Points clustered per zoom level, kept current as points change.
+
+    A zoom level's cells are built the first time it is asked for. After
+    that, insert() and remove() update them in place. clusters() only looks
+    at the cells inside the requested bounds. Keys are unique: inserting an
+    existing key moves the point. Safe to fill from a background thread
+    while the UI thread queries it.
+    """
+
+    def __init__(self, cell_px: float = CLUSTER_CELL_PX, min_size: int = MIN_CLUSTER_SIZE,
+                 max_zoom: int = MAX_ZOOM):
+        self.cell_px = cell_px
+        self.min_size = min_size
+        self.max_zoom = max_zoom
+        self._lock = threading.RLock()
+        self._points: Dict[Hashable, Tuple[float, float, Any]] = {}
+        # zoom -> cell -> [members {key: (lat, lon, item)}, sum_lat, sum_lon]
+        self._levels: Dict[int, Dict[Tuple[int, int], list]] = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _add(self, cells, zoom, key, lat, lon, item):
+        cell = cells.setdefault(cell_of(lat, lon, zoom, self.cell_px), [{}, 0.0, 0.0])
+        cell[0][key] = (lat, lon, item)
+        cell[1] += lat
+        cell[2] += lon
+
+    def _discard(self, cells, zoom, key, lat, lon):
+        where = cell_of(lat, lon, zoom, self.cell_px)
+        cell = cells.get(where)
+        if cell is None or cell[0].pop(key, None) is None:
+            return
+        if cell[0]:
+            cell[1] -= lat
+            cell[2] -= lon
+        else:
+            del cells[where]
+
+    def insert(self, key: Hashable, lat: float, lon: float, item: Any = None):
+        with self._lock:
+            old = self._points.get(key)
+            self._points[key] = (lat, lon, item)
+            for zoom, cells in self._levels.items():
+                if old is not None:
+                    self._discard(cells, zoom, key, old[0], old[1])
+                self._add(cells, zoom, key, lat, lon, item)
+
+    def update(self, points: Iterable[Tuple[Hashable, float, float, Any]]):
+        for key, lat, lon, item in points:
+            self.insert(key, lat, lon, item)
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            old = self._points.pop(key, None)
+            if old is None:
+                return
+            for zoom, cells in self._levels.items():
+                self._discard(cells, zoom, key, old[0], old[1])
+
+    def clear(self):
+        with self._lock:
+            self._points.clear()
+            self._levels.clear()
+
+    def _level(self, zoom: int):
+        cells = self._levels.get(zoom)
+        if cells is None:
+            cells = {}
+            for key, (lat, lon, item) in self._points.items():
+                self._add(cells, zoom, key, lat, lon, item)
+            self._levels[zoom] = cells
+        return cells
+
+    def clusters(self, zoom: float,
+                 bounds: Optional[Tuple[float, float, float, float]] = None) -> List[dict]:
+        """Markers for `zoom`, shaped like cluster_points() output.
+
+        `bounds` is (south, west, north, east). When it is given, only cells
+        overlapping that box are returned, and a cluster keeps the count of
+        its whole cell.
+        """
+        level = zoom_level(zoom, self.max_zoom)
+        with self._lock:
+            cells = self._level(level)
+            if bounds is None:
+                selected = list(cells.items())
+            else:
+                south, west, north, east = bounds
+                x0, y0 = cell_of(north, west, level, self.cell_px)
+                x1, y1 = cell_of(south, east, level, self.cell_px)
+                if (x1 - x0 + 1) * (y1 - y0 + 1) > len(cells):
+                    # the box spans more cells than are populated: walk the cells instead
+                    selected = [(c, v) for c, v in cells.items()
+                                if x0 <= c[0] <= x1 and y0 <= c[1] <= y1]
+                else:
+                    selected = [((x, y), cells[(x, y)]) for x in range(x0, x1 + 1)
+                                for y in range(y0, y1 + 1) if (x, y) in cells]
+            return _markers(selected, level, self.min_size)
+
+    def drop_level(self, zoom: float):
+        """Forget a zoom level's cells; it is rebuilt if it is asked for again."""
+        with self._lock:
+            self._levels.pop(zoom_level(zoom, self.max_zoom), None)
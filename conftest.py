@@ -0,0 +1,104 @@
+import http.server
+import json
+import threading
+from urllib import parse as urlparse
+
+import pytest
+
+import db
+import map as geo
+from cache import PersistentCache
+from gazetteer import Gazetteer
+
+# a script from before the test suite: it seeds and queries taxi_booking.db itself
+collect_ignore = ["test_admin.py"]
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point db, the gazetteer and the geocode cache at fresh files so tests never touch the repo's."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    gazetteer = Gazetteer(str(tmp_path / "gazetteer.db"))
+    cache = PersistentCache(str(tmp_path / "geocode_cache.db"), "geocode", geo.GEOCODE_TTL, geo.GEOCODE_NEGATIVE_TTL)
+    monkeypatch.setattr(geo, "GAZETTEER", gazetteer)
+    monkeypatch.setattr(geo, "GEOCODE_CACHE", cache)
+    db.init_db()
+    yield db.DB_PATH
+    db.close_pools()
+    gazetteer.close()
+    cache.close()
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default backlog of 5 drops bursts of concurrent connects
+
+
+class StandIn:
+    """Local keep-alive HTTP server standing in for Nominatim, OSRM and ip-api.
+
+    Tests register handlers by path prefix; a handler gets the query dict and
+    returns a JSON-able body, or (status, body) / (status, body, headers).
+    Every request is recorded with the client port it arrived on, so tests can
+    tell how many connections were used. Paths in `drop` get their connection
+    closed after the answer without telling the client, like a server timing
+    out an idle keep-alive connection.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.drop = set()
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+            def do_GET(self):
+                parts = urlparse.urlsplit(self.path)
+                query = dict(urlparse.parse_qsl(parts.query))
+                stand_in.requests.append((parts.path, query, self.client_address[1],
+                                          dict(self.headers)))
+                prefix = max((p for p in stand_in.routes if parts.path.startswith(p)), key=len, default=None)
+                result = stand_in.routes[prefix](query) if prefix is not None else (404, {})
+                status, body, headers = 200, result, {}
+                if isinstance(result, tuple):
+                    status, body = result[0], result[1]
+                    headers = result[2] if len(result) > 2 else {}
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+                if parts.path in stand_in.drop:
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                return
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def route(self, prefix, handler):
+        self.routes[prefix] = handler
+
+    @property
+    def connections(self):
+        return len({r[2] for r in self.requests})
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    server = StandIn()
+    yield server
+    server.close()
@@ -59,16 +59,9 @@ def show_available_drivers(parent):
     This window matches the dark-header / white-content / green-button theme
     used across other dashboards.
     """
-    from db import get_conn
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """SELECT id, name, username, address FROM users WHERE role='driver' AND id NOT IN (
-            SELECT driver_id FROM bookings WHERE driver_id IS NOT NULL AND status IN ('assigned','booked')
-        )"""
-    )
-    rows = cur.fetchall()
-    conn.close()
+    # free for a trip starting now: no active booking overlapping the next
+    # DEFAULT_TRIP_MINUTES (a later booking no longer hides the driver)
+    rows = booking_api.available_drivers()
 
     if not rows:
         messagebox.showinfo("Available Drivers",
@@ -109,12 +102,7 @@ def show_available_drivers(parent):
     hsb.pack(side="bottom", fill="x")
 
     for r in rows:
-        try:
-            vals = (r[0], r[1], r[2], r[3] or "")
-        except Exception:
-            vals = (r['id'], r.get('name'), r.get(
-                'username'), r.get('address'))
-        tree.insert('', 'end', values=vals)
+        tree.insert('', 'end', values=(r['id'], r['name'], r['username'], r['address'] or ""))
 
     btn_frame = ctk.CTkFrame(inner, fg_color="white")
     btn_frame.pack(fill="x", pady=(12, 0))
@@ -123,16 +111,8 @@ def show_available_drivers(parent):
         for i in tree.get_children():
             tree.delete(i)
         # reload rows
-        conn2 = get_conn()
-        cur2 = conn2.cursor()
-        cur2.execute(
-            """SELECT id, name, username, address FROM users WHERE role='driver' AND id NOT IN (
-                SELECT driver_id FROM bookings WHERE driver_id IS NOT NULL AND status IN ('assigned','booked')
-            )"""
-        )
-        for r in cur2.fetchall():
-            tree.insert('', 'end', values=(r[0], r[1], r[2], r[3] or ""))
-        conn2.close()
+        for r in booking_api.available_drivers():
+            tree.insert('', 'end', values=(r['id'], r['name'], r['username'], r['address'] or ""))
 
     refresh_btn = ctk.CTkButton(btn_frame, text="🔄 Refresh", command=refresh,
                                 fg_color="#2E4E47", hover_color="#1f6f65", text_color="white",
@@ -1,12 +1,384 @@
 import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "taxi_booking.db")
 
+# Connection pool tuning
+POOL_SIZE = 8                 # max open connections per database file
+POOL_TIMEOUT = 5.0            # seconds to wait for a free connection
+HEALTH_CHECK_INTERVAL = 30.0  # ping connections idle longer than this before reuse
+
+DEFAULT_TRIP_MINUTES = 45  # estimated duration of a booking that doesn't give one
+
+# PRAGMA sets applied to every new connection. "performance" keeps readers off
+# the writer's back (WAL) and trades durability of the last few commits on
+# power loss for far cheaper commits; "safe" is SQLite's stock behaviour.
+PROFILES = {
+    "performance": {
+        "busy_timeout": 5000,          # ms to wait on a lock before failing
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,          # negative = KiB, ~16 MB page cache
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "safe": {
+        "busy_timeout": 5000,
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+    },
+}
+PERFORMANCE_PROFILE = dict(PROFILES["performance"])
+
+
+def apply_profile(conn: sqlite3.Connection, profile: dict = None):
+    profile = PERFORMANCE_PROFILE if profile is None else profile
+    for pragma, value in profile.items():
+        try:
+            conn.execute(f"PRAGMA {pragma}={value}")
+        except sqlite3.OperationalError:
+            # journal_mode can't change while another connection holds a lock;
+            # the next connection will pick it up
+            if pragma != "journal_mode":
+                raise
+
+
+def configure_profile(profile="performance", **overrides):
+    """Select a named profile (or pass a dict) and tweak individual pragmas.
+
+    Open connections are retired so every new one gets the new settings.
+    """
+    global PERFORMANCE_PROFILE
+    base = PROFILES[profile] if isinstance(profile, str) else profile
+    PERFORMANCE_PROFILE = dict(base, **overrides)
+    close_pools()
+
+
+class ConnectionPool:
+    """Bounded pool of sqlite3 connections for one database file.
+
+    Connections are reused across calls instead of being opened and closed
+    every time. A thread gets back the connection it released last when it is
+    still idle, so the common single-threaded UI path keeps hitting the same
+    warm connection (and its statement cache).
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 health_check_interval: float = HEALTH_CHECK_INTERVAL):
+        self.path = path
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._cond = threading.Condition(threading.RLock())
+        self._idle = []  # list of (conn, owner thread ident, released_at)
+        self._open = 0
+        self._closed = False
+        self._writer = None
+        self.stats = {"created": 0, "reused": 0, "discarded": 0, "waits": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        apply_profile(conn)
+        return conn
+
+    @property
+    def writer(self) -> "WriteQueue":
+        with self._cond:
+            if self._writer is None:
+                self._writer = WriteQueue(self._connect)
+            return self._writer
+
+    def _take_idle(self, ident: int):
+        if not self._idle:
+            return None
+        # prefer the connection this thread used last, otherwise the most recent one
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._idle[i][1] == ident:
+                return self._idle.pop(i)
+        return self._idle.pop()
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._open -= 1
+            self.stats["discarded"] += 1
+            self._cond.notify()
+
+    def acquire(self) -> sqlite3.Connection:
+        ident = threading.get_ident()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise sqlite3.ProgrammingError("Connection pool is closed.")
+                    entry = self._take_idle(ident)
+                    if entry is not None:
+                        break
+                    if self._open < self.size:
+                        self._open += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise sqlite3.OperationalError(
+                            "Timed out waiting for a database connection.")
+                    self.stats["waits"] += 1
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self.stats["created"] += 1
+                return conn
+
+            conn, _, released_at = entry
+            if (time.monotonic() - released_at > self.health_check_interval
+                    and not self._is_healthy(conn)):
+                self._discard(conn)
+                continue
+            with self._cond:
+                self.stats["reused"] += 1
+            return conn
+
+    def release(self, conn: sqlite3.Connection):
+        # behave like close(): anything left uncommitted is rolled back
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            if self._closed:
+                self._open -= 1
+                conn.close()
+                return
+            self._idle.append((conn, threading.get_ident(), time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close idle connections; busy ones are closed when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            writer, self._writer = self._writer, None
+            self._cond.notify_all()
+        if writer is not None:
+            writer.close()
+        for conn, _, _ in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+class WriteQueue:
+    """Single writer thread that applies queued write jobs one at a time.
+
+    Every job runs as fn(conn, *args, **kwargs) inside BEGIN IMMEDIATE on the
+    writer's own connection and is committed when it returns (rolled back if
+    it raises). Because only this thread ever writes, UI threads and
+    background workers never race each other for the write lock.
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._queue = queue.Queue()
+        self._conn = None
+        self.stats = {"jobs": 0, "failed": 0}
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        fut = Future()
+        if threading.current_thread() is self._thread:
+            # a job that writes through another helper: run inline, same transaction
+            try:
+                fut.set_result(fn(self._conn, *args, **kwargs))
+            except BaseException as e:
+                fut.set_exception(e)
+            return fut
+        self._queue.put((fn, args, kwargs, fut))
+        return fut
+
+    def _run(self):
+        self._conn = self._connect()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            fn, args, kwargs, fut = job
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                result = fn(self._conn, *args, **kwargs)
+                self._conn.commit()
+                self.stats["jobs"] += 1
+                fut.set_result(result)
+            except BaseException as e:
+                try:
+                    self._conn.rollback()
+                except sqlite3.Error:
+                    pass
+                self.stats["failed"] += 1
+                fut.set_exception(e)
+        self._conn.close()
+
+    def close(self):
+        self._queue.put(None)
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+
+class PooledConnection:
+    """Proxy handed out by get_conn().
+
+    Works like the sqlite3.Connection callers used to get, except that close()
+    returns the connection to the pool instead of closing it.
+    """
+
+    def __init__(self, pool: ConnectionPool, conn: sqlite3.Connection):
+        self.__dict__["_pool"] = pool
+        self.__dict__["_conn"] = conn
+
+    def _raw(self) -> sqlite3.Connection:
+        conn = self.__dict__["_conn"]
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return conn
+
+    def __getattr__(self, name):
+        return getattr(self._raw(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw(), name, value)
+
+    def __enter__(self):
+        return self._raw().__enter__()
+
+    def __exit__(self, *exc):
+        return self._raw().__exit__(*exc)
+
+    def close(self):
+        conn = self.__dict__["_conn"]
+        self.__dict__["_conn"] = None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __del__(self):
+        # safety net for code paths that forget to close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: str = None) -> ConnectionPool:
+    path = path or DB_PATH
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = ConnectionPool(path, POOL_SIZE, POOL_TIMEOUT, HEALTH_CHECK_INTERVAL)
+            _pools[path] = pool
+        return pool
+
+
+def configure_pool(size: int = None, timeout: float = None, health_check_interval: float = None):
+    """Change pool settings. Existing pools are retired and rebuilt lazily."""
+    global POOL_SIZE, POOL_TIMEOUT, HEALTH_CHECK_INTERVAL
+    if size is not None:
+        POOL_SIZE = size
+    if timeout is not None:
+        POOL_TIMEOUT = timeout
+    if health_check_interval is not None:
+        HEALTH_CHECK_INTERVAL = health_check_interval
+    close_pools()
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    pool = get_pool()
+    return PooledConnection(pool, pool.acquire())
+
+
+def submit_write(fn, *args, **kwargs) -> Future:
+    """Queue fn(conn, *args, **kwargs) on the writer thread; returns a Future."""
+    return get_pool().writer.submit(fn, *args, **kwargs)
+
+
+def write(fn, *args, **kwargs):
+    """Run fn(conn, *args, **kwargs) as one write transaction and return its result."""
+    return submit_write(fn, *args, **kwargs).result()
+
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection for the duration of a with-block."""
+    conn = get_conn()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _ensure_columns(cur, table: str, columns: dict):
+    # lightweight migrations for databases created before a column existed
+    existing = {r[1] for r in cur.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _backfill_start_ts(cur):
+    # bookings created before start_ts existed. SQLite's strftime() reads the
+    # UI's "YYYY-MM-DD HH:MM" text the same way booking.slot_start() does;
+    # rows that don't parse stay NULL and fall back to exact date+time matching
+    cur.execute("""UPDATE bookings SET start_ts=CAST(strftime('%s', date || ' ' || time) AS INTEGER)
+                   WHERE start_ts IS NULL AND strftime('%s', date || ' ' || time) IS NOT NULL""")
+
 
 def init_db():
     conn = get_conn()
@@ -40,11 +412,27 @@ def init_db():
         FOREIGN KEY (driver_id) REFERENCES users(id)
     )""")
 
+    # driver locations, geocoded once from the address
+    _ensure_columns(cur, "users", {"lat": "REAL", "lon": "REAL"})
+    # booking intervals: start as a Unix timestamp plus an estimated duration
+    _ensure_columns(cur, "bookings", {"start_ts": "INTEGER",
+                                      "duration_min": f"INTEGER NOT NULL DEFAULT {DEFAULT_TRIP_MINUTES}"})
+    _backfill_start_ts(cur)
+
     # helpful indexes
     cur.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_role_location ON users(role,lat,lon)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_customer ON bookings(customer_id)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_driver ON bookings(driver_id)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_date_time ON bookings(date,time)")
+    # per-driver slot lookups used by the availability checks
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_driver_slot ON bookings(driver_id,date,time)")
+    # interval overlap checks: range scan on one driver's start times
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_driver_start ON bookings(driver_id,start_ts)")
+    # fleet-wide time windows (batch dispatch)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_start ON bookings(start_ts)")
+    # keyset pages filtered by status (rowid order within each status)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings(status)")
 
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
@@ -0,0 +1,352 @@
+"""Driver dispatch: which free driver gets which booking.
+
+auto_assign_driver used to claim the first free driver by id, however far
+away they were. Here every free driver gets a cost for a pickup, in
+kilometre-equivalents:
+
+- the distance from the driver's stored location to the pickup
+- plus LOAD_WEIGHT_KM for each booking they already hold around that time
+- plus FAIRNESS_WEIGHT_KM for each trip they got in the last day
+
+A policy object computes these costs, so other rules can be swapped in.
+
+auto_assign() ranks drivers for one booking as it is made. assign_pending()
+takes many waiting bookings at once and solves them as a minimum-cost
+bipartite matching (the Hungarian algorithm), so one booking's nearest
+driver isn't taken from another booking that had no good alternative.
+"""
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import booking as booking_api
+from booking import MAX_TRIP_MINUTES, overlap_check
+from db import get_conn, write
+from map import MISS, distance_matrix, geocode, geocode_cached, geocode_many
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the solver falls back to pure Python
+    np = None
+
+LOAD_WEIGHT_KM = 2.0        # each booking a driver already holds near that time
+FAIRNESS_WEIGHT_KM = 0.5    # each trip the driver started in the last FAIRNESS_WINDOW_H
+LOAD_WINDOW_H = 3           # "around that time": bookings starting within this many hours
+FAIRNESS_WINDOW_H = 24
+UNLOCATED_KM = 50.0         # distance assumed when the driver or pickup has no coordinates
+BATCH_SIZE = 200            # pending bookings solved per assign_pending() call
+INFEASIBLE = 1e9            # cost of a pair that must not be matched
+
+# free drivers for a booking, with what the policies need to know about them
+CANDIDATES_SQL = f"""SELECT u.id, u.name, u.lat, u.lon,
+                            (SELECT COUNT(*) FROM bookings a
+                             WHERE a.driver_id=u.id AND a.status='assigned'
+                             AND a.start_ts BETWEEN :start - {LOAD_WINDOW_H * 3600}
+                                                AND :start + {LOAD_WINDOW_H * 3600}) AS load,
+                            (SELECT COUNT(*) FROM bookings c
+                             WHERE c.driver_id=u.id AND c.status IN ('assigned','completed')
+                             AND c.start_ts >= :start - {FAIRNESS_WINDOW_H * 3600}
+                             AND c.start_ts < :start) AS recent
+                     FROM users u
+                     WHERE u.role='driver' AND NOT EXISTS ({{overlap}})
+                     ORDER BY u.id"""
+
+
+class DispatchPolicy:
+    """Pickup distance plus load and fairness penalties; lower cost is better."""
+
+    def __init__(self, load_weight_km: float = LOAD_WEIGHT_KM,
+                 fairness_weight_km: float = FAIRNESS_WEIGHT_KM,
+                 unlocated_km: float = UNLOCATED_KM):
+        self.load_weight_km = load_weight_km
+        self.fairness_weight_km = fairness_weight_km
+        self.unlocated_km = unlocated_km
+
+    def costs(self, pickups: Sequence[Optional[Tuple[float, float]]], drivers: Sequence[dict]) -> List[List[float]]:
+        """Cost matrix: row i for pickups[i], column j for drivers[j].
+
+        A driver dict has "lat", "lon" (either may be None), "load" and "recent".
+        """
+        located = [j for j, d in enumerate(drivers) if d["lat"] is not None and d["lon"] is not None]
+        found = [i for i, p in enumerate(pickups) if p]
+        km = [[self.unlocated_km] * len(drivers) for _ in pickups]
+        if located and found:
+            dist = distance_matrix([pickups[i][0] for i in found], [pickups[i][1] for i in found],
+                                   [drivers[j]["lat"] for j in located], [drivers[j]["lon"] for j in located])
+            for row, i in zip(dist, found):
+                for j, d in zip(located, row):
+                    km[i][j] = float(d)
+        extra = [self.load_weight_km * d["load"] + self.fairness_weight_km * d["recent"] for d in drivers]
+        return [[k + e for k, e in zip(row, extra)] for row in km]
+
+    def rank(self, pickup: Optional[Tuple[float, float]], drivers: Sequence[dict]) -> List[dict]:
+        costs = self.costs([pickup], drivers)[0]
+        return [drivers[j] for j in sorted(range(len(drivers)), key=lambda j: (costs[j], drivers[j]["id"]))]
+
+
+class FirstAvailablePolicy(DispatchPolicy):
+    """The old rule: the free driver with the lowest id, wherever they are."""
+
+    def costs(self, pickups, drivers):
+        return [[float(j) for j in range(len(drivers))] for _ in pickups]
+
+
+DEFAULT_POLICY = DispatchPolicy()
+
+
+def local_coords(address: str) -> Optional[Tuple[float, float]]:
+    """A pickup's coordinates if the gazetteer or geocode cache know them, else None.
+
+    Never asks the network: ranker() calls it inside the write transaction,
+    where a round trip would stall every writer.
+    """
+    coords = geocode_cached(address)
+    return None if coords is MISS else coords
+
+
+def free_drivers(conn, target) -> List[dict]:
+    """Drivers free for the booking row `target`, with their location, load and recent trips."""
+    overlap, params = overlap_check(target, "u.id")
+    if target["start_ts"] is None:
+        params = dict(params, start=0)  # a legacy slot: no interval, so no load either
+    return [dict(r) for r in conn.execute(CANDIDATES_SQL.format(overlap=overlap), params)]
+
+
+def ranker(policy: DispatchPolicy = DEFAULT_POLICY,
+           locate: Callable[[str], Optional[Tuple[float, float]]] = local_coords) -> Callable:
+    """A `rank` callable for booking.auto_assign_driver using `policy`."""
+    def rank(conn, target):
+        return [d["id"] for d in policy.rank(locate(target["pickup"]), free_drivers(conn, target))]
+    return rank
+
+
+def auto_assign(booking_id: int, policy: DispatchPolicy = DEFAULT_POLICY) -> Tuple[bool, str, Optional[int]]:
+    """booking.auto_assign_driver, choosing the driver with the lowest cost under `policy`."""
+    return booking_api.auto_assign_driver(booking_id, rank=ranker(policy))
+
+
+# -- batch matching --
+
+def min_cost_assignment(costs) -> List[Tuple[int, int]]:
+    """Rows matched to distinct columns so that the total cost is minimal.
+
+    Hungarian algorithm with potentials, O(rows^2 * cols). With more rows than
+    columns, some rows stay unmatched. Returns (row, col) pairs. The column
+    scan of each step is vectorised when NumPy is installed.
+    """
+    n = len(costs)
+    m = len(costs[0]) if n else 0
+    if not n or not m:
+        return []
+    if n > m:
+        return sorted((r, c) for c, r in min_cost_assignment([list(col) for col in zip(*costs)]))
+    if np is not None:
+        return _hungarian_numpy(np.asarray(costs, dtype=float), n, m)
+    return _hungarian(costs, n, m)
+
+
+def _hungarian(a, n, m):
+    inf = math.inf
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)    # p[j]: row matched to column j (1-based, 0 = none)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = a[i0 - 1]
+            ui0 = u[i0]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - ui0 - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    return sorted((p[j] - 1, j - 1) for j in range(1, m + 1) if p[j])
+
+
+def _hungarian_numpy(a, n, m):
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            cur = a[i0 - 1] - u[i0] - v[1:]
+            better = ~used[1:] & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            free = np.where(used[1:], np.inf, minv[1:])
+            j1 = int(np.argmin(free)) + 1
+            delta = free[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    return sorted((int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j])
+
+
+def pending_bookings(limit: int = BATCH_SIZE, starts_before: Optional[int] = None,
+                     after: Optional[Tuple[int, int]] = None,
+                     starts_after: Optional[int] = None) -> List[dict]:
+    """Bookings waiting for a driver, soonest first, one keyset page at a time.
+
+    `starts_before` and `starts_after` (slot_start() timestamps) leave later
+    and earlier bookings out; `after` is the (start_ts, id) of the last
+    booking of the previous page.
+    """
+    where, params = [], []
+    if starts_after is not None:
+        where.append("start_ts >= ?")
+        params.append(starts_after)
+    if starts_before is not None:
+        where.append("start_ts <= ?")
+        params.append(starts_before)
+    if after is not None:
+        where.append("(start_ts, id) > (?, ?)")
+        params.extend(after)
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(f"""SELECT * FROM bookings
+                    WHERE status='booked' AND driver_id IS NULL AND start_ts IS NOT NULL
+                    {''.join(' AND ' + w for w in where)}
+                    ORDER BY start_ts, id LIMIT ?""", params + [limit])
+    rows = [dict(r) for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+
+def _fleet_state(conn, bookings: List[dict]):
+    """All drivers, plus every active booking that could clash with or load them."""
+    lo = min(b["start_ts"] for b in bookings)
+    hi = max(b["start_ts"] + b["duration_min"] * 60 for b in bookings)
+    drivers = [dict(r) for r in conn.execute(
+        "SELECT id, name, lat, lon FROM users WHERE role='driver' ORDER BY id")]
+    window = max(MAX_TRIP_MINUTES * 60, FAIRNESS_WINDOW_H * 3600, LOAD_WINDOW_H * 3600)
+    trips: Dict[int, List[tuple]] = {}
+    for r in conn.execute("""SELECT driver_id, status, start_ts, start_ts + duration_min * 60 AS end_ts
+                             FROM bookings
+                             WHERE start_ts > ? AND start_ts < ? AND driver_id IS NOT NULL
+                             AND status IN ('assigned','booked','completed')""",
+                          (lo - window, hi + LOAD_WINDOW_H * 3600)):
+        trips.setdefault(r["driver_id"], []).append((r["status"], r["start_ts"], r["end_ts"]))
+    return drivers, trips
+
+
+def plan_assignments(conn, bookings: List[dict], pickups: List[Optional[Tuple[float, float]]],
+                     policy: DispatchPolicy = DEFAULT_POLICY) -> List[Tuple[int, int, float]]:
+    """Match `bookings` to free drivers; returns (booking id, driver id, cost) triples.
+
+    Each driver takes at most one booking per batch, even when two of the
+    bookings don't overlap. Anything left over waits for the next batch.
+    """
+    drivers, trips = _fleet_state(conn, bookings)
+    if not drivers:
+        return []
+    rows = []
+    for b in bookings:
+        start, end = b["start_ts"], b["start_ts"] + b["duration_min"] * 60
+        load = [0] * len(drivers)
+        recent = [0] * len(drivers)
+        busy = [False] * len(drivers)
+        for j, d in enumerate(drivers):
+            for status, s, e in trips.get(d["id"], ()):
+                if status != "completed" and s < end and e > start:
+                    busy[j] = True
+                    break
+                if status == "assigned" and abs(s - start) <= LOAD_WINDOW_H * 3600:
+                    load[j] += 1
+                if status != "booked" and start - FAIRNESS_WINDOW_H * 3600 <= s < start:
+                    recent[j] += 1
+        rows.append((busy, load, recent))
+    costs = []
+    for pickup, (busy, load, recent) in zip(pickups, rows):
+        candidates = [dict(d, load=l, recent=r) for d, l, r in zip(drivers, load, recent)]
+        row = policy.costs([pickup], candidates)[0]
+        costs.append([INFEASIBLE if b else c for b, c in zip(busy, row)])
+    return [(bookings[i]["id"], drivers[j]["id"], costs[i][j])
+            for i, j in min_cost_assignment(costs) if costs[i][j] < INFEASIBLE]
+
+
+def assign_bookings(pending: List[dict], policy: DispatchPolicy = DEFAULT_POLICY,
+                    geocoder: Callable = geocode) -> List[Tuple[int, int, float]]:
+    """Solve `pending` booking rows as one matching and assign them.
+
+    Pickups are geocoded before the write transaction starts, using the
+    network if needed. The plan and the claims then run as one write job, so
+    nothing can book a driver in between. The rows are read again inside
+    it: one that was assigned, cancelled or moved to another pickup since is
+    left for a later batch, and a new time slot is planned as it is now.
+    Returns the (booking id, driver id, cost) triples that were assigned.
+    """
+    if not pending:
+        return []
+    coords = geocode_many([b["pickup"] for b in pending], geocoder)
+    located = {b["id"]: (b["pickup"], coords.get(b["pickup"])) for b in pending}
+
+    def apply(conn):
+        ids = list(located)
+        fresh = [dict(r) for r in conn.execute(
+            f"""SELECT * FROM bookings
+                WHERE id IN ({', '.join('?' * len(ids))}) AND status='booked' AND driver_id IS NULL
+                AND start_ts IS NOT NULL ORDER BY start_ts, id""", ids)]
+        fresh = [b for b in fresh if b["pickup"] == located[b["id"]][0]]
+        if not fresh:
+            return []
+        by_id = {b["id"]: b for b in fresh}
+        assigned = []
+        for booking_id, driver_id, cost in plan_assignments(conn, fresh, [located[b["id"]][1] for b in fresh],
+                                                            policy):
+            # the plan already avoids clashes; the overlap guard keeps the claim
+            # safe on its own, like auto_assign_driver's
+            overlap, params = overlap_check(by_id[booking_id], ":driver")
+            row = conn.execute(f"""UPDATE bookings SET driver_id=:driver, status='assigned'
+                                   WHERE id=:id AND status='booked' AND driver_id IS NULL
+                                   AND NOT EXISTS ({overlap})
+                                   RETURNING id""", dict(params, driver=driver_id)).fetchone()
+            if row:
+                assigned.append((booking_id, driver_id, cost))
+        return assigned
+
+    return write(apply)
+
+
+def assign_pending(limit: int = BATCH_SIZE, policy: DispatchPolicy = DEFAULT_POLICY,
+                   geocoder: Callable = geocode,
+                   starts_before: Optional[int] = None) -> List[Tuple[int, int, float]]:
+    """Assign the `limit` soonest waiting bookings in one matching (see assign_bookings)."""
+    return assign_bookings(pending_bookings(limit, starts_before), policy, geocoder)
@@ -0,0 +1,145 @@
+"""Background dispatcher: assigns waiting bookings in periodic batches.
+
+Without it, a booking only gets a driver when somebody presses a button in
+the booking UI or the admin dialog. The Dispatcher wakes every `interval_s`
+seconds and gathers the 'booked' bookings that start within the horizon.
+It pages through them `batch_size` at a time, soonest first, and solves each
+page as one matching (dispatch.assign_bookings), committed in one
+transaction. A busy period just means more pages per pass. wake() starts a
+pass early, e.g. right after a booking is created. Bookings whose start is
+more than `grace_min` in the past are left alone. Pickups are located from
+the gazetteer and geocode cache only, so a pass never waits on Nominatim's
+one request per second; an unknown pickup is costed as UNLOCATED_KM away.
+
+Headless, against taxi_booking.db:
+
+    python dispatcher.py --interval 5 --batch 200 --horizon 120
+"""
+import argparse
+import threading
+import time
+from typing import Callable, Optional
+
+from booking import now_slot
+from dispatch import BATCH_SIZE, DEFAULT_POLICY, DispatchPolicy, assign_bookings, local_coords, pending_bookings
+
+DISPATCH_INTERVAL_S = 5.0
+DISPATCH_HORIZON_MIN = 120  # bookings starting further ahead wait for a later pass
+DISPATCH_GRACE_MIN = 15     # bookings that started longer ago than this are stale, not pending
+
+
+class Dispatcher:
+    def __init__(self, interval_s: float = DISPATCH_INTERVAL_S, batch_size: int = BATCH_SIZE,
+                 horizon_min: Optional[int] = DISPATCH_HORIZON_MIN,
+                 policy: DispatchPolicy = DEFAULT_POLICY, geocoder: Callable = local_coords,
+                 clock: Callable[[], int] = now_slot,
+                 on_assigned: Optional[Callable[[list], None]] = None,
+                 grace_min: Optional[int] = DISPATCH_GRACE_MIN):
+        self.interval_s = interval_s
+        self.batch_size = batch_size
+        self.horizon_min = horizon_min
+        self.grace_min = grace_min
+        self.policy = policy
+        self.geocoder = geocoder
+        self.clock = clock
+        self.on_assigned = on_assigned
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[BaseException] = None
+        self.stats = {"passes": 0, "batches": 0, "considered": 0, "assigned": 0,
+                      "errors": 0, "last_pass_ms": 0.0}
+
+    def run_once(self) -> int:
+        """One pass over every booking inside the horizon. Returns how many were assigned."""
+        started = time.perf_counter()
+        now = self.clock()
+        starts_before = None if self.horizon_min is None else now + self.horizon_min * 60
+        starts_after = None if self.grace_min is None else now - self.grace_min * 60
+        assigned, after = 0, None
+        while True:
+            page = pending_bookings(self.batch_size, starts_before, after, starts_after)
+            if not page:
+                break
+            done = assign_bookings(page, self.policy, self.geocoder)
+            self.stats["batches"] += 1
+            self.stats["considered"] += len(page)
+            assigned += len(done)
+            if done and self.on_assigned:
+                self.on_assigned(done)
+            if len(page) < self.batch_size:
+                break
+            after = (page[-1]["start_ts"], page[-1]["id"])
+        self.stats["passes"] += 1
+        self.stats["assigned"] += assigned
+        self.stats["last_pass_ms"] = (time.perf_counter() - started) * 1e3
+        return assigned
+
+    # -- background loop --
+
+    def _run(self):
+        while not self._stop.is_set():
+            # cleared before the pass rather than after the wait: a wake() from
+            # here on is either seen by this pass or leaves the event set for the next
+            self._wake.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                # a locked database, a failing policy or callback: record it and
+                # try again next interval rather than let the thread die
+                self.stats["errors"] += 1
+                self.last_error = e
+            self._wake.wait(self.interval_s)
+
+    def start(self) -> "Dispatcher":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="dispatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def wake(self):
+        """Run the next pass now instead of at the end of the interval."""
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assign waiting bookings to drivers in periodic batches.")
+    parser.add_argument("--interval", type=float, default=DISPATCH_INTERVAL_S, help="seconds between passes")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="bookings solved per matching")
+    parser.add_argument("--horizon", type=int, default=DISPATCH_HORIZON_MIN,
+                        help="only bookings starting within this many minutes (0: no limit)")
+    parser.add_argument("--db", help="database file (default: taxi_booking.db)")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    args = parser.parse_args(argv)
+
+    import db
+    if args.db:
+        db.DB_PATH = args.db
+    db.init_db()
+
+    def report(done):
+        for booking_id, driver_id, cost in done:
+            print(f"booking {booking_id} -> driver {driver_id} ({cost:.1f} km-eq)")
+
+    dispatcher = Dispatcher(args.interval, args.batch, args.horizon or None, on_assigned=report)
+    if args.once:
+        print(f"{dispatcher.run_once()} bookings assigned.")
+        return
+    dispatcher.start()
+    try:
+        while True:
+            time.sleep(60)
+            print(", ".join(f"{k} {v:.0f}" for k, v in dispatcher.stats.items()))
+    except KeyboardInterrupt:
+        dispatcher.stop()
+
+
+if __name__ == "__main__":
+    main()
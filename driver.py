@@ -3,16 +3,28 @@ import customtkinter as ctk
 from tkinter import messagebox, ttk
 from typing import List, Dict
 from db import get_conn
+import math
 import threading
-from map import geocode, haversine
+from cluster import GridClusterer, cluster_points
+from fleet import backfill_driver_coords, build_driver_index, drivers_near, located_drivers
+from map import haversine
+from spatial import KM_PER_DEG_LAT
 
 # Performance / tuning constants
 MAX_DRIVER_MARKERS = 10  # maximum markers to show for drivers
 NEARBY_DEBOUNCE_MS = 250  # debounce nearby driver lookups
+MAX_CLUSTER_CANDIDATES = 5000  # nearest drivers clustered before the preload has filled driver_clusters
 
 
 # Preloaded driver coordinates to reduce lag
 driver_coords_preloaded = []
+# Grid index over driver_coords_preloaded, keyed by driver id; rebuilt with it
+driver_index = build_driver_index([])
+# the same drivers clustered per zoom level, kept current as the preload adds
+# them, so a pan or zoom only reads the cells in view instead of re-clustering
+driver_clusters = GridClusterer()
+# addresses geocoded so far by the running preload (done, total)
+preload_progress = {"done": 0, "total": 0}
 
 def list_bookings_by_driver(driver_id: int) -> List[Dict]:
     conn = get_conn()
@@ -24,29 +36,25 @@ def list_bookings_by_driver(driver_id: int) -> List[Dict]:
     return rows
 
 
-def _load_drivers():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, name, username, address FROM users WHERE role='driver' ORDER BY id")
-    rows = cur.fetchall()
-    conn.close()
-    return rows  # list[sqlite3.Row]
-
-
 def _preload_driver_coords():
-    global driver_coords_preloaded
-    rows = _load_drivers()
-    tmp = []
-    for r in rows:
-        addr = r["address"] if isinstance(r, dict) else r["address"]
-        if not addr:
-            continue
-        coords = geocode(addr)
-        if coords:
-            lat, lon = coords
-            tmp.append((r["id"], r["name"], lat, lon, addr))
+    global driver_coords_preloaded, driver_index
+    # stored locations first: a plain DB read, no network
+    tmp = located_drivers()
+    driver_index = build_driver_index(tmp)
     driver_coords_preloaded = tmp
+    driver_clusters.clear()
+    driver_clusters.update((f"driver:{e[0]}", e[2], e[3], e) for e in tmp)
+
+    # then geocode (once, persisted) drivers that have no stored location yet,
+    # in parallel; each one is searchable as soon as its result arrives
+    def publish(entry):
+        driver_index.insert(entry[0], entry[2], entry[3], entry)
+        driver_coords_preloaded.append(entry)
+        driver_clusters.insert(f"driver:{entry[0]}", entry[2], entry[3], entry)
+
+    def progress(done, total):
+        preload_progress.update(done=done, total=total)
+    backfill_driver_coords(on_located=publish, on_progress=progress)
 
 
 def start_driver_coord_preloader():
@@ -57,6 +65,7 @@ def start_driver_coord_preloader():
 def show_nearby_drivers(parent_widget, ulat, ulon, map_zoom, on_results_callback, km=3.0):
     """
     Finds nearby drivers, clusters them if necessary, and calls a callback with marker data.
+    Every marker dict has a stable 'id' ('driver:<id>' or the cluster's cell id).
     This function is debounced to prevent excessive lookups.
     """
     # debounce state is stored on the parent widget
@@ -71,85 +80,52 @@ def show_nearby_drivers(parent_widget, ulat, ulon, map_zoom, on_results_callback
             pass
 
     def do_lookup():
-        source = list(
-            driver_coords_preloaded) if driver_coords_preloaded else []
-        if not source:
-            rows = _load_drivers()
-            for r in rows:
-                addr = r.get("address") if isinstance(
-                    r, dict) else r["address"]
-                coords = geocode(addr)
-                if coords:
-                    source.append(
-                        (r["id"], r.get("name"), coords[0], coords[1], addr))
-
-        # collect nearby candidates (limit to 200 for clustering performance)
-        nearby = []
-        for item in source:
-            _, name, dlat, dlon, _ = item
-            dist = haversine(ulat, ulon, dlat, dlon)
-            if dist <= km:
-                nearby.append((dist, name, dlat, dlon))
-
-        nearby.sort(key=lambda x: x[0])
-        nearby = nearby[:200]
+        # collect nearby candidates; the grid index only looks at cells around
+        # the user, nearest first. Before the preloader has run, ask the DB's
+        # location index directly.
+        if len(driver_index):
+            found = [(dist, item) for dist, _, item in driver_index.radius(ulat, ulon, km)]
+        else:
+            found = drivers_near(ulat, ulon, km)
+        nearby = [(dist, item[1], item[2], item[3], item[0]) for dist, item in found][:MAX_CLUSTER_CANDIDATES]
 
         # If only a few drivers, show them directly
         if len(nearby) <= MAX_DRIVER_MARKERS:
-            results = [{'type': 'single', 'dist': dist, 'lat': dlat, 'lon': dlon, 'name': name}
-                       for dist, name, dlat, dlon in nearby][:MAX_DRIVER_MARKERS]
+            results = [{'type': 'single', 'id': f'driver:{did}', 'dist': dist, 'lat': dlat, 'lon': dlon,
+                        'name': name}
+                       for dist, name, dlat, dlon, did in nearby][:MAX_DRIVER_MARKERS]
             parent_widget.after(0, lambda: on_results_callback(results))
             return
 
-        # Otherwise cluster in background to avoid blocking UI
-        def cluster_worker(nearby_list, cur_zoom):
-            try:
-                import numpy as _np
-                from sklearn.cluster import DBSCAN as _DBSCAN
-            except ImportError:
-                # clustering libs not available — fallback to showing top N
-                results = [{'type': 'single', 'dist': dist, 'lat': dlat, 'lon': dlon, 'name': name}
-                           for dist, name, dlat, dlon in nearby_list][:MAX_DRIVER_MARKERS]
-                parent_widget.after(0, lambda: on_results_callback(results))
-                return
-
-            # larger eps at low zooms -> clusters merge; smaller eps at high zooms
-            eps_km = max(0.2, 1.2 * (13.0 / max(1.0, cur_zoom)))
-            coords = [(dlat, dlon) for _, _, dlat, dlon in nearby_list]
-            labels = []
-            try:
-                db = _DBSCAN(eps=eps_km / 6371.0088, min_samples=2,
-                             algorithm='ball_tree', metric='haversine')
-                labels = db.fit_predict(_np.radians(coords))
-            except Exception:
-                labels = [-1] * len(coords)
-
-            clusters = {}
-            singles = []
-            for i, lab in enumerate(labels):
-                dist, name, dlat, dlon = nearby_list[i]
-                if lab == -1:
-                    singles.append((dist, name, dlat, dlon))
-                else:
-                    clusters.setdefault(lab, []).append(
-                        (dist, name, dlat, dlon))
-
-            markers_data = []
-            for members in clusters.values():
-                cnt = len(members)
-                avg_lat = sum(m[2] for m in members) / cnt
-                avg_lon = sum(m[3] for m in members) / cnt
-                markers_data.append(
-                    {'type': 'cluster', 'count': cnt, 'lat': avg_lat, 'lon': avg_lon})
-            for s in singles[:MAX_DRIVER_MARKERS]:
-                dist, name, dlat, dlon = s
-                markers_data.append(
-                    {'type': 'single', 'name': name, 'lat': dlat, 'lon': dlon, 'dist': dist})
-
-            parent_widget.after(0, lambda: on_results_callback(markers_data))
-
-        threading.Thread(target=cluster_worker, args=(
-            nearby, map_zoom), daemon=True).start()
+        # Otherwise cluster on the map's pixel grid. Once the preload has run,
+        # driver_clusters already holds this zoom's cells and only the ones
+        # around the user are read; before that, cluster the candidates once
+        if len(driver_clusters):
+            dlat = km / KM_PER_DEG_LAT
+            dlon = km / (KM_PER_DEG_LAT * max(0.01, math.cos(math.radians(ulat))))
+            boxed = driver_clusters.clusters(map_zoom, (ulat - dlat, ulon - dlon, ulat + dlat, ulon + dlon))
+            # the box's corners reach past km: keep only markers within the radius
+            markers = []
+            for m in boxed:
+                dist = haversine(ulat, ulon, m['lat'], m['lon'])
+                if dist > km:
+                    continue
+                if m['type'] == 'single':
+                    m['item'] = (dist, m['item'][1])
+                markers.append(m)
+        else:
+            markers = cluster_points(((f'driver:{did}', dlat, dlon, (dist, name))
+                                      for dist, name, dlat, dlon, did in nearby), map_zoom)
+        markers_data = [{'type': 'cluster', 'id': m['id'], 'count': m['count'], 'lat': m['lat'],
+                         'lon': m['lon']}
+                        for m in markers if m['type'] == 'cluster']
+        # singles nearest first, like the unclustered list
+        singles = sorted((m for m in markers if m['type'] == 'single'), key=lambda m: m['item'][0])
+        for m in singles[:MAX_DRIVER_MARKERS]:
+            dist, name = m['item']
+            markers_data.append({'type': 'single', 'id': m['id'], 'name': name, 'lat': m['lat'],
+                                 'lon': m['lon'], 'dist': dist})
+        parent_widget.after(0, lambda: on_results_callback(markers_data))
 
     state["id"] = parent_widget.after(NEARBY_DEBOUNCE_MS, do_lookup)
 
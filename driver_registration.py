@@ -1,4 +1,5 @@
 # Taxi Booking - Driver Registration Page
+import threading
 import tkinter as tk
 from tkinter import messagebox
 import customtkinter as ctk
@@ -124,15 +125,16 @@ def open_driver_registration(parent):
             return
 
         # Register as driver
-        from db import get_conn
-        conn = get_conn()
-        cur = conn.cursor()
+        from db import write
         try:
-            cur.execute("""INSERT INTO users (username, password, role, name, address, phone, email)
-                          VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                        (user, pw, "driver", full, addr, phone, email))
-            conn.commit()
-            conn.close()
+            driver_id = write(lambda conn: conn.execute(
+                """INSERT INTO users (username, password, role, name, address, phone, email)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   RETURNING id""",
+                (user, pw, "driver", full, addr, phone, email)).fetchone()[0])
+            # geocode the address once and store it, off the UI thread
+            from fleet import locate_driver
+            threading.Thread(target=locate_driver, args=(driver_id, addr), daemon=True).start()
 
             messagebox.showinfo(
                 "Registration Successful", f"Driver account created for {user}. You can now log in.")
@@ -141,7 +143,6 @@ def open_driver_registration(parent):
             from driver_login import open_driver_login
             open_driver_login()
         except Exception as e:
-            conn.close()
             messagebox.showerror("Registration failed",
                                  f"An error occurred: {str(e)}")
 
@@ -0,0 +1,124 @@
+"""Driver locations.
+
+Coordinates are stored on the driver's users row (lat/lon), geocoded once
+when the driver registers or changes address, so the nearby-driver paths are
+plain indexed queries with no network calls. backfill_driver_coords() fills in
+drivers created before the columns existed.
+"""
+import math
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from db import get_conn, write
+from map import BATCH_GEOCODE_WORKERS, geocode, geocode_many, haversine_many
+from spatial import KM_PER_DEG_LAT, SpatialIndex
+
+
+def load_drivers():
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT id, name, username, address, lat, lon FROM users WHERE role='driver' ORDER BY id")
+    rows = cur.fetchall()
+    conn.close()
+    return rows  # list[sqlite3.Row]
+
+
+def located_drivers() -> List[Tuple]:
+    """(id, name, lat, lon, address) for every driver with a stored location."""
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("""SELECT id, name, lat, lon, address FROM users
+                   WHERE role='driver' AND lat IS NOT NULL AND lon IS NOT NULL
+                   ORDER BY id""")
+    rows = [tuple(r) for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+
+def drivers_near(lat: float, lon: float, km: float) -> List[Tuple[float, Tuple]]:
+    """Drivers within `km` as (dist_km, (id, name, lat, lon, address)), nearest first.
+
+    A bounding-box range scan on the (role, lat, lon) index narrows the rows
+    before the exact distance check.
+    """
+    dlat = km / KM_PER_DEG_LAT
+    dlon = km / (KM_PER_DEG_LAT * max(0.01, math.cos(math.radians(lat))))
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("""SELECT id, name, lat, lon, address FROM users
+                   WHERE role='driver' AND lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?""",
+                (lat - dlat, lat + dlat, lon - dlon, lon + dlon))
+    rows = [tuple(r) for r in cur.fetchall()]
+    conn.close()
+    if not rows:
+        return []
+    dists = haversine_many(lat, lon, [r[2] for r in rows], [r[3] for r in rows])
+    found = [(float(d), r) for d, r in zip(dists, rows) if d <= km]
+    found.sort(key=lambda x: x[0])
+    return found
+
+
+def build_driver_index(entries) -> SpatialIndex:
+    index = SpatialIndex()
+    for entry in entries:
+        index.insert(entry[0], entry[2], entry[3], entry)
+    return index
+
+
+def set_driver_location(driver_id: int, lat: Optional[float], lon: Optional[float]):
+    write(lambda conn: conn.execute(
+        "UPDATE users SET lat=?, lon=? WHERE id=? AND role='driver'", (lat, lon, driver_id)))
+
+
+def locate_driver(driver_id: int, address: str,
+                  geocoder: Callable = geocode) -> Optional[Tuple[float, float]]:
+    """Geocode a driver's address and store the result. Returns (lat, lon) or None."""
+    coords = geocoder(address) if address else None
+    if coords:
+        set_driver_location(driver_id, coords[0], coords[1])
+    return coords
+
+
+def backfill_driver_coords(geocoder: Callable = geocode,
+                           on_located: Optional[Callable[[Tuple], None]] = None,
+                           on_progress: Optional[Callable[[int, int], None]] = None,
+                           workers: int = BATCH_GEOCODE_WORKERS) -> int:
+    """Geocode every driver that has an address but no stored location.
+
+    Addresses are geocoded in parallel through map.geocode_many. `on_located`
+    receives each new (id, name, lat, lon, address) entry as soon as it is
+    stored and `on_progress(done, total)` follows every address; both run on
+    worker threads. Returns how many drivers were located.
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("""SELECT id, name, address FROM users
+                   WHERE role='driver' AND lat IS NULL AND address IS NOT NULL AND address<>''
+                   ORDER BY id""")
+    pending = cur.fetchall()
+    conn.close()
+    by_address = {}
+    for r in pending:
+        by_address.setdefault(r["address"], []).append(r)
+    located = [0]
+    lock = threading.Lock()
+
+    def store(address, coords):
+        if not coords:
+            return
+        for r in by_address[address]:
+            set_driver_location(r["id"], coords[0], coords[1])
+            with lock:
+                located[0] += 1
+            if on_located:
+                on_located((r["id"], r["name"], coords[0], coords[1], address))
+
+    geocode_many(list(by_address), geocoder, workers, on_result=store, on_progress=on_progress)
+    return located[0]
+
+
+if __name__ == "__main__":
+    from db import init_db
+    init_db()
+    print(f"Located {backfill_driver_coords()} drivers.")
@@ -0,0 +1,247 @@
+"""Offline place-name index for Nepal.
+
+geocode() and nominatim_search() ask the gazetteer before going to the
+network. Places come from the bundled nepal_places.csv and from successful
+Nominatim lookups, and are kept in a small SQLite table; the search
+structures (a sorted key list for prefix matches, a trigram posting map for
+typos) are rebuilt in memory on first use, so a suggestion lookup is a bisect
+and a few dict hits rather than an HTTP round trip.
+"""
+import bisect
+import csv
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+SEED_PATH = os.path.join(os.path.dirname(__file__), "nepal_places.csv")
+TRIGRAM_MIN_SIMILARITY = 0.35
+LEARNED_RANK = 1  # learned places rank below the curated seed
+
+# match scores: exact name > name prefix > word prefix > fuzzy (trigram, scaled)
+EXACT, PREFIX, WORD_PREFIX, FUZZY = 300, 200, 100, 50
+
+
+def fold(text: str) -> str:
+    """Search key: accents stripped, case-folded, punctuation turned into spaces."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^\w]+", " ", text.casefold()).split())
+
+
+def trigrams(key: str) -> set:
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class Gazetteer:
+    """Prefix and trigram search over place names, backed by a SQLite table.
+
+    The table is reseeded whenever the bundled seed file changes; learned
+    places survive reseeding. Safe to query and learn from worker threads.
+    """
+
+    def __init__(self, path: str, seed_path: Optional[str] = SEED_PATH):
+        self.path = path
+        self.seed_path = seed_path
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._loaded = False
+        self._places: List[Tuple[str, str, float, float, int]] = []  # name, display, lat, lon, rank
+        self._keys: List[Tuple[str, int, bool]] = []  # sorted (key, place index, starts the label)
+        self._exact: Dict[str, int] = {}            # folded name/alias/display -> place index
+        self._grams: Dict[str, set] = defaultdict(set)  # trigram -> label ids
+        self._labels: List[Tuple[int, int]] = []          # label id -> (place index, trigram count)
+        self.stats = {"lookups": 0, "lookup_hits": 0, "searches": 0, "learned": 0}
+
+    def __len__(self):
+        self._load()
+        return len(self._places)
+
+    # -- storage --
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS places (
+                                key TEXT PRIMARY KEY,
+                                name TEXT NOT NULL,
+                                aliases TEXT NOT NULL DEFAULT '',
+                                display_name TEXT NOT NULL,
+                                lat REAL NOT NULL,
+                                lon REAL NOT NULL,
+                                rank INTEGER NOT NULL DEFAULT 0,
+                                source TEXT NOT NULL)""")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _reseed(self, conn: sqlite3.Connection):
+        # PRAGMA user_version holds a checksum of the seed file it was built from
+        if not self.seed_path or not os.path.exists(self.seed_path):
+            return
+        with open(self.seed_path, "rb") as f:
+            raw = f.read()
+        version = zlib.crc32(raw) & 0x7FFFFFFF
+        if conn.execute("PRAGMA user_version").fetchone()[0] == version:
+            return
+        rows = []
+        for r in csv.DictReader(raw.decode("utf-8").splitlines()):
+            district = r["district"].strip()
+            name = r["name"].strip()
+            parts = [name] + ([district] if district and district != name else []) + ["Nepal"]
+            rows.append((fold(name), name, r["aliases"].strip(), ", ".join(parts),
+                         float(r["lat"]), float(r["lon"]), int(r["rank"] or 0)))
+        with conn:
+            conn.execute("DELETE FROM places WHERE source='seed'")
+            conn.executemany("""INSERT OR REPLACE INTO places
+                                (key, name, aliases, display_name, lat, lon, rank, source)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, 'seed')""", rows)
+            conn.execute(f"PRAGMA user_version={version}")
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            conn = self._db()
+            self._reseed(conn)
+            for name, aliases, display, lat, lon, rank in conn.execute(
+                    "SELECT name, aliases, display_name, lat, lon, rank FROM places"):
+                self._add(name, [a for a in aliases.split("|") if a], display, lat, lon, rank)
+            self._keys.sort()
+            self._loaded = True
+
+    def _add(self, name, aliases, display, lat, lon, rank, keep_sorted=False) -> int:
+        idx = len(self._places)
+        self._places.append((name, display, lat, lon, rank))
+        for label in [name] + aliases:
+            key = fold(label)
+            if not key:
+                continue
+            self._exact.setdefault(key, idx)
+            # trigrams per label: an alias must not dilute the name's similarity
+            grams = trigrams(key)
+            for g in grams:
+                self._grams[g].add(len(self._labels))
+            self._labels.append((idx, len(grams)))
+            # every word boundary starts a prefix key, so "durbar" finds "patan durbar square"
+            words = key.split()
+            for i in range(len(words)):
+                entry = (" ".join(words[i:]), idx, i == 0)
+                if keep_sorted:
+                    bisect.insort(self._keys, entry)
+                else:
+                    self._keys.append(entry)
+        self._exact.setdefault(fold(display), idx)
+        return idx
+
+    # -- queries --
+
+    def lookup(self, addr: str) -> Optional[Tuple[float, float]]:
+        """Coordinates for an address that names a known place exactly, else None.
+
+        "Thamel, Kathmandu" resolves through its first part when the rest is
+        only more places or "Nepal".
+        """
+        self._load()
+        self.stats["lookups"] += 1
+        key = fold(addr)
+        idx = self._exact.get(key)
+        if idx is None and "," in addr:
+            parts = [fold(p) for p in addr.split(",") if fold(p)]
+            if parts and all(p in self._exact or p == "nepal" for p in parts[1:]):
+                idx = self._exact.get(parts[0])
+        if idx is None:
+            return None
+        self.stats["lookup_hits"] += 1
+        _, _, lat, lon, _ = self._places[idx]
+        return lat, lon
+
+    def search(self, q: str, limit: int = 6, fuzzy: bool = True) -> List[dict]:
+        """Suggestions for a partial name, best first, shaped like nominatim_search() results."""
+        self._load()
+        self.stats["searches"] += 1
+        key = fold(q)
+        if not key or limit <= 0:
+            return []
+        scores: Dict[int, float] = {}
+        with self._lock:
+            exact = self._exact.get(key)
+            if exact is not None:
+                scores[exact] = EXACT
+            i = bisect.bisect_left(self._keys, (key,))
+            while i < len(self._keys) and self._keys[i][0].startswith(key):
+                _, idx, whole = self._keys[i]
+                score = PREFIX if whole else WORD_PREFIX
+                if score > scores.get(idx, 0):
+                    scores[idx] = score
+                i += 1
+            if fuzzy and len(scores) < limit and len(key) >= 3:
+                grams = trigrams(key)
+                shared: Dict[int, int] = defaultdict(int)
+                for g in grams:
+                    for label in self._grams.get(g, ()):
+                        shared[label] += 1
+                fuzzy_scores: Dict[int, float] = {}
+                for label, n in shared.items():
+                    idx, count = self._labels[label]
+                    similarity = n / (len(grams) + count - n)
+                    if similarity >= TRIGRAM_MIN_SIMILARITY and idx not in scores:
+                        fuzzy_scores[idx] = max(fuzzy_scores.get(idx, 0.0), FUZZY * similarity)
+                scores.update(fuzzy_scores)
+            best = sorted(scores, key=lambda idx: (-(scores[idx] + self._places[idx][4]),
+                                                   len(self._places[idx][0])))[:limit]
+            return [{"display_name": self._places[idx][1], "lat": self._places[idx][2],
+                     "lon": self._places[idx][3]} for idx in best]
+
+    def guess(self, addr: str) -> Optional[Tuple[float, float]]:
+        """Best non-fuzzy match for a free-form address (whole text, then its first part)."""
+        for text in (addr, addr.split(",")[0]):
+            hits = self.search(text, 1, fuzzy=False)
+            if hits:
+                return hits[0]["lat"], hits[0]["lon"]
+        return None
+
+    def names(self) -> List[str]:
+        """Every known place name, seeded or learned, once each."""
+        self._load()
+        with self._lock:
+            return list(dict.fromkeys(name for name, *_ in self._places))
+
+    # -- learning --
+
+    def learn(self, name: str, lat: float, lon: float, display_name: Optional[str] = None) -> bool:
+        """Remember a place resolved elsewhere. Returns False if it was already known."""
+        self._load()
+        display_name = display_name or name
+        key = fold(name)
+        if not key:
+            return False
+        with self._lock:
+            if fold(display_name) in self._exact or (display_name == name and key in self._exact):
+                return False
+            conn = self._db()
+            with conn:
+                conn.execute("""INSERT OR IGNORE INTO places
+                                (key, name, aliases, display_name, lat, lon, rank, source)
+                                VALUES (?, ?, '', ?, ?, ?, ?, 'learned')""",
+                             (fold(display_name), name, display_name, lat, lon, LEARNED_RANK))
+            self._add(name, [], display_name, lat, lon, LEARNED_RANK, keep_sorted=True)
+            self.stats["learned"] += 1
+            return True
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,236 @@
+"""Keep-alive HTTP client shared by the map services.
+
+Connections are pooled per (scheme, host, port) and reused across requests,
+so only the first call to a host pays for the TCP and TLS handshakes.
+Failed requests are retried with exponential backoff. Each host can have a
+minimum spacing between requests, which is how Nominatim's one request per
+second policy is kept. Requests made inside background() yield those slots
+to interactive ones.
+"""
+import http.client
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib import parse as urlparse
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# errors that mean a pooled connection went stale while idle; retried at once on a fresh one
+STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, BrokenPipeError,
+                ConnectionResetError, ConnectionAbortedError)
+
+
+class _StaleConnection(ConnectionResetError):
+    pass
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, reason: str, body: bytes = b""):
+        super().__init__(f"HTTP {status} {reason}")
+        self.status = status
+        self.body = body
+
+
+class HttpClient:
+    def __init__(self, user_agent: str, timeout: float = 8.0, retries: int = 2,
+                 backoff: float = 0.5, max_backoff: float = 8.0, max_idle_per_host: int = 4,
+                 min_interval: Optional[Dict[str, float]] = None,
+                 sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_idle_per_host = max_idle_per_host
+        self.min_interval = dict(min_interval or {})  # host -> seconds between requests
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._next_slot: Dict[str, float] = {}
+        self._local = threading.local()
+        self.stats = {"requests": 0, "connections_opened": 0, "connections_reused": 0,
+                      "stale_reconnects": 0, "retries": 0, "failures": 0,
+                      "throttled": 0, "throttle_wait_s": 0.0}
+
+    # -- connection pool --
+
+    def _acquire(self, key) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.stats["connections_reused"] += 1
+                return idle.pop(), True
+            self.stats["connections_opened"] += 1
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+    def _count(self, stat: str):
+        # request() runs on several threads at once (map.geocode_many's workers)
+        with self._lock:
+            self.stats[stat] += 1
+
+    # -- rate limiting --
+
+    @contextmanager
+    def background(self):
+        """Mark this thread's requests as background work (e.g. a bulk preload).
+
+        Foreground requests book the next free slot of a throttled host.
+        Background ones only take a slot that is free right now, so they never
+        queue ahead of a lookup the user is waiting for. A foreground request
+        waits at most for the one background request already sent.
+        """
+        previous = getattr(self._local, "background", False)
+        self._local.background = True
+        try:
+            yield
+        finally:
+            self._local.background = previous
+
+    def _throttle(self, host: str):
+        interval = self.min_interval.get(host)
+        if not interval:
+            return
+        if getattr(self._local, "background", False):
+            self._throttle_background(host, interval)
+            return
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + interval
+            wait = slot - now
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["throttle_wait_s"] += wait
+        if wait > 0:
+            self._sleep(wait)
+
+    def _throttle_background(self, host: str, interval: float):
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                free = self._next_slot.get(host, now)
+                if free <= now:
+                    self._next_slot[host] = now + interval
+                    if waited:
+                        self.stats["throttled"] += 1
+                        self.stats["throttle_wait_s"] += waited
+                    return
+            # a foreground request may book the slot meanwhile: check again after it
+            self._sleep(free - now)
+            waited += free - now
+
+    # -- requests --
+
+    def _send_once(self, key, method, target, body, headers, timeout):
+        conn, reused = self._acquire(key)
+        try:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            conn.request(method, target, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except BaseException as e:
+            conn.close()
+            if reused and isinstance(e, STALE_ERRORS):
+                raise _StaleConnection() from e
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+        return resp.status, resp.reason, resp.headers, data
+
+    def _drop_idle(self, key):
+        with self._lock:
+            conns = self._idle.pop(key, [])
+        for conn in conns:
+            conn.close()
+
+    def request(self, method: str, url: str, params: Optional[dict] = None,
+                body: Optional[bytes] = None, headers: Optional[dict] = None,
+                timeout: Optional[float] = None, retries: Optional[int] = None) -> Tuple[int, dict, bytes]:
+        """Send a request and return (status, headers, body).
+
+        Raises HttpError for a non-2xx answer and OSError/http.client errors
+        when the host can't be reached, after the retries are used up.
+        """
+        parts = urlparse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        target = parts.path or "/"
+        query = parts.query
+        if params:
+            query = "&".join(q for q in (query, urlparse.urlencode(params)) if q)
+        if query:
+            target += "?" + query
+        send_headers = {"User-Agent": self.user_agent, "Accept-Encoding": "identity"}
+        send_headers.update(headers or {})
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+
+        attempt = 0
+        while True:
+            self._throttle(parts.hostname)
+            self._count("requests")
+            delay = None
+            try:
+                try:
+                    status, reason, resp_headers, data = self._send_once(
+                        key, method, target, body, send_headers, timeout)
+                except _StaleConnection:
+                    # the server dropped idle keep-alive connections: reconnect, no backoff
+                    self._count("stale_reconnects")
+                    self._drop_idle(key)
+                    status, reason, resp_headers, data = self._send_once(
+                        key, method, target, body, send_headers, timeout)
+            except (OSError, http.client.HTTPException):
+                if attempt >= retries:
+                    self._count("failures")
+                    raise
+            else:
+                if 200 <= status < 300:
+                    return status, resp_headers, data
+                if status not in RETRY_STATUSES or attempt >= retries:
+                    self._count("failures")
+                    raise HttpError(status, reason, data)
+                retry_after = resp_headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    delay = float(retry_after)
+            if delay is None:
+                delay = self.backoff * (2 ** attempt)
+            attempt += 1
+            self._count("retries")
+            self._sleep(min(delay, self.max_backoff))
+
+    def get_json(self, url: str, params: Optional[dict] = None, timeout: Optional[float] = None,
+                 retries: Optional[int] = None):
+        _, _, data = self.request("GET", url, params=params, headers={"Accept": "application/json"},
+                                  timeout=timeout, retries=retries)
+        return json.loads(data.decode("utf-8"))
+
+    def reuse_rate(self) -> float:
+        with self._lock:
+            opened, reused = self.stats["connections_opened"], self.stats["connections_reused"]
+        return reused / (opened + reused) if opened + reused else 0.0
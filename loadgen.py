@@ -0,0 +1,299 @@
+"""Synthetic load for the whole booking lifecycle, with latency percentiles.
+
+seed() registers customers through auth.register_customer and inserts
+drivers placed around the bundled Nepal places. run() then replays
+`lifecycles` rides from `concurrency` threads. Each ride is
+create_booking -> auto_assign_driver -> complete_booking, or
+cancel_booking for a `cancel_rate` share of them and for every ride
+no driver could take. The report gives throughput and p50/p95/p99 per
+operation, plus the database size. Everything runs offline, on a
+throwaway database unless --db says otherwise.
+
+    python loadgen.py --customers 200 --drivers 50 --lifecycles 2000 --concurrency 8
+    python loadgen.py --http --max-p95-ms 50    # through service.py; exit 1 if any p95 is over 50 ms
+
+With --http the same workload goes through a BookingService in this process
+over keep-alive HTTP, as an admin client. There the service chooses the
+driver (dispatch.auto_assign), so both modes rank drivers by dispatch's cost
+policy unless a direct run asks for --policy first. The report names the
+policy either way.
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import auth
+import booking
+import db
+import dispatch
+from gazetteer import SEED_PATH
+from metrics import percentile
+
+OPERATIONS = ("create", "assign", "complete", "cancel")
+PERCENTILES = (50, 95, 99)
+
+
+def _places() -> List[Tuple[str, float, float]]:
+    with open(SEED_PATH, newline="", encoding="utf-8") as f:
+        return [(r["name"], float(r["lat"]), float(r["lon"])) for r in csv.DictReader(f)]
+
+
+def seed(customers: int, drivers: int, rng: random.Random) -> Tuple[List[int], List[int]]:
+    """Register `customers` customers and insert `drivers` drivers; returns both id lists."""
+    for i in range(customers):
+        ok, message = auth.register_customer(f"Load Customer {i}", "Thamel", "9800000000",
+                                             f"load{i}@example.com", f"load_customer{i}", "secret1")
+        if not ok:
+            raise RuntimeError(message)
+    places = _places()
+
+    def insert(conn):
+        for i in range(drivers):
+            _, lat, lon = rng.choice(places)
+            conn.execute("""INSERT INTO users (username,password,role,name,address,lat,lon)
+                            VALUES (?, 'secret1', 'driver', ?, '', ?, ?)""",
+                         (f"load_driver{i}", f"Load Driver {i}",
+                          lat + rng.uniform(-0.02, 0.02), lon + rng.uniform(-0.02, 0.02)))
+        return ([r[0] for r in conn.execute("SELECT id FROM users WHERE role='customer' ORDER BY id")],
+                [r[0] for r in conn.execute("SELECT id FROM users WHERE role='driver' ORDER BY id")])
+    return db.write(insert)
+
+
+class DirectTarget:
+    """Calls booking.py in this process."""
+
+    def __init__(self, policy: Optional[dispatch.DispatchPolicy] = None):
+        self.rank = dispatch.ranker(policy) if policy is not None else None
+
+    def create(self, customer_id, pickup, dropoff, date, time_, duration_min) -> Optional[int]:
+        ok, _, row = booking.create_booking(customer_id, pickup, dropoff, date, time_, duration_min)
+        return row["id"] if ok else None
+
+    def assign(self, booking_id) -> bool:
+        return booking.auto_assign_driver(booking_id, rank=self.rank)[0]
+
+    def complete(self, booking_id) -> bool:
+        return booking.complete_booking(booking_id)[0]
+
+    def cancel(self, booking_id) -> bool:
+        return booking.cancel_booking(booking_id)[0]
+
+    def close(self):
+        pass
+
+
+class HttpTarget:
+    """The same operations through service.py, one keep-alive connection per worker."""
+
+    def __init__(self, url: str, username: str = "admin", password: str = "admin123"):
+        parts = url.split("://", 1)[-1].split(":")
+        self.conn = http.client.HTTPConnection(parts[0], int(parts[1]), timeout=30)
+        self.token = None
+        self.token = self._call("POST", "/login", {"username": username, "password": password})["token"]
+
+    def _call(self, method, path, body=None):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        self.conn.request(method, path, json.dumps(body or {}), headers)
+        resp = self.conn.getresponse()
+        doc = json.loads(resp.read())
+        return doc["data"] if doc["ok"] else None
+
+    def create(self, customer_id, pickup, dropoff, date, time_, duration_min) -> Optional[int]:
+        row = self._call("POST", "/bookings", {"customer_id": customer_id, "pickup": pickup, "dropoff": dropoff,
+                                               "date": date, "time": time_, "duration_min": duration_min})
+        return row["id"] if row else None
+
+    def assign(self, booking_id) -> bool:
+        return self._call("POST", f"/bookings/{booking_id}/assign") is not None
+
+    def complete(self, booking_id) -> bool:
+        return self._call("POST", f"/bookings/{booking_id}/complete") is not None
+
+    def cancel(self, booking_id) -> bool:
+        return self._call("POST", f"/bookings/{booking_id}/cancel") is not None
+
+    def close(self):
+        self.conn.close()
+
+
+class Recorder:
+    """Per-operation latencies (seconds) and outcomes, shared by the worker threads."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def timed(self, op: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.latencies[op].append(elapsed)
+
+    def count(self, outcome: str):
+        with self._lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+
+def _lifecycle(target, recorder: Recorder, rng: random.Random, customers, places, days: int, cancel_rate: float):
+    customer = rng.choice(customers)
+    pickup, dropoff = rng.sample(places, 2)
+    day = f"2025-01-{1 + rng.randrange(days):02d}"
+    slot = f"{rng.randrange(6, 22):02d}:{rng.randrange(0, 60, 5):02d}"
+    booking_id = recorder.timed("create", target.create, customer, pickup, dropoff, day, slot,
+                                rng.choice((20, 30, 45, 60, 90)))
+    if booking_id is None:
+        recorder.count("rejected")
+        return
+    if not recorder.timed("assign", target.assign, booking_id):
+        recorder.count("no driver")
+        recorder.timed("cancel", target.cancel, booking_id)
+    elif rng.random() < cancel_rate:
+        recorder.count("cancelled")
+        recorder.timed("cancel", target.cancel, booking_id)
+    else:
+        recorder.count("completed" if recorder.timed("complete", target.complete, booking_id) else "not completed")
+
+
+def db_size() -> int:
+    """Bytes on disk for the database, its WAL and shared-memory files."""
+    return sum(os.path.getsize(db.DB_PATH + suffix) for suffix in ("", "-wal", "-shm")
+               if os.path.exists(db.DB_PATH + suffix))
+
+
+def run(customers: int = 200, drivers: int = 50, lifecycles: int = 2000, concurrency: int = 8,
+        cancel_rate: float = 0.2, days: int = 1, rng_seed: int = 25, http: bool = False,
+        policy: str = "cost") -> dict:
+    """Seed the current database (db.DB_PATH) and replay the workload; returns the measurements.
+
+    `policy` is "cost" (dispatch.DEFAULT_POLICY) or "first" (first free driver,
+    direct mode only: the service always ranks by cost).
+    """
+    if policy not in ("first", "cost"):
+        raise ValueError(f"Unknown policy {policy!r}.")
+    if http and policy != "cost":
+        raise ValueError("Over HTTP the service always assigns by cost.")
+    rng = random.Random(rng_seed)
+    auth.seed_defaults()
+    customer_ids, _ = seed(customers, drivers, rng)
+    places = [name for name, _, _ in _places()]
+    recorder = Recorder()
+    service = None
+    if http:
+        from service import BookingService
+        service = BookingService(port=0).start()
+    per_worker = [lifecycles // concurrency + (i < lifecycles % concurrency) for i in range(concurrency)]
+
+    def worker(n, worker_seed):
+        worker_rng = random.Random(worker_seed)
+        target = (HttpTarget(service.url) if service
+                  else DirectTarget(dispatch.DEFAULT_POLICY if policy == "cost" else None))
+        try:
+            for _ in range(n):
+                try:
+                    _lifecycle(target, recorder, worker_rng, customer_ids, places, days, cancel_rate)
+                except Exception:
+                    recorder.count("failed")
+        finally:
+            target.close()
+
+    threads = [threading.Thread(target=worker, args=(n, rng.random())) for n in per_worker]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if service:
+        service.close()
+    with db.connection() as conn:
+        statuses = dict(conn.execute("SELECT status, COUNT(*) FROM bookings GROUP BY status").fetchall())
+    return {
+        "lifecycles": lifecycles, "concurrency": concurrency, "elapsed_s": elapsed,
+        "throughput": lifecycles / elapsed if elapsed else 0.0,
+        "operations": {op: {"count": len(v), **{f"p{p}_ms": percentile(v, p) * 1e3 for p in PERCENTILES},
+                            "max_ms": max(v, default=0.0) * 1e3}
+                       for op, v in recorder.latencies.items()},
+        "outcomes": dict(sorted(recorder.counts.items())),
+        "bookings": statuses,
+        "db_bytes": db_size(),
+        "mode": "http" if http else "direct",
+        "policy": policy,
+    }
+
+
+def format_report(result: dict) -> str:
+    lines = [f"{result['lifecycles']} lifecycles, {result['concurrency']} threads "
+             f"({result['mode']}, {result['policy']} policy): "
+             f"{result['throughput']:,.0f} rides/s in {result['elapsed_s']:.2f} s"]
+    for op, s in result["operations"].items():
+        if s["count"]:
+            lines.append(f"  {op:<9} {s['count']:>6}  " + "  ".join(
+                f"p{p} {s[f'p{p}_ms']:7.2f} ms" for p in PERCENTILES) + f"  max {s['max_ms']:7.2f} ms")
+    lines.append("  outcomes  " + ", ".join(f"{k} {v}" for k, v in result["outcomes"].items()))
+    lines.append("  bookings  " + ", ".join(f"{k} {v}" for k, v in sorted(result["bookings"].items())))
+    lines.append(f"  database  {result['db_bytes'] / 2 ** 20:.2f} MB")
+    return "\n".join(lines)
+
+
+def check(result: dict, max_p95_ms: Optional[float] = None) -> List[str]:
+    """What makes this run a regression: failures, or p95 latencies over the budget."""
+    failed = result["outcomes"].get("failed", 0)
+    problems = [f"{failed} lifecycles failed"] if failed else []
+    if max_p95_ms is not None:
+        problems += [f"{op} p95 {s['p95_ms']:.2f} ms > {max_p95_ms} ms"
+                     for op, s in result["operations"].items() if s["p95_ms"] > max_p95_ms]
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a synthetic booking workload and report latencies.")
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--drivers", type=int, default=50)
+    parser.add_argument("--lifecycles", type=int, default=2000, help="rides to replay")
+    parser.add_argument("--concurrency", type=int, default=8, help="worker threads")
+    parser.add_argument("--cancel-rate", type=float, default=0.2)
+    parser.add_argument("--days", type=int, default=1, help="days the bookings are spread over")
+    parser.add_argument("--seed", type=int, default=25)
+    parser.add_argument("--policy", choices=("first", "cost"), default="cost",
+                        help="driver choice: dispatch's cost ranking, or first free (direct mode only)")
+    parser.add_argument("--http", action="store_true", help="go through service.py instead of direct calls")
+    parser.add_argument("--db", help="database file to seed (default: a throwaway one)")
+    parser.add_argument("--json", action="store_true", help="print the measurements as JSON")
+    parser.add_argument("--max-p95-ms", type=float, help="exit 1 if any operation's p95 exceeds this")
+    args = parser.parse_args(argv)
+    if args.http and args.policy != "cost":
+        parser.error("--http always assigns by cost; --policy first needs direct mode")
+
+    old_path = db.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = args.db or os.path.join(tmp, "load.db")
+        db.init_db()
+        try:
+            result = run(args.customers, args.drivers, args.lifecycles, args.concurrency, args.cancel_rate,
+                         args.days, args.seed, args.http, args.policy)
+        finally:
+            db.close_pools()
+            db.DB_PATH = old_path
+    print(json.dumps(result, indent=2) if args.json else format_report(result))
+    problems = check(result, args.max_p95_ms)
+    for problem in problems:
+        print(f"REGRESSION: {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
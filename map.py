@@ -1,29 +1,77 @@
 import json
 import math
+import os
 import queue
+import re
 import socket
 import http.server
 import threading
 import webbrowser
-from typing import Optional
-from urllib import request as urlrequest, parse as urlparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
 
-# Simple in-memory cache for geocoding lookups to avoid repeated network calls
-GEOCODE_CACHE: dict = {}
-GEOCODE_LOCK = threading.Lock()
+from cache import MISS, PersistentCache, SingleFlight
+from gazetteer import Gazetteer
+from httpclient import HttpClient
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the *_many helpers fall back to pure Python
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+OSRM_URL = "http://router.project-osrm.org/route/v1/driving"
+IP_API_URL = "http://ip-api.com/json"
+USER_AGENT = "taxi-booking-app/1.0"
+NOMINATIM_MIN_INTERVAL = 1.0  # usage policy: at most one request per second
+
+# One keep-alive client for every outbound call: connections are reused per
+# host, failures retried with backoff, and Nominatim requests spaced out
+HTTP = HttpClient(USER_AGENT, timeout=8.0, retries=2,
+                  min_interval={"nominatim.openstreetmap.org": NOMINATIM_MIN_INTERVAL})
+
+# Persistent geocode cache (LRU in memory, SQLite table on disk) so restarts
+# don't re-geocode every address through Nominatim
+GEOCODE_CACHE_PATH = os.path.join(os.path.dirname(__file__), "geocode_cache.db")
+GEOCODE_TTL = 30 * 24 * 3600          # found addresses: 30 days
+GEOCODE_NEGATIVE_TTL = 24 * 3600      # "no result" answers: 1 day
+GEOCODE_CACHE = PersistentCache(GEOCODE_CACHE_PATH, "geocode", GEOCODE_TTL, GEOCODE_NEGATIVE_TTL)
+# concurrent lookups of one address (UI + driver preloader) share one request
+GEOCODE_FLIGHTS = SingleFlight()
+# Nominatim's one request per second sets the pace of a batch, not the worker
+# count: a single worker already books every slot (see benchmarks.py preload)
+BATCH_GEOCODE_WORKERS = 1
+
+# Offline place index consulted before Nominatim; it also learns from every
+# successful network lookup
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "gazetteer.db")
+GAZETTEER = Gazetteer(GAZETTEER_PATH)
+
+
+def normalize_address(addr: str) -> str:
+    """Cache key for an address: case-folded, single-spaced, tidy commas."""
+    key = " ".join(addr.casefold().split())
+    key = re.sub(r"\s*,\s*", ", ", key)
+    return key.strip(" ,.")
 
 
 def nominatim_search(q: str, limit: int = 6):
     """Query Nominatim for place suggestions. Returns list of dicts with display_name, lat, lon.
-    Filters results to only show locations in Nepal."""
+    Filters results to only show locations in Nepal.
+
+    The offline gazetteer answers first; the network is only asked when it
+    has fewer than `limit` suggestions, and its answers are merged after the
+    local ones (local results alone when offline)."""
+    local = GAZETTEER.search(q, limit)
+    if len(local) >= limit:
+        return local
     try:
         # Search with viewbox preference (not strict bounds) for Nepal
         # Nepal roughly: lat 26.0-30.5, lon 80.0-88.3
-        url = f"https://nominatim.openstreetmap.org/search?{urlparse.urlencode({'q': q, 'format': 'json', 'limit': limit, 'viewbox': '80.0,30.5,88.3,26.0'})}"
-        req = urlrequest.Request(
-            url, headers={"User-Agent": "taxi-booking-app/1.0"})
-        with urlrequest.urlopen(req, timeout=6) as resp:
-            data = json.loads(resp.read().decode('utf-8'))
+        data = HTTP.get_json(NOMINATIM_URL, {'q': q, 'format': 'json', 'limit': limit,
+                                             'viewbox': '80.0,30.5,88.3,26.0'}, timeout=6)
         results = []
         for r in data:
             lat = float(r.get('lat'))
@@ -37,57 +85,215 @@ def nominatim_search(q: str, limit: int = 6):
                     'lat': lat,
                     'lon': lon
                 })
-        return results
+                GAZETTEER.learn(display_name.split(',')[0], lat, lon, display_name)
+        seen = {r['display_name'] for r in local}
+        return (local + [r for r in results if r['display_name'] not in seen])[:limit]
     except Exception:
-        return []
+        return local
 
 
 def geocode(addr: str):
     # Use cache to avoid repeated network requests for the same address
     if not addr:
         return None
-    key = addr.strip().lower()
-    with GEOCODE_LOCK:
-        if key in GEOCODE_CACHE:
-            return GEOCODE_CACHE[key]
+    key = normalize_address(addr)
+    if not key:
+        return None
+    local = GAZETTEER.lookup(addr)
+    if local:
+        return local
+    # the cache check runs inside the flight too, so a caller arriving just
+    # after the leader finished reads the cache instead of starting a new request
+    return GEOCODE_FLIGHTS.do(key, _geocode_cached, addr, key)
+
+
+def _geocode_cached(addr: str, key: str):
+    cached = GEOCODE_CACHE.get(key)
+    if cached is not MISS:
+        return tuple(cached) if cached else None
     try:
-        q = urlparse.urlencode({"q": addr, "format": "json", "limit": 1})
-        url = f"https://nominatim.openstreetmap.org/search?{q}"
-        req = urlrequest.Request(
-            url, headers={"User-Agent": "taxi-booking-app/1.0"})
-        with urlrequest.urlopen(req, timeout=8) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
+        data = HTTP.get_json(NOMINATIM_URL, {"q": addr, "format": "json", "limit": 1})
         if not data:
+            # remember misses too (for a shorter time) so bad addresses don't hit the network every time
+            GEOCODE_CACHE.set(key, None)
             return None
         coords = (float(data[0]["lat"]), float(data[0]["lon"]))
-        with GEOCODE_LOCK:
-            GEOCODE_CACHE[key] = coords
+        GEOCODE_CACHE.set(key, coords)
+        # learn the place Nominatim named, never the typed text: that is often
+        # somebody's home address, which would then be suggested to everyone
+        display_name = data[0].get("display_name")
+        if display_name:
+            GAZETTEER.learn(display_name.split(",")[0], coords[0], coords[1], display_name)
         return coords
     except Exception:
+        # network errors are not cached; offline, a confident local match beats nothing
+        return GAZETTEER.guess(addr)
+
+
+def geocode_cached(addr: str):
+    """What geocode() can answer without the network: coords, None (a known
+    miss), or MISS when only a network lookup would tell."""
+    key = normalize_address(addr or "")
+    if not key:
         return None
+    local = GAZETTEER.lookup(addr)
+    if local:
+        return local
+    cached = GEOCODE_CACHE.get(key)
+    if cached is MISS:
+        return MISS
+    return tuple(cached) if cached else None
+
+
+def geocode_many(addresses: Iterable[str], geocoder: Callable = geocode,
+                 workers: int = BATCH_GEOCODE_WORKERS,
+                 on_result: Optional[Callable[[str, Optional[tuple]], None]] = None,
+                 on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Optional[tuple]]:
+    """Geocode many addresses on a bounded worker pool. Returns {address: coords or None}.
+
+    Addresses that normalise to the same key are looked up once. With the
+    default geocoder, the ones the gazetteer or cache already know are
+    answered first on the calling thread, so they are published straight
+    away; only the rest reach the pool, where the shared HTTP client spaces
+    the Nominatim requests. on_result(address, coords) and
+    on_progress(done, total) are called as each address resolves, from
+    whichever thread resolved it. The pool's requests are HTTP.background()
+    work, so a lookup the UI makes meanwhile goes first.
+    """
+    groups: Dict[str, list] = {}
+    for addr in addresses:
+        groups.setdefault(normalize_address(addr or ""), []).append(addr)
+    total = sum(len(g) for g in groups.values())
+    results: Dict[str, Optional[tuple]] = {}
+    lock = threading.Lock()
+    done = [0]
+
+    def finish(group, coords):
+        with lock:
+            for addr in group:
+                results[addr] = coords
+            done[0] += len(group)
+            count = done[0]
+        if on_result:
+            for addr in group:
+                on_result(addr, coords)
+        if on_progress:
+            on_progress(count, total)
+
+    pending = []
+    for key, group in groups.items():
+        local = geocode_cached(group[0]) if geocoder is geocode or not key else MISS
+        if local is MISS:
+            pending.append(group)
+        else:
+            finish(group, local)
+
+    def resolve(group):
+        try:
+            with HTTP.background():
+                coords = geocoder(group[0])
+        except Exception:
+            coords = None
+        finish(group, coords)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending))),
+                                thread_name_prefix="geocode") as pool:
+            list(pool.map(resolve, pending))
+    return results
+
+
+def encode_polyline(points, precision: int = 5) -> str:
+    """Encode (lat, lon) pairs with Google's encoded-polyline algorithm."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        ilat = int(round(lat * factor))
+        ilon = int(round(lon * factor))
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            delta = ~(delta << 1) if delta < 0 else delta << 1
+            while delta >= 0x20:
+                out.append(chr((0x20 | (delta & 0x1f)) + 63))
+                delta >>= 5
+            out.append(chr(delta + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+
+def decode_polyline(encoded: str, precision: int = 5):
+    """Inverse of encode_polyline: a list of (lat, lon) tuples."""
+    factor = float(10 ** precision)
+    points = []
+    index = lat = lon = 0
+    n = len(encoded)
+    while index < n:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append((lat / factor, lon / factor))
+    return points
+
+
+# Route cache: geometry stored as an encoded polyline (a few bytes per point
+# instead of a Python tuple), keyed on endpoints snapped to ~11 m so repeated
+# trips between the same places are served locally
+ROUTE_CACHE_PATH = os.path.join(os.path.dirname(__file__), "route_cache.db")
+ROUTE_TTL = 7 * 24 * 3600
+ROUTE_NEGATIVE_TTL = 3600
+ROUTE_SNAP_DECIMALS = 4
+ROUTE_POLYLINE_PRECISION = 6
+ROUTE_CACHE = PersistentCache(ROUTE_CACHE_PATH, "routes", ROUTE_TTL, ROUTE_NEGATIVE_TTL, max_memory=256)
+ROUTE_FLIGHTS = SingleFlight()
+
+
+def route_key(slat, slon, dlat, dlon) -> str:
+    d = ROUTE_SNAP_DECIMALS
+    return f"{slat:.{d}f},{slon:.{d}f};{dlat:.{d}f},{dlon:.{d}f}"
 
 
 def get_route_coords(slat, slon, dlat, dlon):
     """Query OSRM public demo server to get a route geometry (list of (lat,lon))."""
+    key = route_key(slat, slon, dlat, dlon)
+    return ROUTE_FLIGHTS.do(key, _route_cached, key, slat, slon, dlat, dlon)
+
+
+def _route_cached(key, slat, slon, dlat, dlon):
+    cached = ROUTE_CACHE.get(key)
+    if cached is not MISS:
+        return decode_polyline(cached, ROUTE_POLYLINE_PRECISION) if cached else None
     try:
-        url = f"http://router.project-osrm.org/route/v1/driving/{slon},{slat};{dlon},{dlat}?overview=full&geometries=geojson"
-        req = urlrequest.Request(
-            url, headers={"User-Agent": "taxi-booking-app/1.0"})
-        with urlrequest.urlopen(req, timeout=8) as resp:
-            data = json.loads(resp.read().decode('utf-8'))
+        data = HTTP.get_json(f"{OSRM_URL}/{slon},{slat};{dlon},{dlat}",
+                             {"overview": "full", "geometries": "geojson"})
         routes = data.get('routes')
         if not routes:
+            ROUTE_CACHE.set(key, None)
             return None
         coords = routes[0].get('geometry', {}).get('coordinates', [])
         # coords are [lon, lat] pairs
         path = [(float(lat), float(lon)) for lon, lat in coords]
+        if not path:
+            # an empty geometry is no route: answer None now and from the cache alike
+            ROUTE_CACHE.set(key, None)
+            return None
+        ROUTE_CACHE.set(key, encode_polyline(path, ROUTE_POLYLINE_PRECISION))
         return path
     except Exception:
         return None
 
 
 def haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0
+    R = EARTH_RADIUS_KM
     dlat = math.radians(lat2 - lat1)
     dlon = math.radians(lon2 - lon1)
     a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * \
@@ -96,6 +302,158 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * c
 
 
+def haversine_many(lat, lon, lats, lons):
+    """Distances in km from (lat, lon) to every point of `lats`/`lons`.
+
+    Returns a NumPy array when NumPy is installed, otherwise a list.
+    """
+    if np is not None:
+        lat1 = math.radians(lat)
+        lat2 = np.radians(np.asarray(lats, dtype=float))
+        dlat = lat2 - lat1
+        dlon = np.radians(np.asarray(lons, dtype=float)) - math.radians(lon)
+        a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    # pure-Python path: hoist the per-origin terms out of the loop
+    sin, cos, asin, sqrt, rad = math.sin, math.cos, math.asin, math.sqrt, math.radians
+    lat1 = rad(lat)
+    lon1 = rad(lon)
+    cos1 = cos(lat1)
+    out = []
+    for plat, plon in zip(lats, lons):
+        lat2 = rad(plat)
+        a = sin((lat2 - lat1) / 2) ** 2 + cos1 * cos(lat2) * sin((rad(plon) - lon1) / 2) ** 2
+        out.append(2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0))))
+    return out
+
+
+def distance_matrix(lats_a, lons_a, lats_b, lons_b):
+    """Pairwise km distances: row i holds the distances from point a[i] to every b.
+
+    A 2-D NumPy array when NumPy is installed, otherwise a list of lists.
+    """
+    if np is not None:
+        lat1 = np.radians(np.asarray(lats_a, dtype=float))[:, None]
+        lon1 = np.radians(np.asarray(lons_a, dtype=float))[:, None]
+        lat2 = np.radians(np.asarray(lats_b, dtype=float))[None, :]
+        lon2 = np.radians(np.asarray(lons_b, dtype=float))[None, :]
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    lats_b = list(lats_b)
+    lons_b = list(lons_b)
+    return [haversine_many(lat, lon, lats_b, lons_b) for lat, lon in zip(lats_a, lons_a)]
+
+
+# Web Mercator ground resolution at the equator for zoom 0
+METERS_PER_PIXEL_Z0 = 156543.03392
+ROUTE_TOLERANCE_PX = 1.0  # detail finer than this many screen pixels is dropped
+
+
+def meters_per_pixel(lat: float, zoom: float) -> float:
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def _segment_distances(xs, ys, i, j):
+    """Distances (m) from points i+1..j-1 to the segment i-j, in projected metres."""
+    ax, ay, bx, by = xs[i], ys[i], xs[j], ys[j]
+    dx, dy = bx - ax, by - ay
+    seg2 = dx * dx + dy * dy
+    if np is not None:
+        px = xs[i + 1:j] - ax
+        py = ys[i + 1:j] - ay
+        if seg2 == 0.0:
+            return np.hypot(px, py)
+        t = np.clip((px * dx + py * dy) / seg2, 0.0, 1.0)
+        return np.hypot(px - t * dx, py - t * dy)
+    out = []
+    for k in range(i + 1, j):
+        px, py = xs[k] - ax, ys[k] - ay
+        t = 0.0 if seg2 == 0.0 else min(1.0, max(0.0, (px * dx + py * dy) / seg2))
+        out.append(math.hypot(px - t * dx, py - t * dy))
+    return out
+
+
+def simplify_path(path, tolerance_m: float):
+    """Douglas-Peucker simplification of a (lat, lon) path.
+
+    Drops every point that lies within `tolerance_m` metres of the simplified
+    line; the endpoints are always kept. Points are projected onto a local
+    equirectangular plane first, which is accurate at route scale.
+    """
+    n = len(path)
+    if n < 3 or tolerance_m <= 0:
+        return list(path)
+    lat0 = math.radians(sum(p[0] for p in path) / n)
+    ky = EARTH_RADIUS_KM * 1000.0 * math.pi / 180.0
+    kx = ky * math.cos(lat0)
+    if np is not None:
+        arr = np.asarray(path, dtype=float)
+        ys, xs = arr[:, 0] * ky, arr[:, 1] * kx
+    else:
+        ys = [p[0] * ky for p in path]
+        xs = [p[1] * kx for p in path]
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        dists = _segment_distances(xs, ys, i, j)
+        if np is not None:
+            k = int(np.argmax(dists))
+            dmax = float(dists[k])
+        else:
+            k = max(range(len(dists)), key=dists.__getitem__)
+            dmax = dists[k]
+        if dmax > tolerance_m:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return [p for p, kept in zip(path, keep) if kept]
+
+
+class ZoomSimplifiedPath:
+    """A route that hands out a copy simplified for the current map zoom.
+
+    Each integer zoom level is simplified once and memoised, so redrawing
+    after a zoom change is a dict lookup. Fractional zooms round up to the
+    finer level.
+    """
+
+    def __init__(self, path, tolerance_px: float = ROUTE_TOLERANCE_PX):
+        self.path = list(path)
+        self.tolerance_px = tolerance_px
+        self._lat = sum(p[0] for p in self.path) / len(self.path) if self.path else 0.0
+        self._levels = {}
+
+    @staticmethod
+    def level(zoom: float) -> int:
+        return int(math.ceil(zoom - 1e-9))
+
+    def at(self, zoom: float):
+        level = self.level(zoom)
+        simplified = self._levels.get(level)
+        if simplified is None:
+            tolerance = self.tolerance_px * meters_per_pixel(self._lat, level)
+            simplified = self._levels[level] = simplify_path(self.path, tolerance)
+        return simplified
+
+
+def ip_location():
+    """Approximate (lat, lon) of this machine from its public IP, or None."""
+    try:
+        # no retries: the location flow may call this from the Tk thread
+        data = HTTP.get_json(IP_API_URL, timeout=5, retries=0)
+        if data.get('status') == 'success':
+            return float(data['lat']), float(data['lon'])
+    except Exception:
+        pass
+    return None
+
+
 def enable_location(on_success_callback, on_fail_callback):
     """
     Tries to get user's location.
@@ -202,18 +560,11 @@ if(navigator && navigator.geolocation){
                     server.shutdown()
                 except Exception:
                     pass
-                try:
-                    req = urlrequest.Request(
-                        'http://ip-api.com/json', headers={'User-Agent': 'taxi-booking-app/1.0'})
-                    with urlrequest.urlopen(req, timeout=8) as resp:
-                        data = json.loads(resp.read().decode('utf-8'))
-                    if data.get('status') == 'success':
-                        lat, lon = float(data['lat']), float(data['lon'])
-                        on_success_callback(lat, lon)
-                        return
-                except Exception:
-                    pass
-                on_fail_callback('Could not detect location. You can search manually.')
+                coords = ip_location()
+                if coords:
+                    on_success_callback(*coords)
+                else:
+                    on_fail_callback('Could not detect location. You can search manually.')
                 return
             root_widget.after(interval_ms, poll)
 
@@ -227,17 +578,10 @@ if(navigator && navigator.geolocation){
             poll_for_coords(server, root_widget)
         except Exception:
             # fallback: IP-based approximate geolocation
-            try:
-                req = urlrequest.Request(
-                    'http://ip-api.com/json', headers={'User-Agent': 'taxi-booking-app/1.0'})
-                with urlrequest.urlopen(req, timeout=8) as resp:
-                    data = json.loads(resp.read().decode('utf-8'))
-                if data.get('status') == 'success':
-                    lat, lon = float(data['lat']), float(data['lon'])
-                    on_success_callback(lat, lon)
-                    return
-            except Exception:
-                pass
+            coords = ip_location()
+            if coords:
+                on_success_callback(*coords)
+                return
             on_fail_callback('Location detection failed. You can search manually.')
 
     # The root widget is needed for `after` calls.
@@ -0,0 +1,117 @@
+"""Keyed map markers that are updated in place instead of redrawn.
+
+Recreating every driver marker on each refresh churns TkinterMapView canvas
+items. Each delete() also forces a canvas update, which is what makes the
+map flicker. MarkerManager keys markers by id (a driver id or a cluster's
+cell id). It diffs each new set against what is on the map, moves or
+relabels only the markers that changed, and doesn't draw markers outside
+the visible bounds.
+"""
+import math
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+MARKER_MARGIN = 0.15  # fraction of the view also drawn past each edge, so short pans show no gaps
+
+
+def tile_to_latlon(x: float, y: float, zoom: int) -> Tuple[float, float]:
+    """(lat, lon) of a fractional OSM tile position."""
+    n = 2.0 ** zoom
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n)))), x / n * 360.0 - 180.0
+
+
+def view_bounds(mapw, margin: float = MARKER_MARGIN) -> Optional[Tuple[float, float, float, float]]:
+    """(south, west, north, east) shown by a TkinterMapView, widened by `margin`; None if unknown."""
+    try:
+        (x0, y0), (x1, y1) = mapw.upper_left_tile_pos, mapw.lower_right_tile_pos
+        zoom = round(mapw.zoom)
+    except Exception:
+        return None
+    dx, dy = (x1 - x0) * margin, (y1 - y0) * margin
+    north, west = tile_to_latlon(x0 - dx, y0 - dy, zoom)
+    south, east = tile_to_latlon(x1 + dx, y1 + dy, zoom)
+    return south, west, north, east
+
+
+def _inside(bounds, lat, lon) -> bool:
+    south, west, north, east = bounds
+    return south <= lat <= north and west <= lon <= east
+
+
+class MarkerManager:
+    """Markers on a map, reconciled against the latest set on every update().
+
+    `set_marker(lat, lon, text=...)` creates a marker (e.g. TkinterMapView's
+    set_marker). The object it returns needs set_position(), set_text() and
+    delete(). Canvas errors from a closing window are swallowed, as the rest
+    of the map UI does.
+    """
+
+    def __init__(self, set_marker: Callable[..., Any]):
+        self._set_marker = set_marker
+        self._drawn: Dict[Hashable, list] = {}  # id -> [marker, lat, lon, text]
+        self._wanted: Dict[Hashable, Tuple[float, float, str]] = {}
+        self.stats = {"created": 0, "moved": 0, "relabelled": 0, "deleted": 0, "culled": 0, "kept": 0}
+
+    def __len__(self):
+        return len(self._drawn)
+
+    def __contains__(self, marker_id):
+        return marker_id in self._drawn
+
+    def update(self, markers: Iterable[dict],
+               bounds: Optional[Tuple[float, float, float, float]] = None) -> Dict[str, int]:
+        """Show exactly `markers` ({"id", "lat", "lon", "text"} dicts) within `bounds`.
+
+        `bounds` is (south, west, north, east). None draws everything.
+        Returns what this update did, as counts keyed like `stats`.
+        """
+        self._wanted = {m["id"]: (m["lat"], m["lon"], m["text"]) for m in markers}
+        return self.refresh(bounds)
+
+    def refresh(self, bounds: Optional[Tuple[float, float, float, float]] = None) -> Dict[str, int]:
+        """Re-apply the last update() for new bounds, e.g. after the map was panned."""
+        done = dict.fromkeys(self.stats, 0)
+        for marker_id in list(self._drawn):
+            wanted = self._wanted.get(marker_id)
+            if wanted is None or (bounds is not None and not _inside(bounds, wanted[0], wanted[1])):
+                self._delete(marker_id)
+                done["deleted" if wanted is None else "culled"] += 1
+        for marker_id, (lat, lon, text) in self._wanted.items():
+            if bounds is not None and not _inside(bounds, lat, lon):
+                continue
+            drawn = self._drawn.get(marker_id)
+            try:
+                if drawn is None:
+                    self._drawn[marker_id] = [self._set_marker(lat, lon, text=text), lat, lon, text]
+                    done["created"] += 1
+                    continue
+                changed = False
+                if (drawn[1], drawn[2]) != (lat, lon):
+                    drawn[0].set_position(lat, lon)
+                    drawn[1], drawn[2] = lat, lon
+                    done["moved"] += 1
+                    changed = True
+                if drawn[3] != text:
+                    drawn[0].set_text(text)
+                    drawn[3] = text
+                    done["relabelled"] += 1
+                    changed = True
+                if not changed:
+                    done["kept"] += 1
+            except Exception:
+                pass
+        for key, n in done.items():
+            self.stats[key] += n
+        return done
+
+    def _delete(self, marker_id):
+        marker = self._drawn.pop(marker_id)[0]
+        try:
+            marker.delete()
+        except Exception:
+            pass
+
+    def clear(self):
+        self._wanted = {}
+        for marker_id in list(self._drawn):
+            self._delete(marker_id)
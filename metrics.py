@@ -0,0 +1,10 @@
+"""Small helpers for the latency reports of tasks.py, benchmarks.py and loadgen.py."""
+from typing import List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `values` (0.0 for none); pct runs 0..100."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
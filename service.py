@@ -0,0 +1,444 @@
+"""Headless HTTP/JSON API over the booking, auth and dispatch functions.
+
+Does what the Tk windows do, without a display. Scripts and thin clients
+can drive the same process concurrently. Requests are served on a thread
+each (keep-alive, HTTP/1.1). Reads borrow connections from db's shared
+pool and writes queue on its single writer thread, as they do under the UIs.
+
+Every response is {"ok": bool, "message": str, "data": ...}. Log in with
+POST /login to get a token and send it as "Authorization: Bearer <token>".
+
+    GET   /health
+    POST  /register                 {name, address, phone, email, username, password}
+    POST  /login                    {username, password}
+    POST  /logout
+    GET   /bookings                 ?limit=&after=&order=id|schedule&status=
+    POST  /bookings                 {pickup, dropoff, date, time[, duration_min][, customer_id]}
+    POST  /bookings/bulk            {bookings: [...]}                       (admin)
+    GET   /bookings/<id>
+    PATCH /bookings/<id>            {pickup?, dropoff?, date?, time?, duration_min?}
+    POST  /bookings/<id>/cancel
+    POST  /bookings/<id>/assign     {driver_id?}  without one: best free driver (admin)
+    POST  /bookings/<id>/complete                                           (driver, admin)
+    GET   /drivers/available        ?date=&time=&duration_min=
+
+Customers see and change only their own bookings, drivers only the ones
+assigned to them.
+
+    python service.py --port 8080 [--dispatch]
+"""
+import argparse
+import http.server
+import json
+import re
+import secrets
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+from urllib import parse as urlparse
+
+import auth
+import booking
+import db
+import dispatch
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+MAX_PAGE_SIZE = 1000      # largest ?limit= accepted by GET /bookings
+MAX_BODY_BYTES = 1 << 20  # request bodies beyond this are refused
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Sessions:
+    """Bearer tokens of logged-in users, kept in memory for the life of the process."""
+
+    def __init__(self):
+        self._users: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._users)
+
+    def open(self, user: dict) -> str:
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._users[token] = user
+        return token
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            return self._users.get(token)
+
+    def close(self, token: str):
+        with self._lock:
+            self._users.pop(token, None)
+
+
+def _public(user: dict) -> dict:
+    return {k: v for k, v in user.items() if k != "password"}
+
+
+def _require(body: dict, *names):
+    missing = [n for n in names if body.get(n) in (None, "")]
+    if missing:
+        raise ApiError(400, f"Missing fields: {', '.join(missing)}.")
+
+
+def _text(body: dict, *names):
+    # the booking functions strip() these; anything but a string would fail deep inside them
+    wrong = [n for n in names if body.get(n) is not None and not isinstance(body[n], str)]
+    if wrong:
+        raise ApiError(400, f"Must be text: {', '.join(wrong)}.")
+
+
+def _int(value, name: str) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} must be an integer.") from None
+
+
+def _refused(message: str) -> ApiError:
+    # the business functions answer (False, message); "not found" is the only one that isn't a conflict
+    return ApiError(404 if message.endswith("not found.") else 409, message)
+
+
+def _load_booking(booking_id: int) -> dict:
+    with db.connection() as conn:
+        row = conn.execute("SELECT * FROM bookings WHERE id=?", (booking_id,)).fetchone()
+    if row is None:
+        raise ApiError(404, "Booking not found.")
+    return dict(row)
+
+
+def _check_customer(customer_id: int):
+    with db.connection() as conn:
+        row = conn.execute("SELECT 1 FROM users WHERE id=? AND role='customer'", (customer_id,)).fetchone()
+    if row is None:
+        raise ApiError(400, f"No customer with id {customer_id}.")
+
+
+def _visible_booking(user: dict, booking_id: int) -> dict:
+    row = _load_booking(booking_id)
+    owner = {"customer": row["customer_id"], "driver": row["driver_id"]}.get(user["role"], user["id"])
+    if owner != user["id"]:
+        # someone else's booking reads as missing rather than forbidden
+        raise ApiError(404, "Booking not found.")
+    return row
+
+
+def _role(user: dict, *roles):
+    if user["role"] not in roles:
+        raise ApiError(403, f"Only {' or '.join(roles)} accounts can do that.")
+
+
+class Api:
+    """Routes requests to handlers. Each handler returns (status, message, data)."""
+
+    def __init__(self, sessions: Optional[Sessions] = None):
+        self.sessions = sessions or Sessions()
+        self.stats = {"requests": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self.started = time.time()
+        # (method, path pattern, handler, needs a logged-in user)
+        self.routes = [
+            ("GET", r"/health", self.health, False),
+            ("POST", r"/register", self.register, False),
+            ("POST", r"/login", self.login, False),
+            ("POST", r"/logout", self.logout, True),
+            ("GET", r"/bookings", self.list_bookings, True),
+            ("POST", r"/bookings", self.create_booking, True),
+            ("POST", r"/bookings/bulk", self.create_bookings_bulk, True),
+            ("GET", r"/bookings/(\d+)", self.get_booking, True),
+            ("PATCH", r"/bookings/(\d+)", self.update_booking, True),
+            ("POST", r"/bookings/(\d+)/cancel", self.cancel_booking, True),
+            ("POST", r"/bookings/(\d+)/assign", self.assign_booking, True),
+            ("POST", r"/bookings/(\d+)/complete", self.complete_booking, True),
+            ("GET", r"/drivers/available", self.available_drivers, True),
+        ]
+        self.routes = [(m, re.compile(p + "$"), h, auth_) for m, p, h, auth_ in self.routes]
+
+    def handle(self, method: str, path: str, query: dict, body: dict, token: Optional[str]):
+        """Run one request; returns (HTTP status, response document)."""
+        with self._stats_lock:
+            self.stats["requests"] += 1
+        try:
+            status, message, data = self._route(method, path, query, body, token)
+            return status, {"ok": True, "message": message, "data": data}
+        except ApiError as e:
+            with self._stats_lock:
+                self.stats["errors"] += 1
+            return e.status, {"ok": False, "message": e.message, "data": None}
+        except Exception:
+            # a bug, not a bad request: answer anyway so the client isn't left hanging
+            traceback.print_exc(file=sys.stderr)
+            with self._stats_lock:
+                self.stats["errors"] += 1
+            return 500, {"ok": False, "message": "Internal error.", "data": None}
+
+    def _route(self, method, path, query, body, token):
+        allowed = []
+        for route_method, pattern, handler, needs_user in self.routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            if route_method != method:
+                allowed.append(route_method)
+                continue
+            args = [int(g) for g in match.groups()]
+            if needs_user:
+                user = self.sessions.get(token) if token else None
+                if user is None:
+                    raise ApiError(401, "Log in first.")
+                return handler(user, *args, query=query, body=body, token=token)
+            return handler(*args, query=query, body=body)
+        if allowed:
+            raise ApiError(405, f"Use {' or '.join(allowed)} for {path}.")
+        raise ApiError(404, f"No such endpoint: {path}")
+
+    # -- accounts --
+
+    def health(self, query, body):
+        return 200, "ok", {"uptime_s": round(time.time() - self.started, 1), "sessions": len(self.sessions),
+                           **self.stats}
+
+    def register(self, query, body):
+        _require(body, "name", "address", "phone", "email", "username", "password")
+        _text(body, "name", "address", "phone", "email", "username", "password")
+        ok, message = auth.register_customer(body["name"], body["address"], body["phone"], body["email"],
+                                             body["username"], body["password"])
+        if not ok:
+            raise _refused(message)
+        return 201, message, None
+
+    def login(self, query, body):
+        _require(body, "username", "password")
+        _text(body, "username", "password")
+        ok, message, user = auth.login(body["username"], body["password"])
+        if not ok:
+            raise ApiError(401, message)
+        user = _public(user)
+        return 200, "Logged in.", {"token": self.sessions.open(user), "user": user}
+
+    def logout(self, user, query, body, token):
+        self.sessions.close(token)
+        return 200, "Logged out.", None
+
+    # -- bookings --
+
+    def list_bookings(self, user, query, body, token):
+        limit = min(_int(query.get("limit", booking.PAGE_SIZE), "limit"), MAX_PAGE_SIZE)
+        order = query.get("order", "id")
+        if order not in booking.PAGE_ORDERS:
+            raise ApiError(400, f"order must be one of: {', '.join(booking.PAGE_ORDERS)}.")
+        after = None
+        if query.get("after"):
+            try:
+                after = tuple(json.loads(query["after"]))
+            except (TypeError, ValueError):
+                raise ApiError(400, "after must be the 'next' cursor of the previous page.") from None
+            if (len(after) != len(booking.PAGE_ORDERS[order][1])
+                    or not all(isinstance(v, (int, str)) and not isinstance(v, bool) for v in after)):
+                raise ApiError(400, "after must be the 'next' cursor of the previous page.")
+        scope = {"customer": {"customer_id": user["id"]}, "driver": {"driver_id": user["id"]}}.get(user["role"], {})
+        rows, cursor = booking.list_bookings_page(after, max(limit, 1), order, query.get("status"), **scope)
+        return 200, f"{len(rows)} bookings.", {"bookings": rows, "next": cursor and list(cursor)}
+
+    def create_booking(self, user, query, body, token):
+        _role(user, "customer", "admin")
+        _require(body, "pickup", "dropoff", "date", "time")
+        _text(body, "pickup", "dropoff", "date", "time")
+        if user["role"] == "admin":
+            _require(body, "customer_id")
+            customer_id = _int(body["customer_id"], "customer_id")
+            _check_customer(customer_id)
+        else:
+            customer_id = user["id"]
+        duration = _int(body.get("duration_min", db.DEFAULT_TRIP_MINUTES), "duration_min")
+        ok, message, row = booking.create_booking(customer_id, body["pickup"], body["dropoff"],
+                                                  body["date"], body["time"], duration)
+        if not ok:
+            raise _refused(message)
+        return 201, message, row
+
+    def create_bookings_bulk(self, user, query, body, token):
+        _role(user, "admin")
+        if not isinstance(body.get("bookings"), list):
+            raise ApiError(400, "bookings must be a list.")
+        ok, message, rows = booking.create_bookings_bulk(body["bookings"])
+        if not ok:
+            raise ApiError(409, message)
+        return 201, message, rows
+
+    def get_booking(self, user, booking_id, query, body, token):
+        return 200, "ok", _visible_booking(user, booking_id)
+
+    def update_booking(self, user, booking_id, query, body, token):
+        _role(user, "customer", "admin")
+        _text(body, "pickup", "dropoff", "date", "time")
+        _visible_booking(user, booking_id)
+        duration = body.get("duration_min")
+        ok, message, row = booking.update_booking(booking_id, body.get("pickup"), body.get("dropoff"),
+                                                  body.get("date"), body.get("time"),
+                                                  None if duration is None else _int(duration, "duration_min"))
+        if not ok:
+            raise _refused(message)
+        return 200, message, row
+
+    def cancel_booking(self, user, booking_id, query, body, token):
+        _role(user, "customer", "admin")
+        _visible_booking(user, booking_id)
+        ok, message = booking.cancel_booking(booking_id)
+        if not ok:
+            raise _refused(message)
+        return 200, message, _load_booking(booking_id)
+
+    def assign_booking(self, user, booking_id, query, body, token):
+        _role(user, "admin")
+        if body.get("driver_id") is None:
+            ok, message, _ = dispatch.auto_assign(booking_id)
+        else:
+            ok, message = booking.assign_driver(booking_id, _int(body["driver_id"], "driver_id"))
+        if not ok:
+            raise _refused(message)
+        return 200, message, _load_booking(booking_id)
+
+    def complete_booking(self, user, booking_id, query, body, token):
+        _role(user, "driver", "admin")
+        _visible_booking(user, booking_id)
+        ok, message = booking.complete_booking(booking_id)
+        if not ok:
+            raise _refused(message)
+        return 200, message, _load_booking(booking_id)
+
+    # -- drivers --
+
+    def available_drivers(self, user, query, body, token):
+        start = None
+        if query.get("date") or query.get("time"):
+            start = booking.slot_start(query.get("date", ""), query.get("time", ""))
+            if start is None:
+                raise ApiError(400, "Date must be YYYY-MM-DD and time HH:MM.")
+        duration = _int(query.get("duration_min", db.DEFAULT_TRIP_MINUTES), "duration_min")
+        drivers = booking.available_drivers(start, duration)
+        return 200, f"{len(drivers)} drivers available.", drivers
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default backlog of 5 refuses bursts of load-test clients
+
+
+def _handler_class(api: Api):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _serve(self):
+            parts = urlparse.urlsplit(self.path)
+            query = dict(urlparse.parse_qsl(parts.query))
+            auth_header = self.headers.get("Authorization", "")
+            token = auth_header[7:].strip() if auth_header.startswith("Bearer ") else None
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                # the body's end is unknown, so the connection can't be reused
+                status, doc = 400, {"ok": False, "message": "Content-Length must be a non-negative integer.",
+                                    "data": None}
+                self.close_connection = True
+            elif length > MAX_BODY_BYTES:
+                status, doc = 413, {"ok": False, "message": "Request body too large.", "data": None}
+                self.close_connection = True
+            else:
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw.strip() else {}
+                    if not isinstance(body, dict):
+                        raise ValueError
+                except ValueError:
+                    status, doc = 400, {"ok": False, "message": "Body must be a JSON object.", "data": None}
+                else:
+                    status, doc = api.handle(self.command, parts.path.rstrip("/") or "/", query, body, token)
+            data = json.dumps(doc).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _serve
+
+        def log_message(self, format, *args):
+            return
+
+    return Handler
+
+
+class BookingService:
+    """The API on a socket. port=0 picks a free port; see `url`."""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, api: Optional[Api] = None):
+        self.api = api or Api()
+        self.server = _Server((host, port), _handler_class(self.api))
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "BookingService":
+        """Serve on a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.1,),
+                                        name="booking-service", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def close(self):
+        if self._thread is not None:
+            self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the taxi booking API over HTTP/JSON.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", help="database file (default: taxi_booking.db)")
+    parser.add_argument("--pool-size", type=int, help=f"pooled read connections (default {db.POOL_SIZE})")
+    parser.add_argument("--dispatch", action="store_true", help="also run the batch dispatcher in this process")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.DB_PATH = args.db
+    if args.pool_size:
+        db.configure_pool(size=args.pool_size)
+    auth.seed_defaults()
+
+    service = BookingService(args.host, args.port)
+    dispatcher = None
+    if args.dispatch:
+        from dispatcher import Dispatcher
+        dispatcher = Dispatcher().start()
+    print(f"Serving on {service.url}")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if dispatcher:
+            dispatcher.stop()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
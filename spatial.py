@@ -0,0 +1,150 @@
+import heapq
+import math
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from map import haversine_many
+
+KM_PER_DEG_LAT = 111.32
+DEFAULT_CELL_DEG = 0.02  # ~2.2 km tall cells; a few cells cover a typical nearby search
+
+
+def _distances(lat: float, lon: float, entries) -> List[float]:
+    # entries are (key, lat, lon, item); one vectorized call per batch of candidates
+    dists = haversine_many(lat, lon, [e[1] for e in entries], [e[2] for e in entries])
+    return dists.tolist() if hasattr(dists, "tolist") else dists
+
+
+class SpatialIndex:
+    """Uniform lat/lon grid of buckets for radius and k-nearest lookups.
+
+    Points live in the bucket of the cell that contains them, so a query only
+    looks at the handful of cells around the search point instead of every
+    point. Keys are unique: inserting an existing key moves it. Safe to fill
+    from a background thread while the UI thread queries it.
+    """
+
+    def __init__(self, cell_deg: float = DEFAULT_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._lock = threading.RLock()
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float, Any]]] = {}
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def insert(self, key: Hashable, lat: float, lon: float, item: Any = None):
+        cell = self._cell(lat, lon)
+        with self._lock:
+            old = self._where.get(key)
+            if old is not None and old != cell:
+                self._drop(key, old)
+            self._cells.setdefault(cell, {})[key] = (lat, lon, item)
+            self._where[key] = cell
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            cell = self._where.pop(key, None)
+            if cell is not None:
+                self._drop(key, cell)
+
+    def _drop(self, key, cell):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._where.clear()
+
+    def items(self):
+        with self._lock:
+            snapshot = [(key, lat, lon, item) for bucket in self._cells.values()
+                        for key, (lat, lon, item) in bucket.items()]
+        return snapshot
+
+    def _cells_in_box(self, lat: float, lon: float, km: float):
+        dlat = km / KM_PER_DEG_LAT
+        dlon = km / (KM_PER_DEG_LAT * max(0.01, math.cos(math.radians(lat))))
+        r0, c0 = self._cell(lat - dlat, lon - dlon)
+        r1, c1 = self._cell(lat + dlat, lon + dlon)
+        if (r1 - r0 + 1) * (c1 - c0 + 1) > len(self._cells):
+            # the box spans more cells than are populated: walk the buckets instead
+            for (r, c), bucket in self._cells.items():
+                if r0 <= r <= r1 and c0 <= c <= c1:
+                    yield bucket
+            return
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                bucket = self._cells.get((r, c))
+                if bucket:
+                    yield bucket
+
+    def radius(self, lat: float, lon: float, km: float) -> List[Tuple[float, Hashable, Any]]:
+        """All points within `km` of (lat, lon) as (dist_km, key, item), nearest first."""
+        with self._lock:
+            entries = [(key, plat, plon, item)
+                       for bucket in self._cells_in_box(lat, lon, km)
+                       for key, (plat, plon, item) in bucket.items()]
+        if not entries:
+            return []
+        found = [(dist, e[0], e[3]) for dist, e in zip(_distances(lat, lon, entries), entries)
+                 if dist <= km]
+        found.sort(key=lambda x: x[0])
+        return found
+
+    def nearest(self, lat: float, lon: float, k: int,
+                max_km: Optional[float] = None) -> List[Tuple[float, Hashable, Any]]:
+        """The k points closest to (lat, lon) as (dist_km, key, item), nearest first.
+
+        Searches outward ring by ring and stops once nothing outside the rings
+        visited so far can beat the current k-th best distance.
+        """
+        with self._lock:
+            return self._nearest(lat, lon, k, max_km)
+
+    def _nearest(self, lat, lon, k, max_km):
+        if k <= 0 or not self._cells:
+            return []
+        row, col = self._cell(lat, lon)
+        # smallest distance covered by one cell step at this latitude
+        cell_km = self.cell_deg * KM_PER_DEG_LAT * min(1.0, max(0.01, math.cos(math.radians(lat))))
+        rows = [r for r, _ in self._cells]
+        cols = [c for _, c in self._cells]
+        max_ring = max(abs(row - min(rows)), abs(row - max(rows)),
+                       abs(col - min(cols)), abs(col - max(cols)))
+        best = []  # max-heap of (-dist, seq, key, item); seq keeps ties comparable
+        seq = 0
+        for ring in range(max_ring + 1):
+            entries = []
+            for r in range(row - ring, row + ring + 1):
+                step = 1 if abs(r - row) == ring else 2 * ring
+                for c in range(col - ring, col + ring + 1, max(1, step)):
+                    bucket = self._cells.get((r, c))
+                    if bucket:
+                        entries.extend((key, plat, plon, item)
+                                       for key, (plat, plon, item) in bucket.items())
+            if entries:
+                for dist, (key, _, _, item) in zip(_distances(lat, lon, entries), entries):
+                    if max_km is not None and dist > max_km:
+                        continue
+                    seq += 1
+                    if len(best) < k:
+                        heapq.heappush(best, (-dist, seq, key, item))
+                    elif dist < -best[0][0]:
+                        heapq.heapreplace(best, (-dist, seq, key, item))
+            reach = ring * cell_km
+            if len(best) >= k and -best[0][0] <= reach:
+                break
+            if max_km is not None and reach > max_km:
+                break
+        return sorted(((-d, key, item) for d, _, key, item in best), key=lambda x: x[0])
@@ -0,0 +1,175 @@
+"""Background task runner bridged to the Tk event loop.
+
+Blocking calls (geocoding, routing, search) run on a small thread pool and
+their results are handed back on the Tk thread through widget.after(), so the
+map window never freezes on the network. Tasks are submitted on a named
+channel; a newer submission on the same channel supersedes the older one,
+whose result is dropped (and which is cancelled outright if it hasn't started),
+so the user only ever sees the answer for what they typed last.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from metrics import percentile
+
+TRACE_SIZE = 500  # latency samples kept for latency_report()
+
+
+class TkTaskRunner:
+    def __init__(self, widget, max_workers: int = 4, poll_ms: int = 30):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tk-task")
+        self._done: "queue.Queue[tuple]" = queue.Queue()
+        self._gens: Dict[str, int] = {}
+        self._futures: Dict[str, list] = {}
+        self._pending = 0
+        self._poll_id = None
+        self._heartbeat_id = None
+        self._closed = False
+        self.trace = deque(maxlen=TRACE_SIZE)     # per-task timings, ms
+        self.ui_lag = deque(maxlen=TRACE_SIZE)    # heartbeat lateness, ms
+        self.stats = {"submitted": 0, "delivered": 0, "dropped": 0, "cancelled": 0, "failed": 0}
+
+    # -- submission (Tk thread) --
+
+    def submit(self, channel: str, fn: Callable, *args,
+               on_done: Optional[Callable] = None, on_error: Optional[Callable] = None) -> int:
+        """Run fn(*args) in the background; on_done(result) runs on the Tk thread."""
+        return self.gather(channel, [(fn, args)],
+                           on_done=(lambda results: on_done(results[0])) if on_done else None,
+                           on_error=on_error)
+
+    def gather(self, channel: str, calls: Sequence[Tuple[Callable, tuple]],
+               on_done: Optional[Callable] = None, on_error: Optional[Callable] = None) -> int:
+        """Run several calls concurrently; on_done(list_of_results) once all finish."""
+        if self._closed:
+            return -1
+        self.cancel(channel)
+        gen = self._gens.get(channel, 0) + 1
+        self._gens[channel] = gen
+        submitted = time.perf_counter()
+        timings = [[submitted, submitted, submitted] for _ in calls]  # submitted, started, finished
+        remaining = [len(calls)]
+        lock = threading.Lock()
+
+        def run(i, fn, args):
+            timings[i][1] = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                timings[i][2] = time.perf_counter()
+
+        def one_done(_fut):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._done.put((channel, gen, futures, timings, on_done, on_error))
+
+        futures = [self._executor.submit(run, i, fn, args) for i, (fn, args) in enumerate(calls)]
+        self._futures[channel] = futures
+        self._pending += 1
+        self.stats["submitted"] += 1
+        for fut in futures:
+            fut.add_done_callback(one_done)
+        self._schedule_poll()
+        return gen
+
+    def cancel(self, channel: str):
+        """Drop whatever is in flight on `channel`."""
+        futures = self._futures.pop(channel, None)
+        if futures:
+            self._gens[channel] = self._gens.get(channel, 0) + 1
+            for fut in futures:
+                if fut.cancel():
+                    self.stats["cancelled"] += 1
+
+    # -- delivery (Tk thread) --
+
+    def _schedule_poll(self):
+        if self._poll_id is None and not self._closed:
+            try:
+                self._poll_id = self.widget.after(self.poll_ms, self._poll)
+            except Exception:
+                # widget destroyed
+                self.shutdown()
+
+    def _poll(self):
+        self._poll_id = None
+        while True:
+            try:
+                channel, gen, futures, timings, on_done, on_error = self._done.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if self._futures.get(channel) is futures:
+                del self._futures[channel]
+            if gen != self._gens.get(channel) or any(f.cancelled() for f in futures):
+                self.stats["dropped"] += 1
+                continue
+            delivered = time.perf_counter()
+            self.trace.append({
+                "channel": channel,
+                "queued_ms": max((t[1] - t[0]) * 1e3 for t in timings),
+                "run_ms": max((t[2] - t[0]) * 1e3 for t in timings),
+                "deliver_ms": (delivered - max(t[2] for t in timings)) * 1e3,
+            })
+            errors = [f.exception() for f in futures if f.exception() is not None]
+            if errors:
+                self.stats["failed"] += 1
+                if on_error:
+                    on_error(errors[0])
+                continue
+            self.stats["delivered"] += 1
+            if on_done:
+                on_done([f.result() for f in futures])
+        if self._pending > 0:
+            self._schedule_poll()
+
+    # -- responsiveness trace --
+
+    def start_heartbeat(self, interval_ms: int = 100):
+        """Record how late after() callbacks fire: a blocked Tk loop shows up as lag."""
+        expected = [time.perf_counter() + interval_ms / 1e3]
+
+        def beat():
+            now = time.perf_counter()
+            self.ui_lag.append(max(0.0, (now - expected[0]) * 1e3))
+            expected[0] = now + interval_ms / 1e3
+            try:
+                self._heartbeat_id = self.widget.after(interval_ms, beat)
+            except Exception:
+                self._heartbeat_id = None
+
+        if self._heartbeat_id is None:
+            self._heartbeat_id = self.widget.after(interval_ms, beat)
+
+    def latency_report(self) -> str:
+        lines = []
+        for key, label in (("queued_ms", "queue wait"), ("run_ms", "task time"),
+                           ("deliver_ms", "delivery to Tk")):
+            values = [t[key] for t in self.trace]
+            lines.append(f"{label:<16} p50 {percentile(values, 50):7.1f} ms  "
+                         f"p95 {percentile(values, 95):7.1f} ms  max {max(values, default=0.0):7.1f} ms")
+        lag = list(self.ui_lag)
+        lines.append(f"{'UI loop lag':<16} p50 {percentile(lag, 50):7.1f} ms  "
+                     f"p95 {percentile(lag, 95):7.1f} ms  max {max(lag, default=0.0):7.1f} ms")
+        lines.append(", ".join(f"{k} {v}" for k, v in self.stats.items()))
+        return "\n".join(lines)
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        for after_id in (self._poll_id, self._heartbeat_id):
+            if after_id is not None:
+                try:
+                    self.widget.after_cancel(after_id)
+                except Exception:
+                    pass
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import aiodb
+import auth
+import booking
+
+
+def test_operations_as_coroutines(temp_db):
+    async def scenario():
+        ok, _ = await aiodb.register_customer("Alice", "Thamel", "98", "a@example.com", "alice", "pw")
+        assert ok and await aiodb.username_exists("alice")
+        ok, role, user = await aiodb.login("alice", "pw")
+        assert ok and role == "customer"
+
+        results = await asyncio.gather(*(aiodb.create_booking(user["id"], f"P{i}", "Airport", "2025-01-01",
+                                                              "10:00") for i in range(50)))
+        assert all(ok for ok, _, _ in results)
+        ids = sorted(row["id"] for _, _, row in results)
+        assert [b["id"] for b in await aiodb.list_bookings_by_customer(user["id"])] == ids
+        rows, cursor = await aiodb.list_bookings_page(limit=20)
+        assert len(rows) == 20 and cursor == (rows[-1]["id"],)
+
+        assert await aiodb.cancel_booking(ids[0]) == (True, "Booking cancelled.")
+        assert (await aiodb.get_booking(ids[0]))["status"] == "cancelled"
+        assert await aiodb.get_booking(10 ** 6) is None
+        rows, cursor = await aiodb.list_bookings_page(cursor, limit=50)
+        assert len(rows) == 30 and cursor is None
+    asyncio.run(scenario())
+
+
+def test_threads_stay_bounded_under_many_requests(temp_db):
+    auth.seed_defaults()
+    names = set()
+
+    def record(conn):
+        names.add(threading.current_thread().name)
+        return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    async def scenario():
+        counts = await asyncio.gather(*(aiodb.read(record) for _ in range(500)))
+        logins = await asyncio.gather(*(aiodb.login("admin", "admin123") for _ in range(500)))
+        return counts, logins
+    counts, logins = asyncio.run(scenario())
+    assert counts == [2] * 500 and all(ok for ok, _, _ in logins)
+    assert len(names) <= aiodb._executor("read")._max_workers
+
+
+def test_write_runs_on_the_writer_thread(temp_db):
+    async def scenario():
+        def insert(conn, name):
+            conn.execute("""INSERT INTO users (username,password,role,name) VALUES (?, 'x', 'driver', ?)""",
+                         (name, name))
+            return threading.current_thread().name
+        writers = await asyncio.gather(*(aiodb.write(insert, f"d{i}") for i in range(20)))
+        return writers, await aiodb.fetchone("SELECT COUNT(*) AS n FROM users WHERE role='driver'")
+    writers, count = asyncio.run(scenario())
+    assert len(set(writers)) == 1 and count == {"n": 20}
+    assert booking.available_drivers(booking.slot_start("2025-01-01", "10:00"))[0]["name"] == "d0"
+
+
+def test_auto_assign_keeps_off_the_write_workers(temp_db, monkeypatch):
+    auth.seed_defaults()
+    ok, _, row = booking.create_booking(1, "Thamel", "Airport", "2025-01-01", "10:00")
+    threads = []
+    real = aiodb.dispatch.auto_assign
+    monkeypatch.setattr(aiodb.dispatch, "auto_assign",
+                        lambda *args: threads.append(threading.current_thread().name) or real(*args))
+    ok, _, driver_id = asyncio.run(aiodb.auto_assign(row["id"]))
+    assert ok and driver_id is not None
+    assert threads[0].startswith("aiodb-dispatch")
@@ -0,0 +1,46 @@
+import autocomplete
+import booking
+from autocomplete import PrefixIndex, build_suggestion_index, load_suggestion_index
+from gazetteer import Gazetteer
+
+
+def test_complete_ranks_phrase_starts_then_weight():
+    index = build_suggestion_index(
+        popular=["Patan Durbar Square", "Durbar Marg"],
+        history=[("Durbar Marg Gate", 3), ("durbar marg", 4), ("Thamel", 9)],
+        places=["thamel chowk, kathmandu"])
+    assert len(index) == 5
+    # "durbar marg" from history only adds weight to the popular entry
+    assert index.complete("durbar") == ["Durbar Marg", "Durbar Marg Gate", "Patan Durbar Square"]
+    assert index.complete("DURBAR  m", 1) == ["Durbar Marg"]
+    assert index.complete("tham") == ["Thamel", "thamel chowk, kathmandu"]
+    assert index.complete("kath") == ["thamel chowk, kathmandu"]
+    assert index.complete("") == [] and index.complete("zz") == []
+
+
+def test_known_empty_prefixes_until_a_match_is_learned():
+    index = PrefixIndex()
+    index.mark_empty("xyz")
+    assert index.known_empty("xyz") and index.known_empty("XYZ road")
+    assert not index.known_empty("xy")
+    index.add("Old Xyz Road")
+    assert not index.known_empty("xyz road")
+    assert index.complete("xyz") == ["Old Xyz Road"]
+
+
+def test_load_suggestion_index_reads_own_history_and_known_places(temp_db, tmp_path, monkeypatch):
+    seed = tmp_path / "places.csv"
+    seed.write_text("name,aliases,district,lat,lon,kind,rank\nSanepa,,Lalitpur,27.684,85.306,area,5\n",
+                    encoding="utf-8")
+    gaz = Gazetteer(str(tmp_path / "gaz.db"), str(seed))
+    monkeypatch.setattr(autocomplete, "GAZETTEER", gaz)
+    booking.create_bookings_bulk([(1, "Bhaktapur Durbar Square", "Kirtipur", "2025-01-01", "10:00"),
+                                  (2, "House 12, Lazimpat", "Kirtipur", "2025-01-01", "11:00")])
+    index = load_suggestion_index(["Thamel"], customer_id=1)
+    assert index.complete("bhak") == ["Bhaktapur Durbar Square"]
+    assert index.complete("th") == ["Thamel"]
+    assert index.complete("sane") == ["Sanepa"]
+    # another customer's addresses never become suggestions
+    assert index.complete("house") == [] and index.complete("lazim") == []
+    assert load_suggestion_index(["Thamel"]).complete("bhak") == []
+    gaz.close()
@@ -0,0 +1,228 @@
+import threading
+import tracemalloc
+
+import pytest
+
+import booking
+import db
+
+
+def _add_drivers(n):
+    def insert(conn):
+        for i in range(n):
+            conn.execute("""INSERT INTO users (username,password,role,name,address)
+                            VALUES (?, 'x', 'driver', ?, '')""", (f"drv{i}", f"Driver {i}"))
+    db.write(insert)
+
+
+def test_auto_assign_claims_free_driver(temp_db):
+    _add_drivers(1)
+    ok, _, b = booking.create_booking(1, "Thamel", "New Road", "2025-01-01", "10:00")
+    ok, msg, driver_id = booking.auto_assign_driver(b["id"])
+    assert ok and driver_id is not None
+    # second call is a no-op: the booking is no longer 'booked'
+    ok, msg, _ = booking.auto_assign_driver(b["id"])
+    assert not ok and msg == "Booking is already assigned."
+    ok, msg, _ = booking.auto_assign_driver(9999)
+    assert not ok and msg == "Booking not found."
+
+
+def test_auto_assign_reports_no_drivers(temp_db):
+    _add_drivers(1)
+    first = booking.create_booking(1, "A", "B", "2025-01-01", "10:00")[2]
+    second = booking.create_booking(2, "C", "D", "2025-01-01", "10:00")[2]
+    assert booking.auto_assign_driver(first["id"])[0]
+    ok, msg, _ = booking.auto_assign_driver(second["id"])
+    assert not ok and msg == "No available drivers at that time."
+
+
+def test_concurrent_auto_assign_never_double_books(temp_db):
+    drivers, bookings_per_slot, threads_n = 5, 12, 8
+    _add_drivers(drivers)
+    ids = [booking.create_booking(c + 1, "A", "B", "2025-01-01", "10:00")[2]["id"]
+           for c in range(bookings_per_slot)]
+    errors = []
+
+    def hammer():
+        try:
+            for bid in ids:
+                booking.auto_assign_driver(bid)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=hammer) for _ in range(threads_n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    with db.connection() as conn:
+        rows = conn.execute("""SELECT driver_id, COUNT(*) AS n FROM bookings
+                               WHERE status='assigned' GROUP BY driver_id""").fetchall()
+    assert len(rows) == drivers
+    assert all(r["n"] == 1 for r in rows)
+
+
+def test_overlap_is_an_interval_check(temp_db):
+    _add_drivers(1)
+    first = booking.create_booking(1, "A", "B", "2025-01-01", "10:00")[2]   # 10:00-10:45
+    assert first["start_ts"] == booking.slot_start("2025-01-01", "10:00")
+    assert first["duration_min"] == booking.DEFAULT_TRIP_MINUTES
+    assert booking.auto_assign_driver(first["id"])[0]
+    clash = booking.create_booking(2, "C", "D", "2025-01-01", "10:05")[2]
+    assert booking.auto_assign_driver(clash["id"])[1] == "No available drivers at that time."
+    long_before = booking.create_booking(3, "E", "F", "2025-01-01", "08:00", duration_min=150)[2]
+    assert not booking.auto_assign_driver(long_before["id"])[0]            # runs until 10:30
+    after = booking.create_booking(4, "G", "H", "2025-01-01", "10:45")[2]  # starts as the first ends
+    assert booking.auto_assign_driver(after["id"])[0]
+
+    ok, msg, _ = booking.create_booking(5, "I", "J", "2025-01-01", "ten o'clock")
+    assert not ok and msg == "Date must be YYYY-MM-DD and time HH:MM."
+
+
+def test_assign_driver_and_available_drivers(temp_db):
+    _add_drivers(2)
+    driver_ids = [d["id"] for d in booking.available_drivers(booking.slot_start("2025-01-01", "10:00"))]
+    assert len(driver_ids) == 2
+    first = booking.create_booking(1, "A", "B", "2025-01-01", "10:00")[2]
+    second = booking.create_booking(2, "C", "D", "2025-01-01", "10:30")[2]
+    assert booking.assign_driver(first["id"], driver_ids[0]) == (True, "Driver assigned.")
+    assert booking.assign_driver(second["id"], driver_ids[0]) == (
+        False, "Driver has an overlapping booking at that time.")
+    # reassigning a booking to its own driver doesn't clash with itself
+    assert booking.assign_driver(first["id"], driver_ids[0])[0]
+
+    assert [d["id"] for d in booking.available_drivers(booking.slot_start("2025-01-01", "10:20"))] == driver_ids[1:]
+    assert len(booking.available_drivers(booking.slot_start("2025-01-01", "11:00"))) == 2
+    assert len(booking.available_drivers(booking.slot_start("2025-01-01", "09:00"), duration_min=61)) == 1
+
+
+def test_update_booking_keeps_the_driver_free(temp_db):
+    _add_drivers(1)
+    first = booking.create_booking(1, "A", "B", "2025-01-01", "10:00")[2]
+    second = booking.create_booking(2, "C", "D", "2025-01-01", "11:00")[2]
+    assert booking.auto_assign_driver(first["id"])[0] and booking.auto_assign_driver(second["id"])[0]
+    assert booking.update_booking(second["id"], time="10:30") == (
+        False, "Driver has an overlapping booking at that time.", None)
+    assert booking.update_booking(first["id"], duration_min=90)[1] == "Driver has an overlapping booking at that time."
+    # its own interval doesn't count, and a move into free time is fine
+    assert booking.update_booking(first["id"], time="10:10")[0]
+    assert booking.update_booking(second["id"], time="12:00", duration_min=120)[0]
+
+
+def test_init_db_backfills_start_ts(temp_db):
+    db.write(lambda conn: conn.executemany(
+        "INSERT INTO bookings (customer_id, pickup, dropoff, date, time, status) VALUES (1, 'A', 'B', ?, ?, 'booked')",
+        [("2025-01-01", "10:00"), ("2020 12 14", "2020")]))
+    db.init_db()
+    with db.connection() as conn:
+        rows = conn.execute("SELECT start_ts, duration_min FROM bookings ORDER BY id").fetchall()
+    assert [tuple(r) for r in rows] == [(booking.slot_start("2025-01-01", "10:00"), 45), (None, 45)]
+
+
+def test_create_bookings_bulk_streams_generator(temp_db):
+    def feed():
+        for i in range(1200):
+            yield {"customer_id": 1, "pickup": " Airport ", "dropoff": "Thamel",
+                   "date": "2025-01-01", "time": f"{i % 24:02d}:00"}
+
+    chunks = []
+    ok, msg, rows = booking.create_bookings_bulk(feed(), chunk_size=500,
+                                                 on_created=lambda r: chunks.append(len(r)))
+    assert ok and msg == "1200 bookings created."
+    assert rows == [] and chunks == [500, 500, 200]
+
+    ok, _, rows = booking.create_bookings_bulk([(2, "A", "B", "2025-01-02", "09:00")])
+    assert ok and rows[0]["customer_id"] == 2 and rows[0]["status"] == "booked"
+    assert rows[0]["id"] == 1201
+
+
+def test_create_bookings_bulk_is_atomic(temp_db):
+    items = [(1, "A", "B", "2025-01-01", "10:00"), (1, "", "B", "2025-01-01", "10:00")]
+    ok, msg, rows = booking.create_bookings_bulk(items)
+    assert not ok and msg == "Booking #2: All fields are required."
+    assert booking.list_bookings_by_customer(1) == []
+
+    ok, msg, _ = booking.create_bookings_bulk([(1, "A", "B", "2025-01-01", "10:00"), (1, 123, "B", "2025-01-01", "10:00")])
+    assert not ok and msg == "Booking #2: pickup must be text."
+
+
+def test_create_bookings_bulk_reads_feed_off_the_writer(temp_db):
+    readers = set()
+
+    def feed():
+        for i in range(3):
+            readers.add(threading.current_thread().name)
+            yield (1, "A", "B", "2025-01-01", f"{10 + i}:00")
+    assert booking.create_bookings_bulk(feed())[0]
+    assert readers == {threading.current_thread().name}
+
+
+def test_create_bookings_bulk_memory_does_not_grow_with_the_feed(temp_db):
+    def peak(n):
+        feed = ((1, "Airport", "Thamel", "2025-01-01", f"{i % 24:02d}:00") for i in range(n))
+        tracemalloc.start()
+        try:
+            assert booking.create_bookings_bulk(feed, chunk_size=50, on_created=lambda r: None)[0]
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    small, large = peak(500), peak(5000)
+    assert large < small * 1.5
+
+
+def test_create_bookings_bulk_rolls_back_when_the_feed_fails(temp_db):
+    def feed():
+        yield from [(1, "A", "B", "2025-01-01", "10:00")] * 5
+        raise OSError("feed broke")
+    with pytest.raises(OSError):
+        booking.create_bookings_bulk(feed(), chunk_size=2)
+    assert booking.list_bookings_by_customer(1) == []
+    assert booking.create_bookings_bulk([(1, "A", "B", "2025-01-01", "10:00")])[0]
+
+
+def test_auto_assign_ranks_off_the_writer_thread(temp_db):
+    _add_drivers(2)
+    ok, _, row = booking.create_booking(1, "A", "B", "2025-01-01", "10:00")
+    seen = []
+
+    def rank(conn, target):
+        seen.append(threading.current_thread().name)
+        return [3, 2]
+    assert booking.auto_assign_driver(row["id"], rank=rank) == (True, "Driver 3 assigned.", 3)
+    assert seen == [threading.current_thread().name]
+    assert booking.auto_assign_driver(row["id"], rank=rank)[1] == "Booking is already assigned."
+    assert len(seen) == 1
+
+
+def test_list_bookings_page_walks_keyset(temp_db):
+    items = [(1 + i % 3, "A", "B", f"2025-01-{1 + i % 5:02d}", f"{10 + i % 4:02d}:00") for i in range(50)]
+    booking.create_bookings_bulk(items)
+    booking.cancel_booking(7)
+
+    for order in ("id", "schedule"):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = booking.list_bookings_page(after=cursor, limit=8, order=order)
+            seen.extend(rows)
+            if cursor is None:
+                break
+        assert len(seen) == 50
+        key = (lambda r: r["id"]) if order == "id" else (lambda r: (r["date"], r["time"], r["id"]))
+        assert [key(r) for r in seen] == sorted(key(r) for r in seen)
+
+    rows, cursor = booking.list_bookings_page(customer_id=2, status="booked", limit=100)
+    assert cursor is None
+    assert {r["customer_id"] for r in rows} == {2} and len(rows) == 17
+    rows, _ = booking.list_bookings_page(status="cancelled")
+    assert [r["id"] for r in rows] == [7]
+
+
+def test_place_counts(temp_db):
+    booking.create_bookings_bulk([(1, "Thamel", "Airport", "2025-01-01", "10:00"),
+                                  (1, "Thamel", "New Road", "2025-01-01", "11:00"),
+                                  (2, "Airport", "Thamel", "2025-01-02", "09:00")])
+    assert booking.place_counts(1) == [("Thamel", 2), ("Airport", 1), ("New Road", 1)]
+    assert booking.place_counts(1, limit=1) == [("Thamel", 2)]
+    assert booking.place_counts(2) == [("Airport", 1), ("Thamel", 1)]
@@ -0,0 +1,73 @@
+import random
+
+from cluster import GridClusterer, cell_of, cluster_points
+
+
+def _points(n, seed=1):
+    rng = random.Random(seed)
+    return [(i, rng.uniform(27.65, 27.75), rng.uniform(85.25, 85.40), f"driver {i}") for i in range(n)]
+
+
+def _summary(markers):
+    clusters = sorted((m["id"], m["count"], round(m["lat"], 9), round(m["lon"], 9))
+                      for m in markers if m["type"] == "cluster")
+    singles = sorted(m["id"] for m in markers if m["type"] == "single")
+    return clusters, singles
+
+
+def test_cells_group_points_and_zoom_controls_merging():
+    pts = _points(500)
+    for zoom in (8, 13, 18):
+        markers = cluster_points(pts, zoom)
+        assert sum(m.get("count", 1) for m in markers) == len(pts)
+        cells = {}
+        for key, lat, lon, _ in pts:
+            cells.setdefault(cell_of(lat, lon, zoom), []).append((lat, lon))
+        for m in markers:
+            if m["type"] == "cluster":
+                _, _, cx, cy = m["id"].split(":")
+                members = cells[(int(cx), int(cy))]
+                assert m["count"] == len(members) >= 2
+                assert abs(m["lat"] - sum(p[0] for p in members) / len(members)) < 1e-9
+    assert len(cluster_points(pts, 5)) == 1                      # the whole valley in one cell
+    assert all(m["type"] == "single" for m in cluster_points(pts[:20], 19))
+    single = next(m for m in cluster_points(pts[:20], 19) if m["id"] == 3)
+    assert single["item"] == "driver 3" and single["lat"] == pts[3][1]
+
+
+def test_incremental_matches_one_shot():
+    pts = _points(2000, seed=2)
+    grid = GridClusterer()
+    grid.update(pts[:1000])
+    grid.clusters(14)                     # build zoom 14, then keep changing the points
+    grid.update(pts[1000:])
+    rng = random.Random(3)
+    moved = {}
+    for key in rng.sample(range(2000), 300):
+        moved[key] = (key, rng.uniform(27.65, 27.75), rng.uniform(85.25, 85.40), f"driver {key}")
+        grid.insert(*moved[key])
+    removed = set(rng.sample(range(2000), 200))
+    for key in removed:
+        grid.remove(key)
+    expected = [moved.get(p[0], p) for p in pts if p[0] not in removed]
+    assert len(grid) == len(expected)
+    for zoom in (14, 16):
+        assert _summary(grid.clusters(zoom)) == _summary(cluster_points(expected, zoom))
+
+
+def test_bounds_only_return_visible_cells():
+    pts = _points(3000, seed=4)
+    grid = GridClusterer()
+    grid.update(pts)
+    bounds = (27.69, 85.30, 27.71, 85.33)
+    visible = grid.clusters(15, bounds)
+    everything = grid.clusters(15)
+    assert 0 < len(visible) < len(everything)
+    assert _summary(visible)[0] == [c for c in _summary(everything)[0]
+                                    if c[0] in {m["id"] for m in visible}]
+    inside = {p[0] for p in pts if 27.69 <= p[1] <= 27.71 and 85.30 <= p[2] <= 85.33}
+    covered = {m["id"] for m in visible if m["type"] == "single"}
+    clustered = {key for key, lat, lon, _ in pts
+                 if f"cluster:15:{cell_of(lat, lon, 15)[0]}:{cell_of(lat, lon, 15)[1]}"
+                 in {m["id"] for m in visible}}
+    assert inside <= covered | clustered
@@ -0,0 +1,129 @@
+import sqlite3
+import threading
+
+import pytest
+
+import db
+
+
+def test_get_conn_reuses_connection_in_same_thread(temp_db):
+    conn = db.get_conn()
+    raw = conn._raw()
+    conn.close()
+    conn2 = db.get_conn()
+    assert conn2._raw() is raw
+    conn2.close()
+
+
+def test_closed_proxy_cannot_be_used(temp_db):
+    conn = db.get_conn()
+    conn.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.cursor()
+
+
+def test_release_rolls_back_uncommitted_work(temp_db):
+    with db.connection() as conn:
+        conn.execute("""INSERT INTO users (username,password,role,name)
+                        VALUES ('x','x','customer','X')""")
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+
+
+def test_pool_is_bounded_and_times_out(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / "p.db"), size=2, timeout=0.05)
+    a = pool.acquire()
+    b = pool.acquire()
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+    pool.release(a)
+    assert pool.acquire() is a
+    pool.release(a)
+    pool.release(b)
+    pool.close()
+
+
+def test_unhealthy_idle_connection_is_replaced(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / "p.db"), size=1, health_check_interval=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()  # simulate a broken connection sitting in the pool
+    fresh = pool.acquire()
+    assert fresh is not conn
+    assert pool.stats["discarded"] == 1
+    pool.release(fresh)
+    pool.close()
+
+
+def test_pool_shared_across_threads(temp_db):
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(50):
+                with db.connection() as conn:
+                    conn.execute("SELECT COUNT(*) FROM bookings").fetchone()
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert db.get_pool().stats["created"] <= db.POOL_SIZE
+
+
+def test_performance_profile_applied(temp_db):
+    with db.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+def test_write_commits_and_rolls_back(temp_db):
+    def insert(conn, username):
+        conn.execute("""INSERT INTO users (username,password,role,name)
+                        VALUES (?,'x','customer','X')""", (username,))
+
+    def insert_then_fail(conn):
+        insert(conn, "b")
+        raise ValueError("boom")
+
+    db.write(insert, "a")
+    with pytest.raises(ValueError):
+        db.write(insert_then_fail)
+    with db.connection() as conn:
+        names = [r[0] for r in conn.execute("SELECT username FROM users")]
+    assert names == ["a"]
+
+
+def test_concurrent_writers_and_readers_never_lock(temp_db):
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(40):
+                db.write(lambda conn: conn.execute(
+                    """INSERT INTO bookings (customer_id,pickup,dropoff,date,time,status)
+                       VALUES (?, 'A', 'B', '2025-01-01', '10:00', 'booked')""", (n,)))
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    def reader():
+        try:
+            for _ in range(100):
+                with db.connection() as conn:
+                    conn.execute("SELECT COUNT(*) FROM bookings").fetchone()
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    threads += [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0] == 8 * 40
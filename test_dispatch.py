@@ -0,0 +1,88 @@
+import itertools
+import random
+
+import pytest
+
+import booking
+import db
+import dispatch
+
+KM = 1 / 111.2  # degrees of latitude per km
+
+
+def _add_drivers(*positions):
+    def insert(conn):
+        return [conn.execute("""INSERT INTO users (username,password,role,name,address,lat,lon)
+                                VALUES (?, 'x', 'driver', ?, '', ?, ?) RETURNING id""",
+                             (f"drv{i}", f"Driver {i}", lat, lon)).fetchone()[0]
+                for i, (lat, lon) in enumerate(positions)]
+    return db.write(insert)
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_min_cost_assignment_is_optimal(monkeypatch, numpy):
+    if not numpy:
+        monkeypatch.setattr(dispatch, "np", None)
+    rng = random.Random(4)
+    for rows, cols in ((4, 4), (3, 6), (6, 3), (1, 5)):
+        costs = [[rng.uniform(0, 10) for _ in range(cols)] for _ in range(rows)]
+        pairs = dispatch.min_cost_assignment(costs)
+        assert len(pairs) == min(rows, cols)
+        assert len({r for r, _ in pairs}) == len({c for _, c in pairs}) == len(pairs)
+        if rows <= cols:
+            best = min(sum(costs[r][c] for r, c in enumerate(perm))
+                       for perm in itertools.permutations(range(cols), rows))
+        else:
+            best = min(sum(costs[r][c] for c, r in enumerate(perm))
+                       for perm in itertools.permutations(range(rows), cols))
+        assert sum(costs[r][c] for r, c in pairs) == pytest.approx(best)
+
+
+def test_auto_assign_prefers_near_and_less_loaded_drivers(temp_db):
+    far, near, nearer_but_busy = _add_drivers((27.70 + 7 * KM, 85.30), (27.70 + 1 * KM, 85.30),
+                                              (27.70 + 0.5 * KM, 85.30))
+    # the closest driver already holds two bookings that morning: 0.5 km + 2 x 2.0 load + 2 x 0.5 recent
+    for customer, t in ((9, "07:00"), (10, "08:00")):
+        b = booking.create_booking(customer, "X", "Y", "2025-01-01", t)[2]
+        assert booking.assign_driver(b["id"], nearer_but_busy)[0]
+    rank = dispatch.ranker(locate=lambda address: (27.70, 85.30))
+
+    b = booking.create_booking(1, "Thamel", "New Road", "2025-01-01", "10:00")[2]
+    assert booking.auto_assign_driver(b["id"], rank=rank)[2] == near
+    b = booking.create_booking(2, "Thamel", "New Road", "2025-01-01", "10:15")[2]
+    assert booking.auto_assign_driver(b["id"], rank=rank)[2] == nearer_but_busy
+    b = booking.create_booking(3, "Thamel", "New Road", "2025-01-01", "10:30")[2]
+    assert booking.auto_assign_driver(b["id"], rank=rank)[2] == far
+    b = booking.create_booking(4, "Thamel", "New Road", "2025-01-01", "10:30")[2]
+    assert booking.auto_assign_driver(b["id"], rank=rank) == (False, "No available drivers at that time.", None)
+
+
+def test_assign_pending_solves_the_batch_jointly(temp_db):
+    d0, d2, d_busy = _add_drivers((27.70, 85.30), (27.70 + 2 * KM, 85.30), (27.70 + 1 * KM, 85.30))
+    pickups = {"P1": (27.70 + 1.1 * KM, 85.30), "P2": (27.70 + 2.5 * KM, 85.30)}
+    busy = booking.create_booking(9, "Elsewhere", "Y", "2025-01-01", "09:30")[2]
+    assert booking.assign_driver(busy["id"], d_busy)[0]
+    ids = {p: booking.create_booking(1, p, "Airport", "2025-01-01", "10:00")[2]["id"] for p in pickups}
+
+    # one at a time, P1 would grab d2 (0.9 km) and leave P2 with d0 (2.5 km)
+    assigned = dispatch.assign_pending(geocoder=pickups.get)
+    assert {(b, d) for b, d, _ in assigned} == {(ids["P1"], d0), (ids["P2"], d2)}
+    assert sum(cost for _, _, cost in assigned) == pytest.approx(1.6, abs=0.01)
+    assert dispatch.assign_pending(geocoder=pickups.get) == []
+
+
+def test_assign_bookings_plans_from_rows_read_in_the_transaction(temp_db):
+    (driver,) = _add_drivers((27.70, 85.30))
+    busy = booking.create_booking(9, "Elsewhere", "Y", "2025-01-01", "12:00")[2]
+    assert booking.assign_driver(busy["id"], driver)[0]
+    moved = booking.create_booking(1, "P1", "Airport", "2025-01-01", "10:00")[2]
+    repointed = booking.create_booking(2, "P2", "Airport", "2025-01-01", "10:00")[2]
+    pending = dispatch.pending_bookings()
+    assert [b["id"] for b in pending] == [moved["id"], repointed["id"]]
+
+    # both change while their pickups are being geocoded
+    assert booking.update_booking(moved["id"], time="12:15")[0]
+    assert booking.update_booking(repointed["id"], pickup="P3")[0]
+    locate = {"P1": (27.70, 85.30), "P2": (27.70, 85.30), "P3": (27.70, 85.30)}.get
+    assert dispatch.assign_bookings(pending, geocoder=locate) == []
+    assert [b["id"] for b in dispatch.pending_bookings()] == [repointed["id"], moved["id"]]
@@ -0,0 +1,101 @@
+import time
+
+import booking
+import db
+from dispatcher import Dispatcher
+
+KM = 1 / 111.2  # degrees of latitude per km
+
+
+def _add_drivers(n):
+    def insert(conn):
+        return [conn.execute("""INSERT INTO users (username,password,role,name,address,lat,lon)
+                                VALUES (?, 'x', 'driver', ?, '', ?, 85.30) RETURNING id""",
+                             (f"drv{i}", f"Driver {i}", 27.70 + i * KM)).fetchone()[0]
+                for i in range(n)]
+    return db.write(insert)
+
+
+def _driver_of(booking_id):
+    with db.connection() as conn:
+        return conn.execute("SELECT driver_id FROM bookings WHERE id=?", (booking_id,)).fetchone()[0]
+
+
+def _dispatcher(**kw):
+    clock = booking.slot_start("2025-01-01", "09:00")
+    return Dispatcher(clock=lambda: clock, geocoder=lambda address: (27.70, 85.30), **kw)
+
+
+def test_run_once_pages_through_the_horizon_only(temp_db):
+    _add_drivers(5)
+    soon = [booking.create_booking(c, f"P{c}", "Airport", "2025-01-01", "10:00")[2]["id"] for c in range(1, 6)]
+    later = booking.create_booking(9, "P9", "Airport", "2025-01-01", "15:00")[2]["id"]
+    stale = booking.create_booking(8, "P8", "Airport", "2025-01-01", "08:30")[2]["id"]  # 30 min ago
+    seen = []
+    dispatcher = _dispatcher(batch_size=2, horizon_min=120, on_assigned=seen.extend)
+
+    assert dispatcher.run_once() == 5
+    assert dispatcher.stats["batches"] == 3 and dispatcher.stats["considered"] == 5
+    assert sorted(b for b, _, _ in seen) == soon
+    assert len({_driver_of(b) for b in soon}) == 5
+    assert _driver_of(later) is None and _driver_of(stale) is None
+    assert dispatcher.run_once() == 0
+
+
+def test_background_loop_wakes_and_stops(temp_db):
+    _add_drivers(1)
+    dispatcher = _dispatcher(interval_s=60).start()
+    try:
+        b = booking.create_booking(1, "Thamel", "Airport", "2025-01-01", "09:30")[2]["id"]
+        dispatcher.wake()
+        for _ in range(200):
+            if _driver_of(b) is not None:
+                break
+            time.sleep(0.01)
+        assert _driver_of(b) is not None
+    finally:
+        dispatcher.stop(timeout=5)
+    assert not dispatcher._thread.is_alive() and dispatcher.stats["errors"] == 0
+
+
+def test_background_loop_survives_callback_errors(temp_db):
+    _add_drivers(1)
+    calls = []
+
+    def broken(done):
+        calls.append(done)
+        raise RuntimeError("display gone")
+    dispatcher = _dispatcher(interval_s=60, on_assigned=broken).start()
+    try:
+        booking.create_booking(1, "Thamel", "Airport", "2025-01-01", "09:30")
+        dispatcher.wake()
+        for _ in range(200):
+            if dispatcher.stats["errors"]:
+                break
+            time.sleep(0.01)
+        assert dispatcher.stats["errors"] == 1 and isinstance(dispatcher.last_error, RuntimeError)
+        assert dispatcher._thread.is_alive() and calls
+    finally:
+        dispatcher.stop(timeout=5)
+
+
+def test_wake_during_a_pass_is_not_lost(temp_db):
+    dispatcher = _dispatcher(interval_s=60)
+    passes = []
+    run_once = dispatcher.run_once
+
+    def counted():
+        passes.append(time.perf_counter())
+        if len(passes) == 1:
+            dispatcher.wake()  # as if a booking was created while this pass ran
+        return run_once()
+    dispatcher.run_once = counted
+    dispatcher.start()
+    try:
+        for _ in range(200):
+            if len(passes) >= 2:
+                break
+            time.sleep(0.01)
+        assert len(passes) >= 2
+    finally:
+        dispatcher.stop(timeout=5)
@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+import time
+
+import db
+import fleet
+
+PLACES = {
+    "Thamel": (27.7154, 85.3123),
+    "Patan": (27.6727, 85.3253),
+    "Bhaktapur": (27.6710, 85.4298),
+    "Pokhara": (28.2096, 83.9856),
+}
+
+
+def _add_driver(username, address, lat=None, lon=None):
+    return db.write(lambda conn: conn.execute(
+        """INSERT INTO users (username,password,role,name,address,lat,lon)
+           VALUES (?, 'x', 'driver', ?, ?, ?, ?) RETURNING id""",
+        (username, username.title(), address, lat, lon)).fetchone()[0])
+
+
+def test_init_db_migrates_old_users_table(tmp_path, monkeypatch):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL, role TEXT NOT NULL, name TEXT NOT NULL,
+                    address TEXT, phone TEXT, email TEXT)""")
+    conn.execute("INSERT INTO users (username,password,role,name,address) VALUES ('d','x','driver','D','Thamel')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.init_db()
+    db.init_db()  # idempotent
+    try:
+        assert [tuple(r) for r in fleet.load_drivers()] == [(1, "D", "d", "Thamel", None, None)]
+    finally:
+        db.close_pools()
+
+
+def test_backfill_geocodes_once_and_nearby_is_db_only(temp_db):
+    calls = []
+
+    def geocoder(addr):
+        calls.append(addr)
+        return PLACES.get(addr)
+
+    _add_driver("ram", "Thamel")
+    _add_driver("sita", "Patan")
+    _add_driver("hari", "Pokhara")
+    _add_driver("gita", "Unknown street")
+    _add_driver("shyam", "Bhaktapur", *PLACES["Bhaktapur"])  # already located
+
+    published = []
+    assert fleet.backfill_driver_coords(geocoder, on_located=published.append) == 3
+    assert sorted(p[1] for p in published) == ["Hari", "Ram", "Sita"]  # in completion order
+    assert len(calls) == 4
+    assert fleet.backfill_driver_coords(geocoder) == 0  # only the unknown address is retried
+    assert len(calls) == 5
+
+    near = fleet.drivers_near(27.7172, 85.3240, 6.0)
+    assert [e[1] for _, e in near] == ["Ram", "Sita"]
+    assert len(fleet.located_drivers()) == 4
+
+
+def test_backfill_runs_in_parallel_and_publishes_incrementally(temp_db):
+    lock = threading.Lock()
+    state = {"in_flight": 0, "peak": 0}
+    calls = []
+
+    def slow_geocoder(addr):
+        with lock:
+            calls.append(addr)
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+        time.sleep(0.02)
+        with lock:
+            state["in_flight"] -= 1
+        return (27.70 + len(calls) / 1000, 85.30)
+
+    for i in range(12):
+        _add_driver(f"drv{i}", f"Ward {i % 6}")  # two drivers per address
+
+    published, progress = [], []
+    located = fleet.backfill_driver_coords(slow_geocoder, on_located=published.append,
+                                           on_progress=lambda done, total: progress.append((done, total)),
+                                           workers=3)
+    assert located == 12 and len(published) == 12
+    assert len(calls) == 6  # each address once
+    assert 1 < state["peak"] <= 3
+    assert sorted(progress) == [(n, 6) for n in range(1, 7)]
+    assert len(fleet.located_drivers()) == 12
@@ -0,0 +1,92 @@
+import pytest
+
+from gazetteer import Gazetteer, fold
+
+SEED = """name,aliases,district,lat,lon,kind,rank
+Kathmandu,KTM City,Kathmandu,27.7172,85.3240,city,9
+Thamel,,Kathmandu,27.7154,85.3123,area,7
+Patan Durbar Square,Mangal Bazaar,Lalitpur,27.6727,85.3253,landmark,7
+Kathmandu Durbar Square,Basantapur,Kathmandu,27.7043,85.3070,landmark,7
+Bhaktapur,Bhadgaon|Khwopa,Bhaktapur,27.6710,85.4298,city,8
+Bharatpur,,Chitwan,27.6833,84.4333,city,7
+Pokhara,,Kaski,28.2096,83.9856,city,9
+"""
+
+
+@pytest.fixture
+def seed(tmp_path):
+    path = tmp_path / "places.csv"
+    path.write_text(SEED, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def gaz(tmp_path, seed):
+    g = Gazetteer(str(tmp_path / "gaz.db"), str(seed))
+    yield g
+    g.close()
+
+
+def names(results):
+    return [r["display_name"] for r in results]
+
+
+def test_fold():
+    assert fold("  Swayambhunath (Monkey Temple),  KATHMANDU ") == "swayambhunath monkey temple kathmandu"
+    assert fold("Bouddhā") == "bouddha"
+
+
+def test_prefix_word_and_fuzzy_search(gaz):
+    assert len(gaz) == 7
+    assert names(gaz.search("tham")) == ["Thamel, Kathmandu, Nepal"]
+    # matches later in a name count too; equal scores go to the shorter name
+    assert names(gaz.search("durbar")) == ["Patan Durbar Square, Lalitpur, Nepal",
+                                           "Kathmandu Durbar Square, Kathmandu, Nepal"]
+    # an exact name beats a label prefix, which beats a later-word match
+    assert names(gaz.search("kathmandu")) == ["Kathmandu, Nepal", "Kathmandu Durbar Square, Kathmandu, Nepal"]
+    assert names(gaz.search("khwopa")) == ["Bhaktapur, Nepal"]  # alias
+    assert names(gaz.search("bhaktpur"))[0] == "Bhaktapur, Nepal"  # typo
+    assert gaz.search("bhaktpur", fuzzy=False) == []
+    assert gaz.search("zzzz") == [] and gaz.search("  ") == []
+    hit = gaz.search("pokhara")[0]
+    assert (hit["lat"], hit["lon"]) == (28.2096, 83.9856)
+
+
+def test_lookup_exact_names_only(gaz):
+    assert gaz.lookup("THAMEL") == (27.7154, 85.3123)
+    assert gaz.lookup("Thamel, Kathmandu, Nepal") == (27.7154, 85.3123)
+    assert gaz.lookup("Patan Durbar Square, Lalitpur, Nepal") == (27.6727, 85.3253)
+    assert gaz.lookup("Thamel Chowk") is None
+    assert gaz.lookup("Ward 5, Thamel") is None  # first part isn't a known place
+    assert gaz.guess("Ward 5, Thamel") is None
+    assert gaz.guess("Thamel Marg, Kathmandu") is None
+    assert gaz.guess("Pokhara Lakeside, Kaski") is None
+    assert gaz.guess("Pokh, Nepal") == (28.2096, 83.9856)
+    assert gaz.stats["lookup_hits"] == 3
+
+
+def test_learned_places_persist_and_survive_reseed(tmp_path, seed):
+    path = str(tmp_path / "gaz.db")
+    g = Gazetteer(path, str(seed))
+    assert g.learn("Hotel Annapurna", 27.7110, 85.3180, "Hotel Annapurna, Durbar Marg, Kathmandu, Nepal")
+    assert not g.learn("Thamel", 1.0, 1.0)
+    assert names(g.search("hotel ann")) == ["Hotel Annapurna, Durbar Marg, Kathmandu, Nepal"]
+    assert len(g.names()) == 8 and g.names()[-1] == "Hotel Annapurna"
+    g.close()
+
+    seed.write_text(SEED + "Lumbini,,Rupandehi,27.4840,83.2760,landmark,6\n", encoding="utf-8")
+    g = Gazetteer(path, str(seed))
+    assert len(g) == 9
+    assert g.lookup("Hotel Annapurna, Durbar Marg, Kathmandu, Nepal") == (27.7110, 85.3180)
+    assert g.lookup("Lumbini") == (27.4840, 83.2760)
+    g.close()
+
+
+def test_bundled_seed_covers_popular_places(tmp_path):
+    g = Gazetteer(str(tmp_path / "gaz.db"))
+    for place in ("Thamel", "Patan Durbar Square", "Swayambhunath (Monkey Temple)", "Pashupatinath Temple",
+                  "Boudhanath Stupa", "Tribhuvan International Airport (KTM)", "New Road", "Lazimpat",
+                  "Bhatbhateni Supermarket", "Durbar Marg"):
+        lat, lon = g.lookup(place)
+        assert 26.0 <= lat <= 30.5 and 80.0 <= lon <= 88.3
+    g.close()
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from httpclient import HttpClient, HttpError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def client(clock):
+    c = HttpClient("test-agent/1.0", timeout=2.0, retries=2, backoff=0.5,
+                   sleep=clock.sleep, clock=clock)
+    yield c
+    c.close()
+
+
+def test_connections_are_reused(stand_in, client):
+    stand_in.route("/search", lambda q: [{"q": q["q"]}])
+    for i in range(5):
+        assert client.get_json(stand_in.url + "/search", {"q": f"place {i}"}) == [{"q": f"place {i}"}]
+    assert stand_in.connections == 1
+    assert client.stats["connections_opened"] == 1 and client.stats["connections_reused"] == 4
+    assert client.reuse_rate() == pytest.approx(0.8)
+    path, query, _, headers = stand_in.requests[0]
+    assert query == {"q": "place 0"} and headers["User-Agent"] == "test-agent/1.0"
+
+
+def test_retries_with_backoff_then_succeeds(stand_in, client, clock):
+    answers = iter([(503, {}), (429, {}, {"Retry-After": "3"}), {"ok": True}])
+    stand_in.route("/route", lambda q: next(answers))
+    assert client.get_json(stand_in.url + "/route") == {"ok": True}
+    assert clock.sleeps == [0.5, 3.0]  # exponential backoff, Retry-After honoured
+    assert client.stats["retries"] == 2 and client.stats["failures"] == 0
+
+
+def test_gives_up_after_retries_and_on_client_errors(stand_in, client, clock):
+    stand_in.route("/down", lambda q: (503, {}))
+    stand_in.route("/missing", lambda q: (404, {"error": "nope"}))
+    with pytest.raises(HttpError) as exc:
+        client.get_json(stand_in.url + "/down")
+    assert exc.value.status == 503 and len(stand_in.requests) == 3
+    with pytest.raises(HttpError) as exc:
+        client.get_json(stand_in.url + "/missing")
+    assert exc.value.status == 404 and len(stand_in.requests) == 4  # 4xx is not retried
+    assert client.stats["failures"] == 2
+
+
+def test_unreachable_host_raises_after_retries(stand_in, client, clock):
+    url = stand_in.url
+    stand_in.close()
+    with pytest.raises(OSError):
+        client.get_json(url + "/search", retries=1)
+    assert clock.sleeps == [0.5]
+
+
+def test_stale_keep_alive_connection_is_replaced(stand_in, client, clock):
+    stand_in.route("/", lambda q: {"ok": True})
+    stand_in.drop.add("/bye")
+    client.get_json(stand_in.url + "/bye")
+    assert client.get_json(stand_in.url + "/again") == {"ok": True}
+    assert client.stats["stale_reconnects"] == 1
+    assert client.stats["retries"] == 0 and clock.sleeps == []
+
+
+def test_min_interval_spaces_requests_per_host(stand_in, clock):
+    client = HttpClient("t", min_interval={"127.0.0.1": 1.0}, sleep=clock.sleep, clock=clock)
+    stand_in.route("/", lambda q: {})
+    for _ in range(3):
+        client.get_json(stand_in.url + "/search")
+    assert clock.sleeps == [1.0, 1.0]
+    assert client.stats["throttled"] == 2
+    clock.now += 5
+    client.get_json(stand_in.url + "/search")
+    assert clock.sleeps == [1.0, 1.0]
+    client.close()
+
+
+def test_background_requests_yield_throttle_slots():
+    client = HttpClient("t", min_interval={"h": 0.1})
+    order = []
+
+    def preload(n):
+        with client.background():
+            for _ in range(3):
+                client._throttle("h")
+                order.append(("preload", n))
+
+    workers = [threading.Thread(target=preload, args=(n,)) for n in range(4)]
+    for t in workers:
+        t.start()
+    time.sleep(0.15)
+    start = time.monotonic()
+    client._throttle("h")  # the UI's lookup
+    waited = time.monotonic() - start
+    order.append(("ui", 0))
+    for t in workers:
+        t.join()
+    # booked behind the queued preloads it would have waited about a second
+    assert waited < 0.15
+    assert order.index(("ui", 0)) <= 3
@@ -0,0 +1,23 @@
+import pytest
+
+import loadgen
+
+
+@pytest.mark.parametrize("http", [False, True])
+def test_workload_covers_the_lifecycle(temp_db, http):
+    result = loadgen.run(customers=10, drivers=3, lifecycles=60, concurrency=4, http=http)
+    ops, outcomes = result["operations"], result["outcomes"]
+    assert ops["create"]["count"] == ops["assign"]["count"] == 60
+    assert ops["complete"]["count"] + ops["cancel"]["count"] == 60
+    assert sum(outcomes.values()) == 60 and "failed" not in outcomes
+    assert sum(result["bookings"].values()) == 60 and set(result["bookings"]) <= {"completed", "cancelled"}
+    assert 0 < ops["assign"]["p50_ms"] <= ops["assign"]["p95_ms"] <= ops["assign"]["p99_ms"]
+    assert result["db_bytes"] > 0
+    assert loadgen.check(result) == []
+    assert loadgen.check(result, max_p95_ms=0.0)
+    assert "p99" in loadgen.format_report(result) and "cost policy" in loadgen.format_report(result)
+
+
+def test_http_mode_only_ranks_by_cost(temp_db):
+    with pytest.raises(ValueError):
+        loadgen.run(customers=1, drivers=1, lifecycles=1, concurrency=1, http=True, policy="first")
@@ -0,0 +1,309 @@
+import random
+import threading
+import time
+
+import pytest
+
+import map as geo
+from cache import MISS, PersistentCache, SingleFlight
+from gazetteer import Gazetteer
+from httpclient import HttpClient
+
+
+@pytest.fixture(params=["numpy", "pure-python"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        if geo.np is None:
+            pytest.skip("NumPy not installed")
+    else:
+        monkeypatch.setattr(geo, "np", None)
+    return request.param
+
+
+def test_haversine_many_matches_scalar(backend):
+    rng = random.Random(5)
+    lats = [rng.uniform(26.5, 30.3) for _ in range(500)]
+    lons = [rng.uniform(80.2, 88.1) for _ in range(500)]
+    got = list(geo.haversine_many(27.7172, 85.3240, lats, lons))
+    for d, lat, lon in zip(got, lats, lons):
+        assert d == pytest.approx(geo.haversine(27.7172, 85.3240, lat, lon), rel=1e-9, abs=1e-9)
+    assert list(geo.haversine_many(27.7, 85.3, [], [])) == []
+
+
+def test_distance_matrix_shape_and_values(backend):
+    a = [(27.7172, 85.3240), (28.2096, 83.9856)]
+    b = [(27.6710, 85.4298), (26.4525, 87.2718), (27.7172, 85.3240)]
+    m = geo.distance_matrix([p[0] for p in a], [p[1] for p in a], [p[0] for p in b], [p[1] for p in b])
+    assert len(m) == 2 and all(len(row) == 3 for row in m)
+    for i, (alat, alon) in enumerate(a):
+        for j, (blat, blon) in enumerate(b):
+            assert m[i][j] == pytest.approx(geo.haversine(alat, alon, blat, blon), abs=1e-6)
+    assert m[0][2] == pytest.approx(0.0, abs=1e-9)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_persistent_cache_ttl_lru_and_restart(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "c.db")
+    c = PersistentCache(path, "t", ttl=100, negative_ttl=10, max_memory=2, clock=clock)
+    c.set("a", [1.0, 2.0])
+    c.set("b", None)
+    c.set("c", "x")  # evicts "a" from memory, still on disk
+    assert c.stats["evictions"] == 1
+    assert c.get("a") == [1.0, 2.0] and c.stats["disk_hits"] == 1
+    assert c.get("a") == [1.0, 2.0] and c.stats["memory_hits"] == 1
+    assert c.get("b") is None  # negative result is a hit
+    clock.now += 11
+    assert c.get("b") is MISS  # negative entries expire sooner
+    assert c.get("missing") is MISS
+    c.close()
+
+    warm = PersistentCache(path, "t", ttl=100, negative_ttl=10, clock=clock)
+    assert warm.get("a") == [1.0, 2.0]
+    clock.now += 100
+    assert warm.get("a") is MISS and warm.stats["expired"] == 1
+    assert warm.purge_expired() == 3
+    warm.close()
+
+
+@pytest.fixture
+def gazetteer(tmp_path, monkeypatch):
+    seed = tmp_path / "places.csv"
+    seed.write_text("name,aliases,district,lat,lon,kind,rank\n"
+                    "Boudhanath Stupa,Boudha,Kathmandu,27.7215,85.3620,landmark,7\n", encoding="utf-8")
+    g = Gazetteer(str(tmp_path / "gaz.db"), str(seed))
+    monkeypatch.setattr(geo, "GAZETTEER", g)
+    yield g
+    g.close()
+
+
+@pytest.fixture
+def geocode_cache(tmp_path, monkeypatch, gazetteer):
+    cache = PersistentCache(str(tmp_path / "geo.db"), "geocode", 100, 10)
+    monkeypatch.setattr(geo, "GEOCODE_CACHE", cache)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def services(stand_in, monkeypatch):
+    """Point map.py's Nominatim/OSRM/ip-api URLs at the local stand-in server."""
+    monkeypatch.setattr(geo, "NOMINATIM_URL", stand_in.url + "/search")
+    monkeypatch.setattr(geo, "OSRM_URL", stand_in.url + "/route/v1/driving")
+    monkeypatch.setattr(geo, "IP_API_URL", stand_in.url + "/json")
+    client = HttpClient("test", retries=0)
+    monkeypatch.setattr(geo, "HTTP", client)
+    yield stand_in
+    client.close()
+
+
+def test_geocode_uses_normalized_cache_and_negative_results(geocode_cache, services):
+    services.route("/search", lambda q: [] if "Nowhere" in q["q"] else [{"lat": "27.7154", "lon": "85.3123"}])
+    assert geo.geocode("Thamel, Kathmandu") == (27.7154, 85.3123)
+    assert geo.geocode("  thamel ,  KATHMANDU ") == (27.7154, 85.3123)
+    assert geo.geocode("Nowhere") is None
+    assert geo.geocode("nowhere") is None
+    assert len(services.requests) == 2
+    assert geocode_cache.stats["memory_hits"] == 2
+
+
+def test_geocode_learns_place_names_not_typed_addresses(geocode_cache, services):
+    services.route("/search", lambda q: [{"display_name": "Lazimpat Marg, Kathmandu, Nepal",
+                                          "lat": "27.7223", "lon": "85.3195"}])
+    assert geo.geocode("House 12, Lazimpat Marg") == (27.7223, 85.3195)
+    assert geo.GAZETTEER.search("House 12", fuzzy=False) == []
+    assert geo.GAZETTEER.lookup("Lazimpat Marg") == (27.7223, 85.3195)
+
+
+def test_gazetteer_answers_first_and_learns(geocode_cache, gazetteer, services):
+    def search(q):
+        if q.get("limit") == "1":
+            return [{"display_name": "Bhaktapur, Bagmati Province, Nepal", "lat": "27.6710", "lon": "85.4298"}]
+        return [{"display_name": "Bouddha Gate, Kathmandu, Nepal", "lat": "27.7200", "lon": "85.3600"},
+                {"display_name": "Boudha, Paris, France", "lat": "48.85", "lon": "2.35"}]
+
+    services.route("/search", search)
+    assert geo.geocode("Boudhanath Stupa, Kathmandu, Nepal") == (27.7215, 85.3620)
+    assert geo.nominatim_search("boudha", limit=1) == [
+        {"display_name": "Boudhanath Stupa, Kathmandu, Nepal", "lat": 27.7215, "lon": 85.3620}]
+    assert services.requests == []
+
+    results = geo.nominatim_search("boudha", limit=3)
+    assert [r["display_name"] for r in results] == ["Boudhanath Stupa, Kathmandu, Nepal",
+                                                    "Bouddha Gate, Kathmandu, Nepal"]
+    assert geo.geocode("Bhaktapur") == (27.6710, 85.4298)
+    assert len(services.requests) == 2 and services.connections == 1
+    # both network answers are now local
+    assert gazetteer.lookup("Bouddha Gate, Kathmandu, Nepal") == (27.72, 85.36)
+    assert gazetteer.lookup("bhaktapur") == (27.6710, 85.4298)
+
+
+def test_offline_falls_back_to_gazetteer(geocode_cache, gazetteer, services):
+    services.close()
+    assert geo.geocode("Boudhanath, Kathmandu") == (27.7215, 85.3620)
+    assert geo.geocode("Somewhere Else") is None
+    assert [r["display_name"] for r in geo.nominatim_search("boud")] == ["Boudhanath Stupa, Kathmandu, Nepal"]
+    assert geo.nominatim_search("nowhere") == []
+    assert geo.ip_location() is None
+
+
+def test_ip_location(services):
+    services.route("/json", lambda q: {"status": "success", "lat": 27.7, "lon": 85.3})
+    assert geo.ip_location() == (27.7, 85.3)
+    services.route("/json", lambda q: {"status": "fail"})
+    assert geo.ip_location() is None
+
+
+def test_single_flight_shares_result_and_errors():
+    flights = SingleFlight()
+    gate = threading.Event()
+    calls = []
+
+    def slow(x):
+        calls.append(x)
+        gate.wait(5)
+        if x == "bad":
+            raise ValueError(x)
+        return x * 2
+
+    results, errors = [], []
+
+    def call(x):
+        try:
+            results.append(flights.do(x, slow, x))
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call, args=(x,)) for x in ["ab"] * 5 + ["bad"] * 3]
+    for t in threads:
+        t.start()
+    while flights.stats["calls"] < 8:
+        time.sleep(0.001)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert sorted(calls) == ["ab", "bad"]
+    assert results == ["abab"] * 5 and errors == ["bad"] * 3
+    assert flights.stats == {"calls": 8, "shared": 6}
+    assert flights.do("ab", slow, "ab") == "abab" and len(calls) == 3  # nothing kept afterwards
+
+
+def test_concurrent_geocodes_coalesce(geocode_cache, services, monkeypatch):
+    monkeypatch.setattr(geo, "GEOCODE_FLIGHTS", SingleFlight())
+
+    def search(q):
+        time.sleep(0.05)
+        n = int(q["q"].split()[-1])
+        return [{"lat": str(27.0 + n / 100), "lon": "85.3"}]
+
+    services.route("/search", search)
+    addresses = [f"Customer street {i % 4}" for i in range(24)]
+    barrier = threading.Barrier(len(addresses))
+    results = {}
+
+    def lookup(i, addr):
+        barrier.wait()
+        results[i] = geo.geocode(addr)
+
+    threads = [threading.Thread(target=lookup, args=(i, a)) for i, a in enumerate(addresses)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(services.requests) == 4  # one per distinct address, not one per caller
+    assert all(results[i] == (27.0 + (i % 4) / 100, 85.3) for i in range(24))
+    assert geo.GEOCODE_FLIGHTS.stats["calls"] == 24
+
+
+def test_geocode_many_answers_known_addresses_first(geocode_cache, gazetteer, services):
+    services.route("/search", lambda q: [] if "Nowhere" in q["q"] else [{"lat": "27.6", "lon": "85.4"}])
+    geocode_cache.set("sanepa, lalitpur", [27.684, 85.306])
+    order, progress = [], []
+    results = geo.geocode_many(
+        ["New place 1", "Boudha", "Sanepa, Lalitpur", "new place 1 ", "Nowhere", ""],
+        on_result=lambda addr, coords: order.append(addr),
+        on_progress=lambda done, total: progress.append((done, total)))
+    assert results == {"New place 1": (27.6, 85.4), "new place 1 ": (27.6, 85.4), "Boudha": (27.7215, 85.362),
+                       "Sanepa, Lalitpur": (27.684, 85.306), "Nowhere": None, "": None}
+    # local answers are published before any network result
+    assert set(order[:3]) == {"Boudha", "Sanepa, Lalitpur", ""}
+    assert len(services.requests) == 2
+    assert progress[-1] == (6, 6) and len(progress) == 5
+
+
+def test_polyline_round_trip():
+    pts = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert geo.encode_polyline(pts) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert geo.decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@") == pts
+    route = [(27.7172 + i * 1e-4, 85.3240 - i * 3e-5) for i in range(300)]
+    back = geo.decode_polyline(geo.encode_polyline(route, 6), 6)
+    assert all(abs(a - c) < 1e-6 and abs(b - d) < 1e-6 for (a, b), (c, d) in zip(route, back))
+
+
+def test_route_cache_snaps_endpoints(tmp_path, monkeypatch, services):
+    cache = PersistentCache(str(tmp_path / "r.db"), "routes", 100, 10)
+    monkeypatch.setattr(geo, "ROUTE_CACHE", cache)
+    coords = [[85.3240 + i * 1e-3, 27.7172 + i * 1e-3] for i in range(50)]
+    services.route("/route/v1/driving/", lambda q: {"routes": [{"geometry": {"coordinates": coords}}]})
+    first = geo.get_route_coords(27.71720, 85.32400, 27.6727, 85.3253)
+    again = geo.get_route_coords(27.71721, 85.32401, 27.6727, 85.3253)  # within the snap cell
+    assert len(services.requests) == 1
+    assert services.requests[0][1] == {"overview": "full", "geometries": "geojson"}
+    assert len(again) == 50
+    assert all(abs(a - c) < 1e-6 and abs(b - d) < 1e-6 for (a, b), (c, d) in zip(first, again))
+    geo.get_route_coords(27.7300, 85.3240, 27.6727, 85.3253)
+    assert len(services.requests) == 2
+
+    services.route("/route/v1/driving/", lambda q: {"routes": [{"geometry": {"coordinates": []}}]})
+    assert geo.get_route_coords(28.2, 83.98, 28.21, 83.99) is None
+    assert geo.get_route_coords(28.2, 83.98, 28.21, 83.99) is None  # from the cache
+    assert len(services.requests) == 3
+    cache.close()
+
+
+def _zigzag(n=2000):
+    # a straight road north with 1 m wiggles and one 500 m detour in the middle
+    path = []
+    for i in range(n):
+        lat = 27.70 + i * 1e-5
+        lon = 85.30 + (1e-5 if i % 2 else 0.0)
+        if n // 2 - 50 < i < n // 2 + 50:
+            lon += 0.005
+        path.append((lat, lon))
+    return path
+
+
+def test_simplify_path_keeps_shape(backend):
+    path = _zigzag()
+    simplified = geo.simplify_path(path, tolerance_m=5.0)
+    assert simplified[0] == path[0] and simplified[-1] == path[-1]
+    assert len(simplified) < 20
+    # the detour survives, the 1 m wiggles don't
+    assert max(p[1] for p in simplified) > 85.304
+    assert geo.simplify_path(path, tolerance_m=0.01) == path
+    assert geo.simplify_path(path[:2], 100.0) == path[:2]
+
+
+def test_simplify_path_backends_agree(monkeypatch):
+    if geo.np is None:
+        pytest.skip("NumPy not installed")
+    rng = random.Random(3)
+    path = [(27.7 + rng.uniform(0, 0.05), 85.3 + rng.uniform(0, 0.05)) for _ in range(300)]
+    fast = geo.simplify_path(path, 50.0)
+    monkeypatch.setattr(geo, "np", None)
+    assert geo.simplify_path(path, 50.0) == fast
+
+
+def test_zoom_simplified_path_levels():
+    route = geo.ZoomSimplifiedPath(_zigzag(), tolerance_px=1.0)
+    coarse, fine = route.at(10), route.at(19)
+    assert len(coarse) < len(fine)
+    assert route.at(9.2) is route.at(10)  # fractional zoom rounds up to the finer level
+    assert geo.ZoomSimplifiedPath([]).at(12) == []
@@ -0,0 +1,65 @@
+from markers import MarkerManager, tile_to_latlon
+
+
+class FakeMarker:
+    def __init__(self, canvas, lat, lon, text):
+        self.canvas, self.position, self.text = canvas, (lat, lon), text
+
+    def set_position(self, lat, lon):
+        self.canvas.append(("move", self.text))
+        self.position = (lat, lon)
+
+    def set_text(self, text):
+        self.canvas.append(("text", text))
+        self.text = text
+
+    def delete(self):
+        self.canvas.append(("delete", self.text))
+
+
+def _manager():
+    canvas = []
+
+    def set_marker(lat, lon, text=None):
+        canvas.append(("create", text))
+        return FakeMarker(canvas, lat, lon, text)
+    return MarkerManager(set_marker), canvas
+
+
+def test_update_only_touches_changed_markers():
+    manager, canvas = _manager()
+    first = [{"id": f"driver:{i}", "lat": 27.70 + i * 0.001, "lon": 85.30, "text": f"Driver {i}"}
+             for i in range(5)]
+    assert manager.update(first)["created"] == 5
+    canvas.clear()
+
+    second = [dict(m) for m in first[1:]]                       # driver 0 went away
+    second[0]["lat"] += 0.0005                                  # driver 1 moved
+    second[1]["text"] = "Driver 2 (0.4 km)"                     # driver 2 relabelled
+    second.append({"id": "cluster:13:1:1", "lat": 27.8, "lon": 85.4, "text": "3 drivers"})
+    done = manager.update(second)
+    assert (done["created"], done["moved"], done["relabelled"], done["deleted"], done["kept"]) == (1, 1, 1, 1, 2)
+    assert sorted(canvas) == sorted([("delete", "Driver 0"), ("move", "Driver 1"),
+                                     ("text", "Driver 2 (0.4 km)"), ("create", "3 drivers")])
+    canvas.clear()
+    assert manager.update(second)["kept"] == 5 and canvas == []
+
+
+def test_markers_outside_bounds_are_culled_and_return():
+    manager, canvas = _manager()
+    markers = [{"id": "near", "lat": 27.70, "lon": 85.30, "text": "near"},
+               {"id": "far", "lat": 28.20, "lon": 83.98, "text": "far"}]
+    manager.update(markers, bounds=(27.6, 85.2, 27.8, 85.4))
+    assert "near" in manager and "far" not in manager and canvas == [("create", "near")]
+
+    done = manager.refresh(bounds=(28.1, 83.9, 28.3, 84.1))     # panned to Pokhara
+    assert (done["created"], done["culled"]) == (1, 1)
+    assert "far" in manager and "near" not in manager
+    manager.clear()
+    assert len(manager) == 0
+
+
+def test_tile_to_latlon():
+    assert tile_to_latlon(0, 0, 0)[1] == -180.0
+    lat, lon = tile_to_latlon(0.5, 0.5, 0)
+    assert abs(lat) < 1e-9 and abs(lon) < 1e-9
@@ -0,0 +1,176 @@
+import http.client
+import json
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import auth
+import booking
+from service import BookingService
+
+
+@pytest.fixture
+def service(temp_db):
+    auth.seed_defaults()
+    svc = BookingService(port=0).start()
+    yield svc
+    svc.close()
+
+
+class Client:
+    def __init__(self, service):
+        host, port = service.server.server_address[:2]
+        self.conn = http.client.HTTPConnection(host, port, timeout=5)
+        self.token = None
+
+    def call(self, method, path, body=None):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        self.conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        resp = self.conn.getresponse()
+        return resp.status, json.loads(resp.read())
+
+    def login(self, username, password):
+        status, doc = self.call("POST", "/login", {"username": username, "password": password})
+        assert status == 200, doc
+        self.token = doc["data"]["token"]
+        return doc["data"]["user"]
+
+
+def _customer(service, name):
+    client = Client(service)
+    status, doc = client.call("POST", "/register", {"name": name, "address": "Thamel", "phone": "98",
+                                                    "email": f"{name}@example.com",
+                                                    "username": name, "password": "pw"})
+    assert status == 201 and doc["ok"]
+    return client, client.login(name, "pw")
+
+
+def test_customer_books_and_sees_only_own_bookings(service):
+    alice, alice_user = _customer(service, "alice")
+    bob, _ = _customer(service, "bob")
+    assert "password" not in alice_user
+
+    status, doc = alice.call("POST", "/bookings", {"pickup": "Thamel", "dropoff": "Airport",
+                                                   "date": "2025-01-01", "time": "10:00"})
+    assert status == 201 and doc["data"]["customer_id"] == alice_user["id"]
+    booking_id = doc["data"]["id"]
+    bob.call("POST", "/bookings", {"pickup": "Patan", "dropoff": "Airport", "date": "2025-01-01", "time": "11:00"})
+
+    status, doc = alice.call("GET", "/bookings")
+    assert status == 200 and [b["id"] for b in doc["data"]["bookings"]] == [booking_id]
+    assert bob.call("GET", f"/bookings/{booking_id}")[0] == 404
+    assert bob.call("POST", f"/bookings/{booking_id}/cancel")[0] == 404
+
+    status, doc = alice.call("PATCH", f"/bookings/{booking_id}", {"time": "25:00"})
+    assert status == 409 and not doc["ok"] and "HH:MM" in doc["message"]
+    status, doc = alice.call("POST", f"/bookings/{booking_id}/cancel")
+    assert status == 200 and doc["data"]["status"] == "cancelled"
+    assert alice.call("POST", f"/bookings/{booking_id}/cancel")[0] == 409
+
+
+def test_errors_are_structured(service):
+    client = Client(service)
+    assert client.call("GET", "/bookings") == (401, {"ok": False, "message": "Log in first.", "data": None})
+    assert client.call("POST", "/login", {"username": "admin", "password": "nope"})[0] == 401
+    assert client.call("POST", "/login", {"username": "admin"})[0] == 400
+    assert client.call("GET", "/nowhere")[0] == 404
+    assert client.call("DELETE", "/health")[0] == 405
+    assert client.call("PATCH", "/health")[0] == 405
+    client.conn.request("POST", "/login", "not json", {"Content-Length": "8"})
+    assert client.conn.getresponse().status == 400
+
+
+def test_admin_assigns_and_driver_completes(service):
+    customer, _ = _customer(service, "carol")
+    booking_id = customer.call("POST", "/bookings", {"pickup": "Thamel", "dropoff": "Airport",
+                                                     "date": "2025-01-01", "time": "10:00"})[1]["data"]["id"]
+    driver = Client(service)
+    driver_user = driver.login("driver1", "driver123")
+    assert driver.call("POST", "/bookings", {"pickup": "A", "dropoff": "B", "date": "2025-01-01",
+                                             "time": "10:00"})[0] == 403
+    assert driver.call("POST", f"/bookings/{booking_id}/complete")[0] == 404  # not theirs yet
+
+    admin = Client(service)
+    admin.login("admin", "admin123")
+    status, doc = admin.call("GET", "/drivers/available?date=2025-01-01&time=10:00")
+    assert status == 200 and [d["id"] for d in doc["data"]] == [driver_user["id"]]
+    status, doc = admin.call("POST", f"/bookings/{booking_id}/assign", {"driver_id": driver_user["id"]})
+    assert status == 200 and doc["data"]["driver_id"] == driver_user["id"]
+    assert admin.call("GET", "/drivers/available?date=2025-01-01&time=10:30")[1]["data"] == []
+
+    status, doc = driver.call("POST", f"/bookings/{booking_id}/complete")
+    assert status == 200 and doc["data"]["status"] == "completed"
+
+
+def test_concurrent_clients_share_one_process(service):
+    customers = [_customer(service, f"user{i}")[0] for i in range(8)]
+
+    def book(client):
+        return [client.call("POST", "/bookings", {"pickup": f"P{n}", "dropoff": "Airport",
+                                                  "date": "2025-01-01", "time": "10:00"})[0]
+                for n in range(10)]
+    with ThreadPoolExecutor(8) as pool:
+        statuses = [s for result in pool.map(book, customers) for s in result]
+    assert statuses == [201] * 80
+
+    admin = Client(service)
+    admin.login("admin", "admin123")
+    ids, after = [], None
+    while True:
+        path = "/bookings?limit=30" + (f"&after={json.dumps(after)}" if after else "")
+        doc = admin.call("GET", path.replace(" ", ""))[1]["data"]
+        ids += [b["id"] for b in doc["bookings"]]
+        after = doc["next"]
+        if after is None:
+            break
+    assert sorted(ids) == list(range(1, 81))
+
+
+def test_wrong_field_types_are_bad_requests(service):
+    client, _ = _customer(service, "dave")
+    ride = {"pickup": "Thamel", "dropoff": "Airport", "date": "2025-01-01", "time": "10:00"}
+    status, doc = client.call("POST", "/bookings", {**ride, "pickup": 123})
+    assert status == 400 and "pickup" in doc["message"]
+    assert client.call("POST", "/bookings", {**ride, "date": ["2025-01-01"]})[0] == 400
+    assert client.call("POST", "/login", {"username": ["admin"], "password": "admin123"})[0] == 400
+    status, doc = client.call("GET", '/bookings?after=[{"a":1}]'.replace('"', "%22"))
+    assert status == 400 and "cursor" in doc["message"]
+    assert client.call("GET", "/health")[1]["data"]["errors"] == 4
+
+
+def test_unexpected_errors_get_a_500_envelope(service, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(booking, "available_drivers", broken)
+    admin = Client(service)
+    admin.login("admin", "admin123")
+    status, doc = admin.call("GET", "/drivers/available?date=2025-01-01&time=10:00")
+    assert (status, doc) == (500, {"ok": False, "message": "Internal error.", "data": None})
+    status, doc = admin.call("GET", "/health")  # same keep-alive connection still answers
+    assert status == 200 and doc["data"]["errors"] == 1
+
+
+@pytest.mark.parametrize("length", ["abc", "-1", "1.5"])
+def test_bad_content_length_gets_an_envelope(service, length):
+    host, port = service.server.server_address[:2]
+    with socket.create_connection((host, port), timeout=5) as sock:
+        sock.sendall(f"POST /login HTTP/1.1\r\nHost: x\r\nContent-Length: {length}\r\n\r\n{{}}".encode())
+        resp = http.client.HTTPResponse(sock)
+        resp.begin()
+        assert resp.status == 400
+        assert json.loads(resp.read())["message"] == "Content-Length must be a non-negative integer."
+
+
+def test_admin_books_only_for_existing_customers(service):
+    _, dave = _customer(service, "dave")
+    admin = Client(service)
+    admin_user = admin.login("admin", "admin123")
+    ride = {"pickup": "Thamel", "dropoff": "Airport", "date": "2025-01-01", "time": "10:00"}
+    for bogus in (10 ** 6, admin_user["id"]):
+        status, doc = admin.call("POST", "/bookings", {**ride, "customer_id": bogus})
+        assert status == 400 and doc["message"] == f"No customer with id {bogus}."
+    status, doc = admin.call("POST", "/bookings", {**ride, "customer_id": dave["id"]})
+    assert status == 201 and doc["data"]["customer_id"] == dave["id"]
@@ -0,0 +1,43 @@
+import random
+
+from map import haversine
+from spatial import SpatialIndex
+
+
+def _points(n, seed=1):
+    rng = random.Random(seed)
+    return [(i, rng.uniform(27.55, 27.85), rng.uniform(85.15, 85.50)) for i in range(n)]
+
+
+def test_radius_matches_linear_scan():
+    pts = _points(2000)
+    idx = SpatialIndex()
+    for key, lat, lon in pts:
+        idx.insert(key, lat, lon, f"driver {key}")
+    for qlat, qlon, km in ((27.7172, 85.3240, 3.0), (27.60, 85.20, 0.5), (27.70, 85.30, 50)):
+        expected = sorted(k for k, lat, lon in pts if haversine(qlat, qlon, lat, lon) <= km)
+        got = idx.radius(qlat, qlon, km)
+        assert sorted(k for _, k, _ in got) == expected
+        assert [d for d, _, _ in got] == sorted(d for d, _, _ in got)
+
+
+def test_nearest_matches_linear_scan():
+    pts = _points(1500, seed=2)
+    idx = SpatialIndex(cell_deg=0.01)
+    for key, lat, lon in pts:
+        idx.insert(key, lat, lon)
+    for qlat, qlon in ((27.7172, 85.3240), (28.2, 84.0)):
+        expected = sorted(pts, key=lambda p: haversine(qlat, qlon, p[1], p[2]))[:10]
+        got = idx.nearest(qlat, qlon, 10)
+        assert [k for _, k, _ in got] == [p[0] for p in expected]
+
+
+def test_insert_moves_and_remove():
+    idx = SpatialIndex()
+    idx.insert("a", 27.70, 85.30)
+    idx.insert("a", 28.20, 83.98)  # moved to Pokhara
+    assert len(idx) == 1
+    assert idx.radius(27.70, 85.30, 5) == []
+    assert [k for _, k, _ in idx.radius(28.20, 83.98, 1)] == ["a"]
+    idx.remove("a")
+    assert len(idx) == 0 and idx.nearest(28.2, 83.98, 3) == []
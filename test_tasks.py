@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+
+tkinter = pytest.importorskip("tkinter")
+
+from tasks import TkTaskRunner  # noqa: E402
+
+
+@pytest.fixture
+def runner():
+    interp = tkinter.Tcl()
+    r = TkTaskRunner(interp, max_workers=4, poll_ms=5)
+    yield r
+    r.shutdown()
+
+
+def pump(runner, until, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not until() and time.monotonic() < deadline:
+        runner.widget.dooneevent(0)
+    assert until()
+
+
+def test_results_are_delivered_on_the_tk_thread(runner):
+    seen = []
+    tk_thread = threading.get_ident()
+    runner.submit("geo", lambda x: x * 2, 21, on_done=lambda v: seen.append((v, threading.get_ident())))
+    pump(runner, lambda: seen)
+    assert seen == [(42, tk_thread)]
+    assert runner.stats["delivered"] == 1 and len(runner.trace) == 1
+
+
+def test_newer_submission_supersedes_stale_one(runner):
+    seen = []
+    gate = threading.Event()
+
+    def slow(q):
+        gate.wait(2)
+        return q
+
+    for q in ("t", "th", "tha", "tham"):
+        runner.submit("suggest", slow, q, on_done=seen.append)
+    gate.set()
+    pump(runner, lambda: runner._pending == 0)
+    assert seen == ["tham"]
+    assert runner.stats["dropped"] + runner.stats["cancelled"] >= 3
+
+
+def test_gather_runs_calls_concurrently_and_reports_errors(runner):
+    seen, errors = [], []
+    start = time.perf_counter()
+    runner.gather("route", [(time.sleep, (0.2,)), (time.sleep, (0.2,))], on_done=seen.append)
+    pump(runner, lambda: seen)
+    assert time.perf_counter() - start < 0.35
+
+    runner.submit("route", lambda: 1 / 0, on_error=errors.append)
+    pump(runner, lambda: errors)
+    assert isinstance(errors[0], ZeroDivisionError)